@@ -5,6 +5,7 @@ Generated for Django 4.2.7
 """
 
 import os
+import sys
 from pathlib import Path
 from decouple import config
 
@@ -38,29 +39,57 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.perfilador.PerfiladorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'shop.nmas1.DetectorNMas1Middleware',
+    'shop.consultas_lentas.ConsultasLentasMiddleware',
 ]
 
+# Detector de consultas N+1 (shop/nmas1.py): 'log', 'error' o '' (desactivado).
+# Por defecto falla en `manage.py test`, avisa en DEBUG y no se instala en producción.
+DETECTOR_NMAS1 = config(
+    'DETECTOR_NMAS1',
+    default='error' if sys.argv[1:2] == ['test'] else ('log' if DEBUG else ''),
+)
+DETECTOR_NMAS1_UMBRAL = config('DETECTOR_NMAS1_UMBRAL', default=3, cast=int)
+
+# Registro de consultas lentas (shop/consultas_lentas.py): umbral en ms (0 lo desactiva; las
+# pruebas no lo usan) y fracción de consultas lentas a las que se les guarda el EXPLAIN
+CONSULTAS_LENTAS_MS = config(
+    'CONSULTAS_LENTAS_MS', default=0 if sys.argv[1:2] == ['test'] else 200, cast=int,
+)
+CONSULTAS_LENTAS_EXPLAIN = config('CONSULTAS_LENTAS_EXPLAIN', default=0.1, cast=float)
+
 ROOT_URLCONF = 'forneria.urls'
 
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.navegacion',
+            ],
+            # En producción las plantillas se compilan una vez por proceso
+            'loaders': template_loaders if DEBUG else [
+                ('django.template.loaders.cached.Loader', template_loaders),
             ],
         },
     },
@@ -140,7 +169,31 @@ LOGIN_URL = 'forneria:login'
 LOGIN_REDIRECT_URL = 'forneria:dashboard_admin'
 LOGOUT_REDIRECT_URL = 'forneria:login'
 
+# ============= CACHÉ =============
+# L2 de shop/cache.py, versiones de etiquetas, fragmentos de plantilla y reportes. Debe ser
+# compartido por todos los workers: una invalidación hecha en un worker (o desde un comando)
+# tiene que verse en los demás. Por defecto en archivos bajo var/cache, que comparten los
+# workers de la misma máquina; con varias máquinas usar Redis o Memcached, por ejemplo
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y CACHE_LOCATION=redis://host:6379/1.
+# Con `manage.py test`, caché en memoria del proceso
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache' if sys.argv[1:2] == ['test']
+            else 'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'var', 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRADAS', default=20000, cast=int)},
+    },
+}
+
 # ============= CONFIGURACIÓN DE SESIONES =============
+# Backend: shop.sesiones.db (por defecto), shop.sesiones.cached_db o shop.sesiones.signed_cookies.
+# cached_db usa el caché compartido de CACHES: con LocMemCache (memoria de cada proceso) y
+# varios workers, un worker puede leer una versión vieja de la sesión.
+# Comparar con: python manage.py benchmark_sesiones
+SESSION_ENGINE = config('SESSION_ENGINE', default='shop.sesiones.db')
 # Duración de la cookie de sesión (en segundos)
 SESSION_COOKIE_AGE = 60 * 60 * 2  # 2 horas
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
@@ -170,3 +223,29 @@ PASSWORD_RESET_TIMEOUT = config('PASSWORD_RESET_TIMEOUT', default=900, cast=int)
 SECURE_HSTS_SECONDS = config('SECURE_HSTS_SECONDS', default=0, cast=int)
 SECURE_HSTS_INCLUDE_SUBDOMAINS = config('SECURE_HSTS_INCLUDE_SUBDOMAINS', default=False, cast=bool)
 SECURE_HSTS_PRELOAD = config('SECURE_HSTS_PRELOAD', default=False, cast=bool)
+
+# Folios reservados por proceso en cada UPDATE de la secuencia (ver shop/folios.py)
+FOLIO_TAMANO_BLOQUE = config('FOLIO_TAMANO_BLOQUE', default=50, cast=int)
+
+# Eventos en vivo del dashboard: 'local' (un worker) o 'archivo' (varios workers en la misma máquina)
+EVENTOS_BACKEND = config('EVENTOS_BACKEND', default='local')
+EVENTOS_DIR = config('EVENTOS_DIR', default=os.path.join(BASE_DIR, 'var', 'eventos'))
+
+# Métricas de /metrics (shop/metricas.py): directorio donde cada worker vuelca sus valores
+# y token para el scraper de Prometheus (Authorization: Bearer <token>); sin token solo staff.
+# Con `manage.py test` no se vuelca nada: /metrics muestra solo el proceso
+METRICAS_DIR = config(
+    'METRICAS_DIR',
+    default='' if sys.argv[1:2] == ['test'] else os.path.join(BASE_DIR, 'var', 'metricas'),
+)
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# Perfiles de ?_perfil=1 (shop/perfilador.py, solo superusuarios): .prof de cProfile e informe .txt
+PERFILES_DIR = config('PERFILES_DIR', default=os.path.join(BASE_DIR, 'var', 'perfiles'))
+
+# Calentamiento en un hilo al iniciar (shop/calentamiento.py), para servidores que no usan
+# gunicorn.conf.py; con gunicorn cada worker se calienta en post_worker_init
+CALENTAR_AL_INICIAR = config('CALENTAR_AL_INICIAR', default=False, cast=bool)
+
+# Registro rotativo de consultas lentas, compartido por los workers de la máquina
+CONSULTAS_LENTAS_DIR = config('CONSULTAS_LENTAS_DIR', default=os.path.join(BASE_DIR, 'var', 'consultas_lentas'))
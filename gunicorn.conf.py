@@ -0,0 +1,20 @@
+"""
+Configuración de gunicorn para Fornería
+gunicorn la lee sola al arrancar desde el directorio del proyecto; las
+opciones de la línea de comandos (--workers, --bind, -k) siguen mandando.
+
+post_worker_init corre en cada worker después de cargar la aplicación y
+antes de aceptar conexiones (post_fork es anterior a la carga de Django):
+ahí se calientan cachés, plantillas e imports (shop/calentamiento.py), de
+modo que el socket compartido solo entrega peticiones a workers calientes.
+"""
+
+
+def post_worker_init(worker):
+    from shop.calentamiento import calentar
+
+    estado = calentar()
+    if estado['errores']:
+        worker.log.warning('Worker %s calentado con errores en: %s', worker.pid, ', '.join(estado['errores']))
+    else:
+        worker.log.info('Worker %s caliente en %.2fs', worker.pid, estado['segundos'])
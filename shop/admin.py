@@ -1,26 +1,126 @@
 """
 Configuración del Django Admin para Fornería
 Incluye: Admin Básico + Admin Pro (Inline, Acción Personalizada, Validaciones)
++ listados ligeros para tablas grandes (conteo estimado, only(), jerarquía de fechas)
 """
 
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import QuerySet, Sum
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.contrib.auth.models import User
 from .models import (
     Direccion, Roles, Clientes, Categorias, Nutricional,
     Productos, Ventas, Detalle_Venta, Movimientos_Inventario,
-    Alertas, Usuarios
+    Alertas, Usuarios, Lotes
 )
+from .ventas import mover_inventario, recalcular_cabeceras
+from .clientes import ids_exactos
+from .lotes import cantidades_por_producto
+from .nutricional import CAMPOS_NUTRICIONALES, calcular_huella, perfil, reasignar_perfil
+from .templatetags.user_extras import grupos_usuario
+
+
+# ============= LISTADOS LIGEROS =============
+
+# Bajo este número de filas se cuenta con COUNT(*): es exacto y barato
+UMBRAL_CONTEO_ESTIMADO = 10000
+
+
+def filas_estimadas(queryset):
+    """Filas de la tabla según las estadísticas de MySQL (InnoDB las estima), o None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [queryset.model._meta.db_table],
+        )
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginador que, sin filtros ni búsqueda, toma el total de las estadísticas de
+    la tabla en vez de un COUNT(*) que recorre millones de filas en InnoDB.
+    """
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet) and not self.object_list.query.where:
+            estimado = filas_estimadas(self.object_list)
+            if estimado and estimado > UMBRAL_CONTEO_ESTIMADO:
+                return estimado
+        return super().count
+
+
+class ChangeListLigera(ChangeList):
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.model_admin.campos_listado:
+            queryset = queryset.only(*self.model_admin.campos_listado)
+        return queryset
+
+
+class ListadoLigeroMixin:
+    """
+    Listado del admin sin COUNT(*) completo y con solo las columnas mostradas.
+    `campos_listado` se pasa a only(); incluye los campos de las relaciones de
+    list_select_related que usa su __str__ (por ejemplo 'producto_id__nombre').
+    """
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    campos_listado = None
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListLigera
+
+
+class AutocompleteSelectPrecargado(AutocompleteSelect):
+    """
+    AutocompleteSelect que arma la opción elegida con `precargado` (el objeto
+    ya traído por select_related) en vez de consultarla: en un inline serían
+    una consulta por fila.
+    """
+    precargado = None
+
+    def optgroups(self, name, value, attr=None):
+        elegidos = {str(v) for v in value if str(v) not in self.choices.field.empty_values}
+        if self.precargado is None or elegidos != {str(self.precargado.pk)}:
+            return super().optgroups(name, value, attr)
+        opciones = []
+        if not self.is_required:
+            opciones.append(self.create_option(name, '', '', False, 0))
+        opciones.append(self.create_option(
+            name, self.precargado.pk, self.choices.field.label_from_instance(self.precargado),
+            elegidos, len(opciones),
+        ))
+        return [(None, opciones, 0)]
+
+
+def es_vendedor(request):
+    return 'Vendedor' in grupos_usuario(request.user)
 
 
 # ============= ADMIN BÁSICO - TABLAS MAESTRAS =============
 
 @admin.register(Direccion)
-class DireccionAdmin(admin.ModelAdmin):
+class DireccionAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Direcciones - Tabla Maestra"""
     list_display = ('id', 'calle', 'numero', 'depto', 'comuna', 'region', 'codigo_postal', 'created_at')
     search_fields = ('calle', 'numero', 'comuna', 'region')
-    list_filter = ('region', 'comuna', 'created_at')
+    list_filter = ('region', 'comuna')
+    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_per_page = 25
     
@@ -37,11 +137,11 @@ class DireccionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Roles)
-class RolesAdmin(admin.ModelAdmin):
+class RolesAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Roles - Tabla Maestra"""
     list_display = ('id', 'nombre', 'descripcion', 'created_at', 'updated_at')
     search_fields = ('nombre', 'descripcion')
-    list_filter = ('created_at', 'updated_at')
+    date_hierarchy = 'created_at'
     ordering = ('nombre',)
     list_per_page = 25
     
@@ -58,13 +158,21 @@ class RolesAdmin(admin.ModelAdmin):
 
 
 @admin.register(Clientes)
-class ClientesAdmin(admin.ModelAdmin):
+class ClientesAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Clientes - Tabla Maestra"""
     list_display = ('id', 'nombre', 'rut', 'correo', 'created_at')
+    campos_listado = ('id', 'nombre', 'rut', 'correo', 'created_at')
     search_fields = ('nombre', 'rut', 'correo')
-    list_filter = ('created_at', 'updated_at')
+    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_per_page = 25
+
+    def get_search_results(self, request, queryset, search_term):
+        # RUT o correo: coincidencia exacta por el índice normalizado (también para el autocompletado)
+        ids = ids_exactos(search_term.strip())
+        if ids:
+            return queryset.filter(id__in=ids), False
+        return super().get_search_results(request, queryset, search_term)
     
     fieldsets = (
         ('Información del Cliente', {
@@ -79,11 +187,11 @@ class ClientesAdmin(admin.ModelAdmin):
 
 
 @admin.register(Categorias)
-class CategoriasAdmin(admin.ModelAdmin):
+class CategoriasAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Categorías - Tabla Maestra"""
     list_display = ('id', 'nombre', 'descripcion', 'created_at')
     search_fields = ('nombre', 'descripcion')
-    list_filter = ('created_at', 'updated_at')
+    date_hierarchy = 'created_at'
     ordering = ('nombre',)
     list_per_page = 25
     
@@ -99,12 +207,31 @@ class CategoriasAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+class NutricionalAdminForm(forms.ModelForm):
+    """Un perfil nuevo no puede repetir los valores de otro (huella única, no editable)."""
+
+    class Meta:
+        model = Nutricional
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk is None:
+            existente = Nutricional.objects.filter(huella=calcular_huella(cleaned_data)).first()
+            if existente is not None:
+                raise forms.ValidationError(
+                    f'Ya existe el perfil nutricional #{existente.pk} con estos valores: úsalo en su lugar.'
+                )
+        return cleaned_data
+
+
 @admin.register(Nutricional)
-class NutricionalAdmin(admin.ModelAdmin):
+class NutricionalAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Información Nutricional - Tabla Maestra"""
+    form = NutricionalAdminForm
     list_display = ('id', 'calorias', 'proteinas', 'grasas', 'carbohidratos', 'azucares', 'sodio', 'created_at')
     search_fields = ('id',)
-    list_filter = ('created_at', 'updated_at')
+    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_per_page = 25
     
@@ -119,16 +246,48 @@ class NutricionalAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Un perfil existente puede ser de varios productos: sus valores se cambian desde
+        # cada producto, que pasa a otro perfil (ver shop/nutricional.py)
+        if obj is not None:
+            return self.readonly_fields + CAMPOS_NUTRICIONALES
+        return self.readonly_fields
+
+
+class ProductosAdminForm(forms.ModelForm):
+    """Productos con sus valores nutricionales; al guardar se apunta al perfil con esos valores."""
+    calorias = Nutricional._meta.get_field('calorias').formfield()
+    proteinas = Nutricional._meta.get_field('proteinas').formfield()
+    grasas = Nutricional._meta.get_field('grasas').formfield()
+    carbohidratos = Nutricional._meta.get_field('carbohidratos').formfield()
+    azucares = Nutricional._meta.get_field('azucares').formfield()
+    sodio = Nutricional._meta.get_field('sodio').formfield()
+
+    class Meta:
+        model = Productos
+        exclude = ('Nutricional_id',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        actual = perfil(self.instance.Nutricional_id_id)
+        for campo in CAMPOS_NUTRICIONALES:
+            self.initial.setdefault(campo, getattr(actual, campo, None))
+
 
 @admin.register(Productos)
-class ProductosAdmin(admin.ModelAdmin):
+class ProductosAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Productos - Tabla Maestra"""
+    form = ProductosAdminForm
     list_display = ('id', 'nombre', 'precio_formatted', 'stock_actual', 'stock_status', 
                    'caducidad', 'Categorias_id', 'tipo', 'creado')
+    campos_listado = ('id', 'nombre', 'precio', 'stock_actual', 'stock_minimo', 'stock_maximo',
+                      'caducidad', 'tipo', 'creado', 'Categorias_id__nombre')
     search_fields = ('nombre', 'marca', 'descripcion', 'tipo')
-    list_filter = ('Categorias_id', 'tipo', 'caducidad', 'creado')
+    list_filter = ('Categorias_id', 'tipo')
+    date_hierarchy = 'caducidad'
     ordering = ('-creado',)
-    list_select_related = ('Categorias_id', 'Nutricional_id')
+    list_select_related = ('Categorias_id',)
+    autocomplete_fields = ['Categorias_id']
     list_per_page = 25
     
     fieldsets = (
@@ -144,8 +303,8 @@ class ProductosAdmin(admin.ModelAdmin):
         ('Presentación', {
             'fields': ('presentacion', 'formato')
         }),
-        ('Información Nutricional', {
-            'fields': ('Nutricional_id',)
+        ('Información Nutricional (por 100g)', {
+            'fields': CAMPOS_NUTRICIONALES
         }),
         ('Timestamps', {
             'fields': ('creado', 'modificado', 'eliminado'),
@@ -153,6 +312,11 @@ class ProductosAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ('creado', 'modificado')
+
+    def save_model(self, request, obj, form, change):
+        # Copia al escribir: el perfil anterior puede ser de otros productos y no se toca
+        reasignar_perfil(obj, {campo: form.cleaned_data.get(campo) for campo in CAMPOS_NUTRICIONALES})
+        super().save_model(request, obj, form, change)
     
     def precio_formatted(self, obj):
         """Formato de precio en pesos chilenos"""
@@ -183,6 +347,15 @@ class ProductosAdmin(admin.ModelAdmin):
 
 # ============= ADMIN PRO - INLINE =============
 
+class DetalleVentaFormSet(BaseInlineFormSet):
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if form.instance.pk:
+            widget = form.fields['producto_id'].widget
+            getattr(widget, 'widget', widget).precargado = form.instance.producto_id
+        return form
+
+
 class DetalleVentaInline(admin.TabularInline):
     """
     Inline para Detalle de Venta dentro de Ventas
@@ -194,31 +367,58 @@ class DetalleVentaInline(admin.TabularInline):
     fields = ('producto_id', 'cantidad', 'precio_unitario', 'descuento_pct', 'subtotal_display')
     readonly_fields = ('subtotal_display',)
     autocomplete_fields = ['producto_id']
+    formset = DetalleVentaFormSet
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'producto_id':
+            kwargs['widget'] = AutocompleteSelectPrecargado(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
     
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related('producto_id')
+            .only('id', 'venta_id', 'producto_id__nombre', 'cantidad', 'precio_unitario', 'descuento_pct')
+            .with_subtotals(incluir_total=False)
+        )
+
     def subtotal_display(self, obj):
         """Muestra el subtotal calculado del item"""
-        if obj.id and obj.cantidad and obj.precio_unitario:
-            descuento_pct = obj.descuento_pct or 0
-            subtotal = obj.cantidad * obj.precio_unitario * (1 - descuento_pct / 100)
+        if obj.id and obj.subtotal_sql:
             return format_html(
-                '<strong style="color: #4caf50;">${:,.0f}</strong>',
-                subtotal
-            ).replace(",", ".")
+                '<strong style="color: #4caf50;">{}</strong>',
+                f"${obj.subtotal_sql:,.0f}".replace(",", ".")
+            )
         return "$0"
     subtotal_display.short_description = 'Subtotal'
 
 
 # ============= ADMIN BÁSICO - TABLAS OPERATIVAS =============
 
+def _cantidades(detalles):
+    """Unidades por producto de un queryset de Detalle_Venta (una consulta agregada)."""
+    return dict(detalles.values_list('producto_id').annotate(total=Sum('cantidad')).order_by())
+
+
+def _avisar_faltantes(model_admin, request, faltantes):
+    if faltantes:
+        nombres = Productos.objects.filter(id__in=faltantes.keys()).values_list('nombre', flat=True)
+        model_admin.message_user(request, f"Lotes insuficientes para: {', '.join(nombres)}.", messages.WARNING)
+
+
 @admin.register(Ventas)
-class VentasAdmin(admin.ModelAdmin):
+class VentasAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Ventas - Tabla Operativa"""
-    list_display = ('id', 'folio', 'fecha', 'cliente_id', 'total_formatted', 
+    list_display = ('id', 'folio', 'fecha', 'cliente_nombre', 'items_qty', 'total_formatted', 
                    'canal_venta', 'estado_display', 'created_at')
-    search_fields = ('folio', 'cliente_id__nombre', 'cliente_id__rut')
-    list_filter = ('canal_venta', 'fecha', 'created_at')
+    campos_listado = ('id', 'folio', 'fecha', 'cliente_nombre', 'items_qty', 'total_con_iva', 'canal_venta',
+                      'deleted_at', 'created_at')
+    # El RUT se busca exacto en get_search_results, sin unir Clientes en cada búsqueda
+    search_fields = ('folio', 'cliente_nombre')
+    list_filter = ('canal_venta',)
+    date_hierarchy = 'fecha'
     ordering = ('-fecha',)
-    list_select_related = ('cliente_id',)
+    autocomplete_fields = ['cliente_id']
     inlines = [DetalleVentaInline]
     list_per_page = 25
     
@@ -251,51 +451,127 @@ class VentasAdmin(admin.ModelAdmin):
             return format_html('<span style="color: red;">❌ Anulada</span>')
         return format_html('<span style="color: green;">✓ Activa</span>')
     estado_display.short_description = 'Estado'
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = ids_exactos(search_term.strip())
+        if ids:
+            return queryset.filter(cliente_id__in=ids), False
+        return super().get_search_results(request, queryset, search_term)
+
+    # Los detalles del inline mueven lotes y stock como el formulario de ventas:
+    # se guardan las cantidades previas antes de que el inline las cambie
+    def save_model(self, request, obj, form, change):
+        obj._cantidades_previas = cantidades_por_producto(obj)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        venta = form.instance
+        with transaction.atomic():
+            faltantes = mover_inventario(getattr(venta, '_cantidades_previas', {}), cantidades_por_producto(venta))
+        _avisar_faltantes(self, request, faltantes)
+        # Los detalles del inline cambian los ítems desnormalizados de la cabecera
+        recalcular_cabeceras([venta.pk], conservar_cliente='cliente_id' not in form.changed_data)
     
     def has_delete_permission(self, request, obj=None):
         """
         Restricción de seguridad: 
         Los vendedores NO pueden eliminar ventas
         """
-        if request.user.groups.filter(name='Vendedor').exists():
+        if es_vendedor(request):
             return False
         return super().has_delete_permission(request, obj)
 
+    # Las unidades de una venta eliminada vuelven a sus lotes y al stock
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            mover_inventario(cantidades_por_producto(obj), {})
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            mover_inventario(_cantidades(Detalle_Venta.objects.filter(venta_id__in=queryset.values('id'))), {})
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Detalle_Venta)
-class DetalleVentaAdmin(admin.ModelAdmin):
+class DetalleVentaAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Detalle de Venta - Tabla Operativa"""
     list_display = ('id', 'venta_id', 'producto_id', 'cantidad', 'precio_unitario', 
                    'descuento_pct', 'subtotal_display')
+    campos_listado = ('id', 'cantidad', 'precio_unitario', 'descuento_pct',
+                      'venta_id__folio', 'venta_id__fecha', 'producto_id__nombre')
     search_fields = ('venta_id__folio', 'producto_id__nombre')
-    list_filter = ('created_at', 'updated_at')
+    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_select_related = ('venta_id', 'producto_id')
+    autocomplete_fields = ['venta_id', 'producto_id']
     list_per_page = 25
     
     readonly_fields = ('subtotal_display', 'created_at', 'updated_at')
+
+    def get_queryset(self, request):
+        # Subtotal calculado en SQL: permite ordenar por él sin aritmética en Python
+        return super().get_queryset(request).with_subtotals(incluir_total=False)
     
     def subtotal_display(self, obj):
         """Muestra el subtotal del item"""
-        if obj.subtotal is not None:
-            return f"${obj.subtotal:,.0f}".replace(",", ".")
+        if obj.subtotal_sql is not None:
+            return f"${obj.subtotal_sql:,.0f}".replace(",", ".")
         return "$0"
     subtotal_display.short_description = 'Subtotal'
+    subtotal_display.admin_order_field = 'subtotal_sql'
+
+    # Editar un detalle suelto mueve lotes y stock por la diferencia de unidades y cambia
+    # los ítems desnormalizados de su venta (y de la anterior si se movió de venta)
+    def save_model(self, request, obj, form, change):
+        anterior = form.initial.get('venta_id') if change else None
+        previas = {form.initial['producto_id']: form.initial['cantidad']} if change else {}
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            faltantes = mover_inventario(previas, {obj.producto_id_id: obj.cantidad})
+        _avisar_faltantes(self, request, faltantes)
+        recalcular_cabeceras({obj.venta_id_id, anterior} - {None})
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            mover_inventario({obj.producto_id_id: obj.cantidad}, {})
+        recalcular_cabeceras([obj.venta_id_id])
+
+    def delete_queryset(self, request, queryset):
+        ventas_ids = set(queryset.values_list('venta_id', flat=True))
+        with transaction.atomic():
+            mover_inventario(_cantidades(queryset), {})
+            super().delete_queryset(request, queryset)
+        recalcular_cabeceras(ventas_ids)
+
+
+class LotesInline(admin.TabularInline):
+    """Lotes generados por un movimiento de entrada"""
+    model = Lotes
+    extra = 0
+    fields = ('producto_id', 'codigo', 'elaboracion', 'caducidad', 'cantidad_inicial', 'cantidad_disponible')
+    autocomplete_fields = ['producto_id']
 
 
 @admin.register(Movimientos_Inventario)
-class MovimientosInventarioAdmin(admin.ModelAdmin):
+class MovimientosInventarioAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Movimientos de Inventario - Tabla Operativa"""
-    list_display = ('id', 'producto_id', 'tipo_movimiento', 'cantidad', 'fecha', 'created_at')
+    list_display = ('id', 'producto_id', 'tipo_movimiento', 'cantidad', 'origen', 'fecha', 'created_at')
+    campos_listado = ('id', 'tipo_movimiento', 'cantidad', 'origen', 'fecha', 'created_at', 'producto_id__nombre')
     search_fields = ('producto_id__nombre',)
-    list_filter = ('tipo_movimiento', 'fecha', 'created_at')
+    list_filter = ('tipo_movimiento', 'origen')
+    date_hierarchy = 'fecha'
     ordering = ('-fecha',)
     list_select_related = ('producto_id',)
+    autocomplete_fields = ['producto_id']
+    inlines = [LotesInline]
     list_per_page = 25
     
     fieldsets = (
         ('Información del Movimiento', {
-            'fields': ('producto_id', 'tipo_movimiento', 'cantidad', 'fecha')
+            'fields': ('producto_id', 'tipo_movimiento', 'cantidad', 'origen', 'fecha')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'deleted_at'),
@@ -309,11 +585,56 @@ class MovimientosInventarioAdmin(admin.ModelAdmin):
         Restricción de seguridad:
         Solo administradores pueden ver movimientos de inventario
         """
-        if request.user.groups.filter(name='Vendedor').exists():
+        if es_vendedor(request):
             return False
         return super().has_module_permission(request)
 
 
+@admin.register(Lotes)
+class LotesAdmin(ListadoLigeroMixin, admin.ModelAdmin):
+    """Admin para Lotes - Tabla Operativa"""
+    list_display = ('id', 'codigo', 'producto_id', 'caducidad', 'cantidad_inicial',
+                   'cantidad_disponible', 'vencimiento_badge')
+    campos_listado = ('id', 'codigo', 'caducidad', 'cantidad_inicial', 'cantidad_disponible',
+                      'producto_id__nombre')
+    search_fields = ('codigo', 'producto_id__nombre')
+    date_hierarchy = 'caducidad'
+    ordering = ('caducidad', 'id')
+    list_select_related = ('producto_id',)
+    autocomplete_fields = ['producto_id', 'movimiento_id']
+    list_per_page = 25
+
+    fieldsets = (
+        ('Información del Lote', {
+            'fields': ('producto_id', 'movimiento_id', 'codigo')
+        }),
+        ('Fechas', {
+            'fields': ('elaboracion', 'caducidad')
+        }),
+        ('Cantidades', {
+            'fields': ('cantidad_inicial', 'cantidad_disponible')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at', 'deleted_at'),
+            'classes': ('collapse',)
+        }),
+    )
+    readonly_fields = ('created_at', 'updated_at')
+
+    def vencimiento_badge(self, obj):
+        """Indicador visual de la proximidad del vencimiento"""
+        dias = (obj.caducidad - timezone.localdate()).days
+        if dias < 0:
+            return format_html('<span style="color: red;">❌ Vencido</span>')
+        if dias <= 2:
+            return format_html(
+                '<span style="background-color: #ff9800; color: white; padding: 3px 8px; '
+                'border-radius: 3px; font-weight: bold;">⚠ {} días</span>', dias
+            )
+        return format_html('<span style="color: green;">✓ {} días</span>', dias)
+    vencimiento_badge.short_description = 'Vencimiento'
+
+
 # ============= ADMIN PRO - ACCIÓN PERSONALIZADA =============
 
 def mark_alerts_as_resolved(modeladmin, request, queryset):
@@ -332,13 +653,16 @@ mark_alerts_as_resolved.short_description = "✓ Marcar alertas seleccionadas co
 
 
 @admin.register(Alertas)
-class AlertasAdmin(admin.ModelAdmin):
+class AlertasAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Alertas - Tabla Operativa con Acción Personalizada"""
     list_display = ('id', 'producto_id', 'tipo_alerta', 'estado_badge', 'mensaje', 'fecha_generada')
+    campos_listado = ('id', 'tipo_alerta', 'estado', 'mensaje', 'fecha_generada', 'producto_id__nombre')
     search_fields = ('producto_id__nombre', 'mensaje')
-    list_filter = ('tipo_alerta', 'estado', 'fecha_generada')
+    list_filter = ('tipo_alerta', 'estado')
+    date_hierarchy = 'fecha_generada'
     ordering = ('-fecha_generada',)
     list_select_related = ('producto_id',)
+    autocomplete_fields = ['producto_id']
     actions = [mark_alerts_as_resolved]
     list_per_page = 25
     
@@ -374,18 +698,21 @@ class AlertasAdmin(admin.ModelAdmin):
         Restricción de seguridad:
         Solo administradores pueden ver alertas
         """
-        if request.user.groups.filter(name='Vendedor').exists():
+        if es_vendedor(request):
             return False
         return super().has_module_permission(request)
 
 
 @admin.register(Usuarios)
-class UsuariosAdmin(admin.ModelAdmin):
+class UsuariosAdmin(ListadoLigeroMixin, admin.ModelAdmin):
     """Admin para Usuarios del Sistema"""
     list_display = ('id', 'nombres', 'paterno', 'materno', 'run', 'correo', 
                    'Roles_id', 'Direccion_id', 'fono', 'created_at')
+    campos_listado = ('id', 'nombres', 'paterno', 'materno', 'run', 'correo', 'fono', 'created_at',
+                      'Roles_id__nombre', 'Direccion_id__calle', 'Direccion_id__numero', 'Direccion_id__comuna')
     search_fields = ('nombres', 'paterno', 'materno', 'run', 'correo')
-    list_filter = ('Roles_id', 'Direccion_id', 'created_at', 'updated_at')
+    list_filter = ('Roles_id',)
+    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_select_related = ('Direccion_id', 'Roles_id')
     list_per_page = 25
@@ -413,7 +740,7 @@ class UsuariosAdmin(admin.ModelAdmin):
         Restricción de seguridad:
         Solo administradores pueden ver usuarios
         """
-        if request.user.groups.filter(name='Vendedor').exists():
+        if es_vendedor(request):
             return False
         return super().has_module_permission(request)
 
@@ -6,11 +6,16 @@ class ShopConfig(AppConfig):
     name = 'shop'
     verbose_name = 'Gestión de Fornería'
 
-
-
-
-
-
-
-
-
+    def ready(self):
+        # Registra las señales de eventos en vivo, invalidación del catálogo cacheado,
+        # conteos de facetas, normalización de clientes, perfiles nutricionales, días
+        # pendientes del resumen de reportes y permisos cacheados de la navegación
+        from . import (  # noqa: F401
+            catalogo, clientes, context_processors, eventos, facetas, metricas, nutricional, reportes,
+        )
+
+        # Servidores sin gunicorn.conf.py: calienta en un hilo; /salud/ responde 503 hasta terminar
+        from django.conf import settings
+        if settings.CALENTAR_AL_INICIAR:
+            from .calentamiento import calentar_en_segundo_plano
+            calentar_en_segundo_plano()
@@ -0,0 +1,279 @@
+"""
+Caché de dos niveles para los datos calculados de shop
+
+    L1  LRU en memoria del proceso, con vencimiento por entrada (sin E/S)
+    L2  el caché de Django (settings.CACHES['default']), compartido por los workers
+
+`CacheDosNiveles.obtener(clave, calcular)` busca en L1, luego en L2 (y sube
+el valor a L1) y solo si no está llama a `calcular()`. Protege del estampido
+cuando una clave muy leída vence justo al abrir la caja:
+
+- Un solo vuelo por clave: si varios hilos del proceso piden la misma clave
+  ausente, uno calcula y los demás esperan su resultado.
+- Vencimiento anticipado probabilístico (XFetch): cada entrada guarda cuánto
+  costó calcularla; al acercarse su vencimiento, cada lectura decide al azar
+  recalcularla antes, con más probabilidad cuanto más cerca y más cara. Un
+  solo lector lo hace (el resto sigue recibiendo el valor vigente), así que
+  en la práctica la clave se renueva antes de vencer en todos los workers.
+
+Invalidación por etiquetas: las claves con `etiquetas=('catalogo',)` llevan
+la versión de cada etiqueta dentro de la clave. `invalidar('catalogo')`
+incrementa la versión en L2 y todas esas claves quedan huérfanas a la vez.
+`invalidar_con(etiqueta, *modelos)` lo conecta a post_save/post_delete
+(después del commit). Cada proceso recuerda las versiones TTL_VERSIONES
+segundos: es lo que tarda otro worker en ver una invalidación.
+
+Las versiones viven en L2, así que la invalidación entre workers exige un
+backend compartido (archivos en la misma máquina, Redis o Memcached; ver
+CACHES en settings). Con LocMemCache cada proceso tiene sus propias
+versiones y una invalidación solo alcanza al worker que la hizo.
+
+Los valores del L1 se comparten entre peticiones del proceso: quien los
+recibe no debe modificarlos. Aciertos y fallos se cuentan en
+forneria_cache_total{cache=<nombre>} y los recálculos en
+forneria_cache_recalculos_total{motivo=vencido|anticipado} (ver shop/metricas.py).
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .metricas import contar_cache, incrementar
+
+
+MAX_ETIQUETAS = 256
+TTL_VERSIONES = 2
+TIEMPO_ESPERA = 30
+
+
+class LRU:
+    """Diccionario LRU con vencimiento por entrada, seguro entre hilos."""
+
+    def __init__(self, maximo, ttl):
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.maximo = maximo
+        self.ttl = ttl
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, vence = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor, ttl=None):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def descartar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+# ============= ETIQUETAS =============
+
+_versiones = LRU(MAX_ETIQUETAS, TTL_VERSIONES)
+_instancias = []
+
+
+def _clave_version(etiqueta):
+    return f'etiqueta:{etiqueta}:version'
+
+
+def _version_inicial():
+    # Si L2 se vacía (reinicio del backend) la versión no vuelve a un número ya usado
+    return int(time.time() * 1000)
+
+
+def versiones(etiquetas):
+    """Versión vigente de cada etiqueta, en el mismo orden."""
+    encontradas = {etiqueta: _versiones.obtener(etiqueta) for etiqueta in etiquetas}
+    faltan = [etiqueta for etiqueta, version in encontradas.items() if version is None]
+    if faltan:
+        leidas = cache.get_many([_clave_version(etiqueta) for etiqueta in faltan])
+        for etiqueta in faltan:
+            version = leidas.get(_clave_version(etiqueta))
+            if version is None:
+                cache.add(_clave_version(etiqueta), _version_inicial(), None)
+                version = cache.get(_clave_version(etiqueta)) or _version_inicial()
+            _versiones.guardar(etiqueta, version)
+            encontradas[etiqueta] = version
+    return tuple(encontradas[etiqueta] for etiqueta in etiquetas)
+
+
+def version(etiqueta):
+    return versiones((etiqueta,))[0]
+
+
+def invalidar(*etiquetas):
+    for etiqueta in etiquetas:
+        try:
+            nueva = cache.incr(_clave_version(etiqueta))
+        except ValueError:
+            nueva = _version_inicial()
+            cache.set(_clave_version(etiqueta), nueva, None)
+        _versiones.guardar(etiqueta, nueva)
+
+
+def invalidar_con(etiqueta, *modelos):
+    """Invalida `etiqueta` cuando se confirma un guardado o borrado de cualquiera de `modelos`."""
+    def _modificado(sender, **kwargs):
+        transaction.on_commit(lambda: invalidar(etiqueta))
+
+    for modelo in modelos:
+        for senal, accion in ((post_save, 'guardado'), (post_delete, 'eliminado')):
+            senal.connect(
+                _modificado, sender=modelo, weak=False,
+                dispatch_uid=f'cache_{etiqueta}_{modelo.__name__}_{accion}',
+            )
+
+
+def limpiar_local():
+    """Vacía los L1 y las versiones recordadas de este proceso (L2 no se toca)."""
+    _versiones.limpiar()
+    for instancia in _instancias:
+        instancia._l1.limpiar()
+
+
+# ============= CACHÉ DE DOS NIVELES =============
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.ok = False
+
+
+class CacheDosNiveles:
+    """
+    Valores bajo `<nombre>:<clave>[:<versión de cada etiqueta>]`, `ttl` segundos en L2
+    y hasta `ttl_local` en el L1 del proceso. `beta` > 1 adelanta más los recálculos.
+    """
+
+    def __init__(self, nombre, ttl, ttl_local=None, maximo_local=512, beta=1.0):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.ttl_local = ttl if ttl_local is None else ttl_local
+        self.beta = beta
+        self._l1 = LRU(maximo_local, self.ttl_local)
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        _instancias.append(self)
+
+    def _completa(self, clave, versiones_etiquetas):
+        return ':'.join([self.nombre, str(clave), *map(str, versiones_etiquetas)])
+
+    def _subir(self, completa, entrada):
+        if entrada is not None:
+            self._l1.guardar(completa, entrada, min(self.ttl_local, entrada[2] - time.time()))
+        return entrada
+
+    def _motivo(self, entrada):
+        """None si la entrada sirve; si no, por qué hay que recalcular."""
+        contar_cache(self.nombre, entrada is not None)
+        if entrada is None:
+            return 'vencido'
+        _, costo, vence = entrada
+        if time.time() - costo * self.beta * math.log(1 - random.random()) >= vence:
+            return 'anticipado'
+        return None
+
+    def _despegar(self, completa):
+        with self._lock:
+            vuelo = self._vuelos.get(completa)
+            if vuelo is not None:
+                return vuelo, False
+            vuelo = self._vuelos[completa] = _Vuelo()
+            return vuelo, True
+
+    def _entrada(self, valor, inicio):
+        return (valor, time.perf_counter() - inicio, time.time() + self.ttl)
+
+    def _aterrizar(self, completa, vuelo, entrada, motivo):
+        self._l1.guardar(completa, entrada, min(self.ttl_local, self.ttl))
+        vuelo.valor, vuelo.ok = entrada[0], True
+        incrementar('forneria_cache_recalculos_total', cache=self.nombre, motivo=motivo)
+
+    def _liberar(self, completa, vuelo):
+        with self._lock:
+            self._vuelos.pop(completa, None)
+        vuelo.listo.set()
+
+    def obtener(self, clave, calcular, etiquetas=()):
+        completa = self._completa(clave, versiones(etiquetas))
+        entrada = self._l1.obtener(completa)
+        if entrada is None:
+            entrada = self._subir(completa, cache.get(completa))
+        motivo = self._motivo(entrada)
+        if motivo is None:
+            return entrada[0]
+
+        vuelo, lider = self._despegar(completa)
+        if not lider:
+            # Otro hilo ya recalcula: sirve el valor vigente o se espera el suyo
+            if entrada is not None:
+                return entrada[0]
+            if vuelo.listo.wait(TIEMPO_ESPERA) and vuelo.ok:
+                return vuelo.valor
+            return calcular()
+        try:
+            inicio = time.perf_counter()
+            entrada = self._entrada(calcular(), inicio)
+            cache.set(completa, entrada, self.ttl)
+            self._aterrizar(completa, vuelo, entrada, motivo)
+        finally:
+            self._liberar(completa, vuelo)
+        return entrada[0]
+
+    async def aobtener(self, clave, calcular, etiquetas=()):
+        """Como obtener(), desde código async; `calcular` es una función async."""
+        completa = self._completa(clave, await sync_to_async(versiones)(etiquetas) if etiquetas else ())
+        entrada = self._l1.obtener(completa)
+        if entrada is None:
+            entrada = self._subir(completa, await cache.aget(completa))
+        motivo = self._motivo(entrada)
+        if motivo is None:
+            return entrada[0]
+
+        vuelo, lider = self._despegar(completa)
+        if not lider:
+            if entrada is not None:
+                return entrada[0]
+            esperar = sync_to_async(vuelo.listo.wait, thread_sensitive=False)
+            if await esperar(TIEMPO_ESPERA) and vuelo.ok:
+                return vuelo.valor
+            return await calcular()
+        try:
+            inicio = time.perf_counter()
+            entrada = self._entrada(await calcular(), inicio)
+            await cache.aset(completa, entrada, self.ttl)
+            self._aterrizar(completa, vuelo, entrada, motivo)
+        finally:
+            self._liberar(completa, vuelo)
+        return entrada[0]
+
+    def descartar(self, clave, etiquetas=()):
+        """Saca la clave de L2 y del L1 de este proceso; los otros L1 la sueltan al vencer ttl_local."""
+        completa = self._completa(clave, versiones(etiquetas))
+        self._l1.descartar(completa)
+        cache.delete(completa)
@@ -0,0 +1,259 @@
+"""
+Caja (punto de venta) sin conexión
+
+La caja registra las ventas en el navegador y las envía por lotes. Cada
+lote se valida completo y se inserta en una sola transacción con
+bulk_create: una consulta por tabla en vez de un formulario por venta.
+
+Cada venta trae una clave de idempotencia generada en la caja; reenviar
+un lote (por ejemplo, tras perder la respuesta) no duplica ventas. Las
+ventas cuya cantidad supera el stock disponible se informan como
+conflicto y no se guardan, salvo que la caja las reenvíe con `forzar`;
+las aceptadas descuentan Productos.stock_actual en la misma transacción,
+igual que el formulario web (ventas.mover_inventario).
+"""
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .eventos import publicar_ventas
+from .metricas import contar_ventas
+from .folios import siguiente_folio
+from .models import Clientes, Detalle_Venta, Productos, Ventas
+from .ventas import calcular_totales, copiar_cliente, mover_inventario, resumen_items
+
+
+MAX_VENTAS_POR_LOTE = 200
+MAX_CANTIDAD = 10000
+# Importe máximo de las columnas DecimalField(max_digits=10, decimal_places=2)
+MAX_IMPORTE = Decimal('99999999.99')
+# La caja puede cobrar bajo el precio de catálogo (descuentos, precio ya cambiado
+# sin conexión) pero no más de este múltiplo
+MAX_FACTOR_PRECIO = 2
+
+CANALES = {valor for valor, _ in Ventas.CANAL_CHOICES}
+
+
+async def catalogo_caja():
+    """Datos que la caja guarda localmente para vender sin conexión (ORM asíncrono)."""
+    productos = Productos.objects.order_by('nombre').values(
+        'id', 'nombre', 'precio', 'presentacion', 'formato', 'stock_actual'
+    )
+    clientes = Clientes.objects.order_by('nombre').values('id', 'nombre')
+    return {
+        'productos': [
+            {
+                'id': p['id'],
+                'nombre': p['nombre'],
+                'precio': float(p['precio']),
+                'presentacion': p['presentacion'] or '',
+                'formato': p['formato'] or '',
+                'stock': p['stock_actual'] or 0,
+            }
+            async for p in productos.aiterator()
+        ],
+        'clientes': [cliente async for cliente in clientes.aiterator()],
+        'canales': [valor for valor, _ in Ventas.CANAL_CHOICES],
+    }
+
+
+def _decimal(valor, defecto=None):
+    if valor in (None, ''):
+        return defecto
+    try:
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Valor numérico inválido: {valor!r}')
+
+
+def _es_id(valor):
+    # bool es subclase de int; listas y dicts del JSON no sirven como clave de dict
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _parse_venta(datos, clientes, productos):
+    """Convierte una venta recibida en (Ventas, [Detalle_Venta]) sin guardar. Lanza ValueError."""
+    if not isinstance(datos, dict):
+        raise ValueError('Formato de venta inválido.')
+
+    cliente_id = datos.get('cliente_id')
+    if not _es_id(cliente_id) or cliente_id not in clientes:
+        raise ValueError('Cliente inexistente.')
+    canal = datos.get('canal_venta') or 'Local'
+    if not isinstance(canal, str) or canal not in CANALES:
+        raise ValueError(f'Canal de venta inválido: {canal}.')
+
+    fecha = datos.get('fecha')
+    fecha = parse_datetime(fecha) if isinstance(fecha, str) and fecha else timezone.now()
+    if fecha is None:
+        raise ValueError('Fecha inválida, usa formato ISO 8601.')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, timezone.get_current_timezone())
+
+    descuento = _decimal(datos.get('descuento'), Decimal('0.00'))
+    if descuento < 0:
+        raise ValueError('El descuento no puede ser negativo.')
+    monto_pagado = _decimal(datos.get('monto_pagado'))
+
+    lineas = datos.get('detalles') or []
+    if not isinstance(lineas, list) or not lineas:
+        raise ValueError('La venta debe incluir al menos un producto.')
+
+    detalles = []
+    for linea in lineas:
+        producto_id = linea.get('producto_id') if isinstance(linea, dict) else None
+        if not _es_id(producto_id) or producto_id not in productos:
+            raise ValueError(f'Producto inexistente: {producto_id}.')
+        cantidad = linea.get('cantidad')
+        # bool es subclase de int: true no es una cantidad
+        if isinstance(cantidad, bool) or not isinstance(cantidad, int) or not 0 < cantidad <= MAX_CANTIDAD:
+            raise ValueError(f'La cantidad debe ser un entero entre 1 y {MAX_CANTIDAD}.')
+        catalogo = productos[producto_id].precio
+        precio = _decimal(linea.get('precio_unitario'), catalogo)
+        descuento_pct = _decimal(linea.get('descuento_pct'), Decimal('0.00'))
+        if not 0 <= precio <= min(catalogo * MAX_FACTOR_PRECIO, MAX_IMPORTE) or not 0 <= descuento_pct <= 100:
+            raise ValueError('Precio o descuento de línea fuera de rango.')
+        detalles.append(Detalle_Venta(
+            producto_id=productos[producto_id],
+            cantidad=cantidad,
+            precio_unitario=precio,
+            descuento_pct=descuento_pct,
+        ))
+
+    venta = Ventas(
+        cliente_id_id=cliente_id,
+        fecha=fecha,
+        canal_venta=canal,
+        descuento=descuento,
+    )
+    copiar_cliente(venta, clientes[cliente_id])
+    venta.total_sin_iva, venta.total_iva, venta.total_con_iva = calcular_totales(venta, detalles)
+    venta.items_count, venta.items_qty = resumen_items(detalles)
+    if venta.total_con_iva > MAX_IMPORTE or (monto_pagado is not None and not 0 <= monto_pagado <= MAX_IMPORTE):
+        raise ValueError('Importe de la venta fuera de rango.')
+    venta.monto_pagado = venta.total_con_iva if monto_pagado is None else monto_pagado
+    venta.vuelto = max(venta.monto_pagado - venta.total_con_iva, Decimal('0.00'))
+    return venta, detalles
+
+
+def sincronizar_ventas(lote):
+    """
+    Valida e inserta un lote de ventas de la caja.
+
+    `lote` es una lista de dicts con `clave`, `cliente_id`, `fecha`,
+    `canal_venta`, `descuento`, `monto_pagado`, `forzar` y `detalles`
+    (`producto_id`, `cantidad`, `precio_unitario`, `descuento_pct`).
+    Retorna un resultado por venta, en el mismo orden, con `estado`:
+    creada, duplicada, conflicto o invalida.
+    """
+    claves = [datos.get('clave') for datos in lote if isinstance(datos, dict)]
+    claves_validas = {clave for clave in claves if isinstance(clave, str) and 0 < len(clave) <= 64}
+
+    clientes_ids = {
+        datos.get('cliente_id') for datos in lote
+        if isinstance(datos, dict) and _es_id(datos.get('cliente_id'))
+    }
+    clientes = Clientes.objects.only('id', 'nombre', 'correo').in_bulk(list(clientes_ids))
+    productos_ids = list({
+        linea.get('producto_id')
+        for datos in lote if isinstance(datos, dict) and isinstance(datos.get('detalles'), list)
+        for linea in datos['detalles'] if isinstance(linea, dict) and _es_id(linea.get('producto_id'))
+    })
+
+    # Folios reservados fuera de la transacción (ver shop/folios.py) para las claves aún no
+    # registradas; si dentro de la transacción resultan ser más, se reservan de a uno
+    registradas = Ventas.objects.filter(clave_idempotencia__in=claves_validas).values_list(
+        'clave_idempotencia', flat=True
+    )
+    folios = [siguiente_folio() for _ in claves_validas.difference(registradas)]
+    try:
+        return _insertar_lote(lote, claves_validas, clientes, productos_ids, iter(folios))
+    except IntegrityError:
+        # Otra petición confirmó la misma clave (o el mismo folio) entre la lectura y el
+        # INSERT: al repetir, esas ventas se leen ya registradas y se informan como duplicadas
+        return _insertar_lote(lote, claves_validas, clientes, productos_ids, iter(()))
+
+
+def _insertar_lote(lote, claves_validas, clientes, productos_ids, folios):
+    resultados = []
+    aceptadas = []
+    vistas = set()
+
+    with transaction.atomic():
+        # El bloqueo serializa lotes concurrentes que venden los mismos productos, entre
+        # ellos el reenvío de un lote aún en curso: las claves se leen después del bloqueo
+        productos = Productos.objects.select_for_update().in_bulk(productos_ids)
+        existentes = {
+            clave: (venta_id, folio)
+            for clave, venta_id, folio in Ventas.objects.filter(clave_idempotencia__in=claves_validas)
+            .values_list('clave_idempotencia', 'id', 'folio')
+        }
+        disponible = {pid: producto.stock_actual or 0 for pid, producto in productos.items()}
+
+        for datos in lote:
+            clave = datos.get('clave') if isinstance(datos, dict) else None
+            resultado = {'clave': clave}
+            resultados.append(resultado)
+
+            if not isinstance(clave, str) or clave not in claves_validas:
+                resultado.update(estado='invalida', error='Clave de idempotencia ausente o inválida.')
+                continue
+            if clave in existentes or clave in vistas:
+                venta_id, folio = existentes.get(clave, (None, None))
+                resultado.update(estado='duplicada', id=venta_id, folio=folio)
+                continue
+            try:
+                venta, detalles = _parse_venta(datos, clientes, productos)
+            except ValueError as exc:
+                resultado.update(estado='invalida', error=str(exc))
+                continue
+
+            pedidas = defaultdict(int)
+            for detalle in detalles:
+                pedidas[detalle.producto_id_id] += detalle.cantidad
+            conflictos = [
+                {'producto_id': pid, 'pedido': cantidad, 'disponible': disponible[pid]}
+                for pid, cantidad in pedidas.items()
+                if cantidad > disponible[pid]
+            ]
+            if conflictos and not datos.get('forzar'):
+                resultado.update(estado='conflicto', conflictos=conflictos)
+                continue
+
+            for pid, cantidad in pedidas.items():
+                disponible[pid] -= cantidad
+            venta.folio = next(folios, None) or siguiente_folio()
+            venta.clave_idempotencia = clave
+            vistas.add(clave)
+            aceptadas.append((venta, detalles, resultado))
+
+        if aceptadas:
+            Ventas.objects.bulk_create([venta for venta, _, _ in aceptadas])
+            # No todos los motores devuelven las PK de bulk_create: se recuperan por la clave
+            ids = dict(
+                Ventas.objects.filter(clave_idempotencia__in=[v.clave_idempotencia for v, _, _ in aceptadas])
+                .values_list('clave_idempotencia', 'id')
+            )
+            nuevos_detalles = []
+            unidades = defaultdict(int)
+            for venta, detalles, resultado in aceptadas:
+                venta.id = ids[venta.clave_idempotencia]
+                for detalle in detalles:
+                    detalle.venta_id_id = venta.id
+                    unidades[detalle.producto_id_id] += detalle.cantidad
+                nuevos_detalles.extend(detalles)
+                resultado.update(estado='creada', id=venta.id, folio=venta.folio,
+                                 total=str(venta.total_con_iva))
+            Detalle_Venta.objects.bulk_create(nuevos_detalles)
+            # bulk_create no emite post_save: el evento del dashboard se publica aquí
+            publicar_ventas([venta for venta, _, _ in aceptadas])
+            contar_ventas([venta for venta, _, _ in aceptadas])
+            faltantes_lotes = mover_inventario({}, unidades)
+        else:
+            faltantes_lotes = {}
+
+    return resultados, faltantes_lotes
@@ -0,0 +1,130 @@
+"""
+Calentamiento de workers
+
+Tras un deploy o un reinicio de worker, las primeras peticiones pagan los
+cachés vacíos, la compilación de plantillas, la carga de traducciones y la
+importación de openpyxl. `calentar()` hace ese trabajo antes de atender:
+
+    catalogo      versión del catálogo y lista de categorías (L1 y L2, shop/cache.py)
+    facetas       conteos por categoría y tipo de los filtros de productos
+    permisos      caché de ContentType que usan los permisos y el admin
+    plantillas    compila las plantillas del proyecto en el loader cacheado
+    urls          resolver de URLs y traducciones de LANGUAGE_CODE
+    exportacion   importa openpyxl
+
+Con gunicorn lo llama `post_worker_init` (gunicorn.conf.py): el worker no
+acepta conexiones hasta terminar, así que el tráfico solo llega a workers
+calientes. Con otros servidores (runserver, uvicorn directo)
+CALENTAR_AL_INICIAR lo corre en un hilo desde ShopConfig.ready() y /salud/
+responde 503 mientras tanto.
+
+Un paso que falla (por ejemplo, la BD aún no responde) se registra y no
+detiene a los demás: el worker queda listo, con ese caché frío.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+from django.utils import translation
+
+from .catalogo import categorias_lista, version_catalogo
+from .facetas import facetas
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_estado = {'fase': 'sin_calentar', 'pid': None, 'segundos': None, 'pasos': {}, 'errores': []}
+
+
+def _catalogo():
+    version_catalogo()
+    categorias_lista()
+
+
+def _permisos():
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def _plantillas():
+    raiz = Path(settings.BASE_DIR)
+    motor = engines['django']
+    directorios = [Path(d) for d in (*motor.dirs, *get_app_template_dirs('templates'))]
+    for directorio in directorios:
+        if raiz not in directorio.parents:
+            continue
+        for archivo in directorio.rglob('*'):
+            if archivo.is_file():
+                motor.get_template(archivo.relative_to(directorio).as_posix())
+
+
+def _urls():
+    get_resolver().url_patterns
+    # Carga los catálogos de traducción del idioma del sitio
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+
+
+def _exportacion():
+    importlib.import_module('openpyxl')
+
+
+PASOS = [
+    ('catalogo', _catalogo),
+    ('facetas', facetas),
+    ('permisos', _permisos),
+    ('plantillas', _plantillas),
+    ('urls', _urls),
+    ('exportacion', _exportacion),
+]
+
+
+def estado():
+    with _lock:
+        return {**_estado, 'pasos': dict(_estado['pasos']), 'errores': list(_estado['errores'])}
+
+
+def calentar():
+    """Ejecuta los pasos una vez por proceso y retorna el estado final."""
+    with _lock:
+        hecho = _estado['pid'] == os.getpid()
+        if not hecho:
+            _estado.update(fase='calentando', pid=os.getpid(), segundos=None, pasos={}, errores=[])
+    if hecho:
+        return estado()
+
+    inicio = time.perf_counter()
+    for nombre, paso in PASOS:
+        t = time.perf_counter()
+        try:
+            paso()
+        except Exception:
+            logger.exception('Calentamiento: falló el paso %s', nombre)
+            _estado['errores'].append(nombre)
+        _estado['pasos'][nombre] = round((time.perf_counter() - t) * 1000, 1)
+    # La conexión abierta aquí no es de ninguna petición: que cada una abra la suya
+    connections.close_all()
+
+    with _lock:
+        _estado.update(fase='listo', segundos=round(time.perf_counter() - inicio, 3))
+    logger.info('Worker %s caliente en %.2fs %s', os.getpid(), _estado['segundos'], _estado['pasos'])
+    return estado()
+
+
+def calentar_en_segundo_plano():
+    with _lock:
+        if _estado['pid'] == os.getpid():
+            return
+        _estado['fase'] = 'calentando'
+    threading.Thread(target=calentar, name='calentamiento', daemon=True).start()
@@ -0,0 +1,243 @@
+"""
+Generador de carga con el tráfico de una caja
+
+Cada worker es un hilo que actúa como un vendedor: inicia sesión por el
+formulario (cookie de sesión y token CSRF como un navegador) y repite
+operaciones elegidas al azar según la mezcla configurada:
+
+    login        cierra sesión y vuelve a entrar
+    dashboard    página de inicio del rol + /api/dashboard/contadores/
+    busqueda     /productos/?search=... con un término al azar
+    venta        GET /ventas/crear/ y POST del formulario con su formset de detalles
+    exportacion  /productos/?export=xlsx o /ventas/?export=xlsx
+
+Solo usa la biblioteca estándar (urllib) y habla HTTP con una instancia ya
+levantada (runserver o gunicorn) en localhost, con SQLite o MySQL detrás. La
+latencia de una operación incluye sus redirecciones, como la ve el usuario.
+El generador también consume CPU: en máquinas chicas conviene correrlo con
+menos workers que los del servidor y vigilar que no sea él el cuello de botella.
+"""
+
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+
+MEZCLA_POR_DEFECTO = {'login': 1, 'dashboard': 4, 'busqueda': 6, 'venta': 2, 'exportacion': 1}
+TERMINOS_BUSQUEDA = ['pan', 'marraqueta', 'hallulla', 'torta', 'queque', 'empanada', 'galleta', 'jugo', 'kuchen', '']
+CANALES = ['Local', 'UberEats', 'Instagram', 'WhatsApp']
+TIMEOUT = 30
+
+_SELECT = r'<select[^>]*name="{}"[^>]*>(.*?)</select>'
+_OPCION = re.compile(r'<option value="(\d+)"')
+
+
+class ErrorOperacion(Exception):
+    """La operación respondió, pero no como debía (formulario rechazado, login fallido)."""
+
+
+def parsear_mezcla(texto):
+    """'venta=2,busqueda=6' -> {'venta': 2, 'busqueda': 6}; valida los nombres y los pesos."""
+    mezcla = {}
+    for parte in filter(None, (p.strip() for p in texto.split(','))):
+        nombre, _, peso = parte.partition('=')
+        if nombre not in MEZCLA_POR_DEFECTO:
+            raise ValueError(f'Operación desconocida: {nombre} (usa {", ".join(MEZCLA_POR_DEFECTO)})')
+        if not peso.isdigit():
+            raise ValueError(f'Peso inválido para {nombre}: {peso!r}')
+        mezcla[nombre] = int(peso)
+    if not any(mezcla.values()):
+        raise ValueError('La mezcla no tiene operaciones con peso mayor a 0.')
+    return mezcla
+
+
+def _opciones(html, nombre):
+    bloque = re.search(_SELECT.format(re.escape(nombre)), html, re.S)
+    return _OPCION.findall(bloque.group(1)) if bloque else []
+
+
+class Cajero:
+    """Un vendedor simulado con su propia sesión (cookies) contra `base`."""
+
+    def __init__(self, base, usuario, clave, rnd):
+        self.base = base.rstrip('/')
+        self.usuario = usuario
+        self.clave = clave
+        self.rnd = rnd
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        self.inicio = '/'
+        self.clientes = []
+        self.productos = []
+
+    def _pedir(self, ruta, datos=None):
+        """(estado, ruta final tras redirecciones, cuerpo). Los 4xx/5xx se lanzan como HTTPError."""
+        cuerpo = urlencode(datos, doseq=True).encode() if datos is not None else None
+        request = Request(self.base + ruta, data=cuerpo)
+        if cuerpo is not None:
+            # Django exige el Referer solo con HTTPS; se envía igual para parecerse a un navegador
+            request.add_header('Referer', self.base + ruta)
+        with self.opener.open(request, timeout=TIMEOUT) as response:
+            contenido = response.read()
+            return response.status, response.geturl()[len(self.base):], contenido
+
+    def _csrf(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        raise ErrorOperacion('sin cookie csrftoken')
+
+    def login(self):
+        self._pedir('/logout/')
+        self._pedir('/login/')
+        _, destino, _ = self._pedir('/login/', {
+            'csrfmiddlewaretoken': self._csrf(), 'username': self.usuario, 'password': self.clave,
+        })
+        if destino.startswith('/login/'):
+            raise ErrorOperacion(f'credenciales rechazadas para {self.usuario}')
+        self.inicio = destino
+
+    def dashboard(self):
+        self._pedir(self.inicio)
+        self._pedir('/api/dashboard/contadores/')
+
+    def busqueda(self):
+        self._pedir('/productos/?' + urlencode({'search': self.rnd.choice(TERMINOS_BUSQUEDA)}))
+
+    def venta(self):
+        _, _, html = self._pedir('/ventas/crear/')
+        if not self.productos:
+            html = html.decode()
+            self.clientes = _opciones(html, 'cliente_id')
+            self.productos = _opciones(html, 'detalles-0-producto_id')
+            if not self.clientes or not self.productos:
+                raise ErrorOperacion('el formulario de venta no trae clientes o productos')
+
+        lineas = self.rnd.sample(self.productos, min(len(self.productos), self.rnd.randint(1, 4)))
+        datos = {
+            'csrfmiddlewaretoken': self._csrf(),
+            'cliente_id': self.rnd.choice(self.clientes),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M'),
+            'canal_venta': self.rnd.choice(CANALES),
+            'folio': '', 'descuento': '0', 'monto_pagado': '',
+            'detalles-TOTAL_FORMS': str(len(lineas)),
+            'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '1',
+            'detalles-MAX_NUM_FORMS': '1000',
+        }
+        for i, producto in enumerate(lineas):
+            datos.update({
+                f'detalles-{i}-producto_id': producto,
+                f'detalles-{i}-cantidad': str(self.rnd.randint(1, 3)),
+                f'detalles-{i}-precio_unitario': '',
+                f'detalles-{i}-descuento_pct': '0',
+            })
+        _, destino, _ = self._pedir('/ventas/crear/', datos)
+        if not re.match(r'^/ventas/\d+/$', destino):
+            raise ErrorOperacion('el formulario de venta fue rechazado')
+
+    def exportacion(self):
+        self._pedir(self.rnd.choice(['/productos/', '/ventas/']) + '?export=xlsx')
+
+
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(lambda: defaultdict(int))
+
+    def registrar(self, operacion, segundos, error=None):
+        with self._lock:
+            if error is None:
+                self.latencias[operacion].append(segundos)
+            else:
+                self.errores[operacion][error] += 1
+
+    def resumen(self, duracion):
+        """Filas por operación (y 'total') con throughput, percentiles en ms y tasa de error."""
+        filas = []
+        operaciones = sorted(set(self.latencias) | set(self.errores))
+        todas = [s for op in operaciones for s in self.latencias.get(op, [])]
+        for nombre, latencias, errores in [
+            *[(op, self.latencias.get(op, []), sum(self.errores.get(op, {}).values())) for op in operaciones],
+            ('total', todas, sum(sum(e.values()) for e in self.errores.values())),
+        ]:
+            total = len(latencias) + errores
+            if not total:
+                continue
+            if len(latencias) >= 2:
+                cuantiles = statistics.quantiles(latencias, n=100)
+                p50, p95, p99 = cuantiles[49] * 1000, cuantiles[94] * 1000, cuantiles[98] * 1000
+            else:
+                p50 = p95 = p99 = latencias[0] * 1000 if latencias else 0.0
+            filas.append({
+                'operacion': nombre, 'peticiones': total, 'por_segundo': total / duracion,
+                'p50': p50, 'p95': p95, 'p99': p99, 'error_pct': 100 * errores / total,
+            })
+        return filas
+
+
+def _worker(cajero, mezcla, fin, pendientes, resultados, lock):
+    operaciones, pesos = zip(*[(op, peso) for op, peso in mezcla.items() if peso])
+    try:
+        cajero.login()
+    except (HTTPError, URLError, OSError, ErrorOperacion) as exc:
+        resultados.registrar('login', 0, _nombre_error(exc))
+        return
+
+    while time.monotonic() < fin:
+        with lock:
+            if pendientes[0] is not None:
+                if pendientes[0] <= 0:
+                    return
+                pendientes[0] -= 1
+        operacion = cajero.rnd.choices(operaciones, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            getattr(cajero, operacion)()
+        except (HTTPError, URLError, OSError, ErrorOperacion) as exc:
+            resultados.registrar(operacion, 0, _nombre_error(exc))
+        else:
+            resultados.registrar(operacion, time.perf_counter() - inicio)
+
+
+def _nombre_error(exc):
+    if isinstance(exc, HTTPError):
+        return f'HTTP {exc.code}'
+    if isinstance(exc, ErrorOperacion):
+        return str(exc)
+    return type(exc).__name__
+
+
+def ejecutar(base, usuarios, mezcla=None, workers=8, duracion=60, peticiones=None, semilla=None):
+    """
+    Corre `workers` cajeros contra `base` durante `duracion` segundos (o hasta
+    `peticiones` operaciones). `usuarios` es una lista de (usuario, clave) que
+    se reparte entre los workers. Retorna (Resultados, segundos transcurridos).
+    """
+    mezcla = mezcla or MEZCLA_POR_DEFECTO
+    rnd = random.Random(semilla)
+    resultados = Resultados()
+    lock = threading.Lock()
+    pendientes = [peticiones]
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    hilos = []
+    for n in range(workers):
+        usuario, clave = usuarios[n % len(usuarios)]
+        cajero = Cajero(base, usuario, clave, random.Random(rnd.random()))
+        hilo = threading.Thread(
+            target=_worker, args=(cajero, mezcla, fin, pendientes, resultados, lock), daemon=True,
+        )
+        hilo.start()
+        hilos.append(hilo)
+    for hilo in hilos:
+        hilo.join()
+    return resultados, time.monotonic() - inicio
@@ -0,0 +1,39 @@
+"""
+Listas de catálogo cacheadas
+
+Las listas de catálogo que usan los filtros se guardan en el caché de dos
+niveles (shop/cache.py) con la etiqueta 'catalogo'. Cualquier cambio en
+Categorias o Productos invalida la etiqueta, lo que invalida estas listas y
+los fragmentos de plantilla que usan `catalogo_version` en su clave.
+"""
+
+from .cache import CacheDosNiveles, invalidar, invalidar_con, version
+from .models import Categorias, Productos
+
+
+ETIQUETA = 'catalogo'
+CACHE_TIMEOUT = 60 * 60
+
+_listas = CacheDosNiveles('catalogo', CACHE_TIMEOUT)
+
+
+def version_catalogo():
+    return version(ETIQUETA)
+
+
+def invalidar_catalogo():
+    invalidar(ETIQUETA)
+
+
+def _cacheado(nombre, calcular):
+    return _listas.obtener(nombre, calcular, etiquetas=(ETIQUETA,))
+
+
+def categorias_lista():
+    """[{'id', 'nombre'}] ordenadas por nombre."""
+    return _cacheado('categorias', lambda: list(
+        Categorias.objects.order_by('nombre').values('id', 'nombre')
+    ))
+
+
+invalidar_con(ETIQUETA, Categorias, Productos)
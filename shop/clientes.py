@@ -0,0 +1,217 @@
+"""
+Clientes: claves normalizadas y deduplicación
+
+El RUT se escribe de muchas formas ("12.345.678-5", "12345678-5",
+"123456785", "12.345.678-k") y los pedidos de WhatsApp/Instagram crean
+clientes repetidos. `rut_normalizado` (cuerpo sin ceros a la izquierda,
+guion y dígito verificador en mayúscula) y `correo_normalizado` (sin
+espacios, en minúsculas) se completan al guardar y tienen índice: las
+búsquedas exactas por RUT o correo son una lectura de índice.
+
+`deduplicar_clientes` agrupa los clientes que comparten RUT o correo
+normalizado (unión-búsqueda en memoria sobre una sola lectura de la tabla),
+conserva el más antiguo de cada grupo y reasigna las ventas de los demás
+con un UPDATE ... CASE por lote. Dos RUT distintos son dos personas aunque
+compartan correo (una familia, una empresa): un grupo nunca mezcla RUT
+distintos y esos correos se informan para revisión manual.
+"""
+
+import re
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Clientes, Ventas
+
+
+RUT_PATRON = re.compile(r'^\s*\d{1,3}(?:\.?\d{3})*\s*-?\s*[\dkK]\s*$')
+CORREO_PATRON = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MIN_DIGITOS_RUT = 6
+
+
+def normalizar_rut(rut):
+    """'12.345.678-k' -> '12345678-K'; None si no parece un RUT."""
+    if not rut or not RUT_PATRON.match(rut):
+        return None
+    limpio = re.sub(r'[^\dkK]', '', rut).upper()
+    cuerpo, dv = limpio[:-1].lstrip('0'), limpio[-1]
+    # Un número corto es más probable un folio o un id que un RUT
+    if len(cuerpo) < MIN_DIGITOS_RUT:
+        return None
+    return f'{cuerpo}-{dv}'
+
+
+def normalizar_correo(correo):
+    correo = (correo or '').strip().lower()
+    return correo if CORREO_PATRON.match(correo) else None
+
+
+def buscar_exacto(texto):
+    """
+    Filtro exacto sobre Clientes si `texto` es un RUT o un correo, o None si
+    hay que buscar por coincidencia parcial.
+    """
+    rut = normalizar_rut(texto)
+    if rut:
+        return {'rut_normalizado': rut}
+    correo = normalizar_correo(texto)
+    if correo:
+        return {'correo_normalizado': correo}
+    return None
+
+
+def ids_exactos(texto):
+    """
+    Ids de los clientes cuyo RUT o correo normalizado es `texto`, o None si
+    `texto` no es un RUT ni un correo o si nadie coincide: un número largo
+    también puede ser parte de un folio o de un teléfono, y entonces se
+    busca por coincidencia parcial como siempre.
+    """
+    exacto = buscar_exacto(texto)
+    if not exacto:
+        return None
+    return list(Clientes.objects.filter(**exacto).values_list('id', flat=True)) or None
+
+
+@receiver(pre_save, sender=Clientes, dispatch_uid='clientes_normalizar')
+def _normalizar(sender, instance, **kwargs):
+    # Con save(update_fields=[...]) hay que incluir también las columnas normalizadas
+    instance.rut_normalizado = normalizar_rut(instance.rut)
+    instance.correo_normalizado = normalizar_correo(instance.correo)
+
+
+# ============= DEDUPLICACIÓN =============
+
+class _Conjuntos:
+    """
+    Unión-búsqueda con compresión de caminos; el representante es el id menor.
+    Cada grupo recuerda su RUT y no se une con un grupo de otro RUT.
+    """
+
+    def __init__(self):
+        self.padre = {}
+        self.ruts = {}
+
+    def buscar(self, x):
+        self.padre.setdefault(x, x)
+        raiz = x
+        while self.padre[raiz] != raiz:
+            raiz = self.padre[raiz]
+        while self.padre[x] != raiz:
+            self.padre[x], x = raiz, self.padre[x]
+        return raiz
+
+    def rut(self, x):
+        return self.ruts.get(self.buscar(x))
+
+    def unir(self, a, b, rut=None):
+        """Une los grupos de `a` y `b` (con `rut`, si se indica); False si sus RUT difieren."""
+        a, b = self.buscar(a), self.buscar(b)
+        ruts = {self.ruts.get(a), self.ruts.get(b), rut} - {None}
+        if len(ruts) > 1:
+            return False
+        raiz = min(a, b)
+        self.padre[max(a, b)] = raiz
+        if ruts:
+            self.ruts[raiz] = ruts.pop()
+        return True
+
+
+def grupos_duplicados():
+    """
+    Retorna (grupos, revisar):
+    - grupos: {id conservado: [ids duplicados]} de los clientes que comparten
+      RUT, o correo sin que el grupo resultante reúna RUT distintos.
+    - revisar: [(correo, [ids])] de los correos compartidos por clientes con
+      RUT distintos, que no se agrupan.
+    """
+    conjuntos = _Conjuntos()
+    por_rut, por_correo = {}, {}
+    filas = Clientes.objects.values_list('id', 'rut', 'rut_normalizado', 'correo', 'correo_normalizado')
+    for cliente_id, rut, rut_normalizado, correo, correo_normalizado in filas.iterator(chunk_size=2000):
+        # Normaliza en memoria por si hay filas anteriores a la migración o cargadas sin señales
+        rut = rut_normalizado or normalizar_rut(rut)
+        correo = correo_normalizado or normalizar_correo(correo)
+        if rut:
+            por_rut.setdefault(rut, []).append(cliente_id)
+        if correo:
+            por_correo.setdefault(correo, []).append(cliente_id)
+
+    # Primero el RUT: mismo RUT es la misma persona
+    for rut, ids in por_rut.items():
+        for cliente_id in ids:
+            conjuntos.unir(ids[0], cliente_id, rut)
+
+    # Luego el correo, solo si no junta dos RUT distintos (tampoco por transitividad)
+    revisar = []
+    for correo, ids in por_correo.items():
+        if len(ids) < 2:
+            continue
+        if len({conjuntos.rut(cliente_id) for cliente_id in ids} - {None}) > 1:
+            revisar.append((correo, sorted(ids)))
+            continue
+        for cliente_id in ids[1:]:
+            conjuntos.unir(ids[0], cliente_id)
+
+    grupos = {}
+    for cliente_id in conjuntos.padre:
+        raiz = conjuntos.buscar(cliente_id)
+        if raiz != cliente_id:
+            grupos.setdefault(raiz, []).append(cliente_id)
+    return grupos, revisar
+
+
+def fusionar_grupos(grupos):
+    """
+    Reasigna las ventas de los duplicados al cliente conservado, completa en
+    él el RUT o correo que le falten y elimina los duplicados. Una transacción
+    por llamada: el comando la invoca por lotes de grupos. Los grupos que
+    (por cambios desde que se calcularon) reúnen RUT distintos se omiten.
+    Retorna (clientes eliminados, ventas reasignadas).
+    """
+    if not grupos:
+        return 0, 0
+
+    with transaction.atomic():
+        clientes = Clientes.objects.select_for_update().in_bulk(
+            list(grupos) + [dup for dups in grupos.values() for dup in dups]
+        )
+        vigentes = {}
+        for conservado, dups in grupos.items():
+            miembros = [cliente_id for cliente_id in (conservado, *dups) if cliente_id in clientes]
+            ruts = {clientes[c].rut_normalizado or normalizar_rut(clientes[c].rut) for c in miembros}
+            if conservado in clientes and len(ruts - {None}) <= 1:
+                vigentes[conservado] = miembros[1:]
+        grupos = vigentes
+        destino = {dup: conservado for conservado, dups in grupos.items() for dup in dups}
+        if not destino:
+            return 0, 0
+
+        # Un solo UPDATE para todo el lote; updated_at avisa a los resúmenes incrementales
+        ventas = Ventas.objects.filter(cliente_id__in=list(destino)).update(
+            cliente_id=Case(
+                *[When(cliente_id=dup, then=Value(conservado)) for dup, conservado in destino.items()],
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+        completar = []
+        for conservado, dups in grupos.items():
+            cliente = clientes[conservado]
+            antes = (cliente.rut, cliente.correo)
+            for dup in sorted(dups):
+                cliente.rut = cliente.rut or clientes[dup].rut
+                cliente.correo = cliente.correo or clientes[dup].correo
+            if (cliente.rut, cliente.correo) != antes:
+                completar.append(cliente)
+
+        # El RUT es único: los duplicados se eliminan antes de copiarlo al conservado
+        eliminados, _ = Clientes.objects.filter(id__in=list(destino)).delete()
+        for cliente in completar:
+            cliente.save(update_fields=['rut', 'rut_normalizado', 'correo', 'correo_normalizado', 'updated_at'])
+
+    return eliminados, ventas
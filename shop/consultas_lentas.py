@@ -0,0 +1,214 @@
+"""
+Registro de consultas lentas
+
+Cada consulta que tarda CONSULTAS_LENTAS_MS o más queda registrada con su
+huella (el SQL normalizado: sin literales y con las listas IN colapsadas, de
+modo que `pk IN (%s, %s)` y `pk IN (%s, %s, %s)` cuentan juntas), la vista
+que la originó, los parámetros GET presentes (solo sus nombres: así se ve qué
+combinación de filtros de ventas_list o del admin la produjo) y el sitio del
+código del proyecto que la ejecutó.
+
+A una fracción de las consultas lentas (CONSULTAS_LENTAS_EXPLAIN, y siempre
+la primera vez que el proceso ve una huella) se le guarda además el plan de
+EXPLAIN, ejecutado en la misma conexión y por debajo de los execute_wrapper
+para no contarlo en las métricas ni en el detector de N+1.
+
+Las entradas se agregan como líneas JSON a `<CONSULTAS_LENTAS_DIR>/consultas_lentas.log`,
+compartido por los workers de la máquina; al pasar MAX_TAMANO_ARCHIVO se rota a
+`.log.1` (se conservan las dos últimas rotaciones). Las consultas rápidas solo
+pagan dos lecturas del reloj.
+
+    python manage.py informe_consultas_lentas --top 20 --planes
+
+Fuera de una petición (comandos, shell) se usa `vigilar('etiqueta')`.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .nmas1 import _INSTRUMENTACION
+
+
+MAX_TAMANO_ARCHIVO = 5 * 1024 * 1024
+MAX_FILAS_PLAN = 50
+NOMBRE_ARCHIVO = 'consultas_lentas.log'
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)')
+_ESPACIOS = re.compile(r'\s+')
+
+_explicadas = set()
+
+
+def normalizar(sql):
+    sql = _LITERALES.sub('?', sql)
+    sql = _LISTAS.sub('(...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def huella(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode('utf-8')).hexdigest()[:12]
+
+
+def _sitio(raiz):
+    """Los dos primeros archivos del proyecto en la pila de la consulta en curso."""
+    sitios = []
+    frame = sys._getframe(2)
+    while frame is not None and len(sitios) < 2:
+        archivo = frame.f_code.co_filename
+        if archivo.startswith(raiz) and archivo not in _INSTRUMENTACION and 'site-packages' not in archivo:
+            sitios.append(f"{os.path.relpath(archivo, raiz)}:{frame.f_lineno} ({frame.f_code.co_name})")
+        frame = frame.f_back
+    return ' <- '.join(sitios)
+
+
+def _explicar(conexion, sql, params):
+    """Filas del EXPLAIN como texto (la primera es la cabecera), o el error del motor."""
+    try:
+        with conexion.cursor() as envoltorio:
+            # El cursor del driver no pasa por los execute_wrapper de Django
+            cursor = envoltorio.cursor
+            cursor.execute(f'{conexion.ops.explain_query_prefix()} {sql}', params)
+            filas = cursor.fetchmany(MAX_FILAS_PLAN)
+            columnas = [columna[0] for columna in cursor.description or ()]
+    except conexion.Database.Error as exc:
+        return [f'EXPLAIN falló: {exc}']
+    return [' | '.join(columnas)] + [' | '.join('' if v is None else str(v) for v in fila) for fila in filas]
+
+
+def _ruta(directorio=None):
+    return os.path.join(directorio or settings.CONSULTAS_LENTAS_DIR, NOMBRE_ARCHIVO)
+
+
+def guardar(entrada):
+    # fcntl solo existe en POSIX: se importa aquí para que el módulo cargue en Windows
+    import fcntl
+
+    ruta = _ruta()
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    linea = (json.dumps(entrada, default=str) + '\n').encode('utf-8')
+    with open(ruta, 'ab') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            if archivo.tell() > MAX_TAMANO_ARCHIVO:
+                if os.path.exists(ruta + '.1'):
+                    os.replace(ruta + '.1', ruta + '.2')
+                os.replace(ruta, ruta + '.1')
+            archivo.write(linea)
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def leer(directorio=None):
+    """Entradas registradas, de la más antigua a la más reciente (se omiten líneas ilegibles)."""
+    ruta = _ruta(directorio)
+    for nombre in (ruta + '.2', ruta + '.1', ruta):
+        try:
+            archivo = open(nombre, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with archivo:
+            for linea in archivo:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue
+
+
+def resumir(entradas, vista=None, desde=None):
+    """Agrupa por huella; retorna los grupos ordenados por tiempo total descendente."""
+    grupos = {}
+    for entrada in entradas:
+        if vista and entrada.get('vista') != vista:
+            continue
+        if desde and entrada.get('fecha', '') < desde:
+            continue
+        grupo = grupos.setdefault(entrada['huella'], {
+            'huella': entrada['huella'], 'sql': entrada['sql'], 'veces': 0, 'total_ms': 0.0,
+            'max_ms': 0.0, 'vistas': {}, 'filtros': {}, 'sitios': {}, 'plan': None,
+        })
+        grupo['veces'] += 1
+        grupo['total_ms'] += entrada['ms']
+        grupo['max_ms'] = max(grupo['max_ms'], entrada['ms'])
+        for campo, valor in (('vistas', entrada.get('vista')), ('sitios', entrada.get('sitio'))):
+            if valor:
+                grupo[campo][valor] = grupo[campo].get(valor, 0) + 1
+        filtros = ', '.join(entrada.get('filtros') or ())
+        if filtros:
+            grupo['filtros'][filtros] = grupo['filtros'].get(filtros, 0) + 1
+        if entrada.get('plan'):
+            grupo['plan'] = entrada['plan']
+    return sorted(grupos.values(), key=lambda g: -g['total_ms'])
+
+
+class RegistroLentas:
+    """Wrapper de ejecución que guarda las consultas que superan el umbral."""
+
+    def __init__(self, request=None, etiqueta=''):
+        self.umbral = settings.CONSULTAS_LENTAS_MS
+        self.muestreo = getattr(settings, 'CONSULTAS_LENTAS_EXPLAIN', 0)
+        self.raiz = str(settings.BASE_DIR) + os.sep
+        self.request = request
+        self.etiqueta = etiqueta
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        resultado = execute(sql, params, many, context)
+        ms = (time.perf_counter() - inicio) * 1000
+        if ms >= self.umbral:
+            self._registrar(sql, params, many, ms, context['connection'])
+        return resultado
+
+    def _registrar(self, sql, params, many, ms, conexion):
+        normalizado = normalizar(sql)
+        clave = huella(normalizado)
+        entrada = {
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'huella': clave, 'ms': round(ms, 2), 'sql': normalizado,
+            'vista': self.etiqueta, 'filtros': [], 'sitio': _sitio(self.raiz), 'plan': None,
+        }
+        if self.request is not None:
+            ruta = getattr(self.request, 'resolver_match', None)
+            entrada['vista'] = (ruta.view_name if ruta else None) or self.request.path
+            entrada['filtros'] = sorted(k for k, v in self.request.GET.items() if v)
+        if not many and sql.lstrip()[:6].upper() == 'SELECT' and (
+            clave not in _explicadas or random.random() < self.muestreo
+        ):
+            _explicadas.add(clave)
+            entrada['plan'] = _explicar(conexion, sql, params)
+        try:
+            guardar(entrada)
+        except (OSError, ImportError):
+            pass
+
+
+@contextmanager
+def vigilar(etiqueta='', request=None):
+    """Registra las consultas lentas de todas las conexiones mientras dura el bloque."""
+    registro = RegistroLentas(request, etiqueta)
+    with ExitStack() as pila:
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(registro))
+        yield registro
+
+
+class ConsultasLentasMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONSULTAS_LENTAS_MS', 0):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with vigilar(request=request):
+            return self.get_response(request)
@@ -0,0 +1,70 @@
+"""
+Context processors de Fornería
+"""
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+
+from .cache import CacheDosNiveles, invalidar, invalidar_con
+from .catalogo import version_catalogo
+from .templatetags.user_extras import grupos_usuario
+
+
+PERMISOS_NAVEGACION = ('shop.view_productos', 'shop.view_ventas', 'shop.add_ventas')
+ETIQUETA_PERMISOS = 'permisos'
+
+# Grupos y permisos de navegación por usuario: evita las consultas de grupos y permisos
+# en cada petición. Cambiar grupos o permisos invalida la etiqueta en todos los workers
+_usuarios = CacheDosNiveles('navegacion', 10 * 60, ttl_local=60)
+
+
+def _grupos_y_permisos(user):
+    def calcular():
+        return {
+            'grupos': sorted(grupos_usuario(user)),
+            'permisos': [perm for perm in PERMISOS_NAVEGACION if user.has_perm(perm)],
+        }
+    # is_superuser va en la clave: cambiarlo no pasa por las tablas de grupos y permisos
+    datos = _usuarios.obtener(f'{user.pk}:{int(user.is_superuser)}', calcular, etiquetas=(ETIQUETA_PERMISOS,))
+    # has_group y grupos_usuario no vuelven a consultar en esta petición
+    user._grupos_nombres = frozenset(datos['grupos'])
+    return user._grupos_nombres, datos['permisos']
+
+
+def navegacion(request):
+    """
+    Rol y permisos del usuario, cacheados por usuario.
+    `nav_clave` identifica la variante de la barra de navegación para el caché de fragmentos.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        rol = 'anonimo'
+        permisos = ()
+    else:
+        grupos, permisos = _grupos_y_permisos(user)
+        if user.is_superuser or 'Administrador' in grupos:
+            rol = 'admin'
+        elif 'Editor' in grupos or 'Lector' in grupos:
+            rol = 'vendedor'
+        else:
+            rol = 'otro'
+
+    return {
+        'rol_usuario': rol,
+        'nav_clave': f"{rol}:{','.join(p.split('.')[1] for p in permisos)}",
+        'catalogo_version': version_catalogo,
+    }
+
+
+def _permisos_modificados(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: invalidar(ETIQUETA_PERMISOS))
+
+
+for _relacion in (User.groups, User.user_permissions, Group.permissions):
+    m2m_changed.connect(
+        _permisos_modificados, sender=_relacion.through,
+        dispatch_uid=f'cache_permisos_{_relacion.through.__name__}',
+    )
+invalidar_con(ETIQUETA_PERMISOS, Group, Permission)
@@ -3,6 +3,8 @@ Decoradores personalizados para control de permisos
 """
 
 from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.http import JsonResponse
@@ -83,3 +85,35 @@ def permission_or_redirect(perm_codename, redirect_to, msg="No tienes permisos p
             return view_func(request, *args, **kwargs)
         return _wrapped
     return _decorator
+
+
+def api_permission_required(perm_codename):
+    """Como permission_or_redirect, pero responde JSON (401/403) para clientes fetch."""
+    def _decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Inicia sesión para continuar.'}, status=401)
+            if not request.user.has_perm(perm_codename):
+                return JsonResponse({'error': 'No tienes permisos para esta acción.'}, status=403)
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return _decorator
+
+
+def async_api_permission_required(perm_codename):
+    """Versión de api_permission_required para vistas `async def`."""
+    def _decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped(request, *args, **kwargs):
+            # request.user es perezoso: cargar sesión y usuario toca la BD en modo síncrono
+            autenticado, permitido = await sync_to_async(
+                lambda: (request.user.is_authenticated, request.user.has_perm(perm_codename))
+            )()
+            if not autenticado:
+                return JsonResponse({'error': 'Inicia sesión para continuar.'}, status=401)
+            if not permitido:
+                return JsonResponse({'error': 'No tienes permisos para esta acción.'}, status=403)
+            return await view_func(request, *args, **kwargs)
+        return _wrapped
+    return _decorator
@@ -0,0 +1,314 @@
+"""
+Eventos en vivo para el dashboard
+
+Las señales de los modelos publican eventos (venta nueva, alerta nueva o
+atendida, producto que cruza su stock mínimo) después del commit. Cada
+evento lleva ya calculado el contador que cambia (una consulta por evento,
+no una por dashboard abierto), y los dashboards lo reciben por SSE o por
+long-poll desde un bus en memoria. Ambos necesitan ASGI; bajo WSGI el
+dashboard consulta los contadores cada cierto tiempo.
+
+Backends (settings.EVENTOS_BACKEND):
+- 'local': bus en memoria del proceso. Sirve con un solo worker.
+- 'archivo': los eventos se agregan a un archivo compartido
+  (settings.EVENTOS_DIR) y cada worker lo lee en un hilo y los reparte a
+  sus conexiones. Reemplazo local de un broker para varios workers en la
+  misma máquina. Requiere fcntl (no existe en Windows).
+
+Los ids de evento son `<proceso>:<n>`: si un cliente reconecta a otro
+worker con un id ajeno, recibe primero una foto completa de contadores.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Alertas, Productos, Ventas
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: solo el backend 'local' está disponible
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BUFFER = 500
+MAX_TAMANO_ARCHIVO = 5 * 1024 * 1024
+INTERVALO_LECTURA = 0.25
+
+
+class BusLocal:
+    """Buffer circular de eventos con espera asíncrona para los suscriptores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=TAMANO_BUFFER)
+        self._contador = 0
+        self._proceso = uuid.uuid4().hex[:8]
+        self._suscriptores = set()
+
+    def publicar(self, evento):
+        self._entregar(evento)
+
+    def _entregar(self, evento):
+        with self._lock:
+            self._contador += 1
+            self._buffer.append((self._contador, evento))
+            suscriptores = list(self._suscriptores)
+        # Los publicadores corren en hilos síncronos: se despierta cada loop de forma segura
+        for loop, aviso in suscriptores:
+            loop.call_soon_threadsafe(aviso.set)
+
+    def ultimo_id(self):
+        return f'{self._proceso}:{self._contador}'
+
+    def _pendientes(self, desde):
+        with self._lock:
+            return [(f'{self._proceso}:{n}', evento) for n, evento in self._buffer if n > desde]
+
+    def posicion(self, ultimo_id):
+        """Número local de `ultimo_id`, o None si es de otro proceso o ya salió del buffer."""
+        proceso, _, numero = (ultimo_id or '').partition(':')
+        if proceso != self._proceso or not numero.isdigit():
+            return None
+        numero = int(numero)
+        with self._lock:
+            primero = self._buffer[0][0] if self._buffer else self._contador + 1
+            if numero > self._contador or numero < primero - 1:
+                return None
+        return numero
+
+    async def esperar(self, desde, timeout):
+        """Eventos posteriores a la posición `desde`; espera hasta `timeout` segundos si no hay."""
+        pendientes = self._pendientes(desde)
+        if pendientes:
+            return pendientes
+        aviso = asyncio.Event()
+        suscriptor = (asyncio.get_running_loop(), aviso)
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+        try:
+            pendientes = self._pendientes(desde)
+            if not pendientes:
+                try:
+                    await asyncio.wait_for(aviso.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+                pendientes = self._pendientes(desde)
+            return pendientes
+        finally:
+            with self._lock:
+                self._suscriptores.discard(suscriptor)
+
+
+class BusArchivo(BusLocal):
+    """Bus compartido entre workers de la misma máquina mediante un archivo de eventos."""
+
+    def __init__(self, directorio):
+        if fcntl is None:
+            raise ImproperlyConfigured("EVENTOS_BACKEND='archivo' requiere fcntl (POSIX); use 'local'.")
+        super().__init__()
+        os.makedirs(directorio, exist_ok=True)
+        self._ruta = os.path.join(directorio, 'eventos.log')
+        self._lector_pid = None
+
+    def publicar(self, evento):
+        linea = (json.dumps(evento, default=str) + '\n').encode('utf-8')
+        with open(self._ruta, 'ab') as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                if archivo.tell() > MAX_TAMANO_ARCHIVO:
+                    # Los lectores conservan el descriptor del archivo rotado y lo terminan de leer
+                    os.replace(self._ruta, self._ruta + '.1')
+                archivo.write(linea)
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    async def esperar(self, desde, timeout):
+        self._asegurar_lector()
+        return await super().esperar(desde, timeout)
+
+    def _asegurar_lector(self):
+        # El hilo lector se inicia en cada proceso (después del fork de gunicorn)
+        if self._lector_pid == os.getpid():
+            return
+        with self._lock:
+            if self._lector_pid == os.getpid():
+                return
+            self._lector_pid = os.getpid()
+        threading.Thread(target=self._leer, name='eventos-lector', daemon=True).start()
+
+    def _abrir(self, al_final):
+        while True:
+            try:
+                archivo = open(self._ruta, 'rb')
+            except FileNotFoundError:
+                open(self._ruta, 'ab').close()
+                continue
+            if al_final:
+                archivo.seek(0, os.SEEK_END)
+            return archivo
+
+    def _leer(self):
+        archivo = self._abrir(al_final=True)
+        resto = b''
+        while True:
+            datos = archivo.read()
+            if datos:
+                resto += datos
+                *lineas, resto = resto.split(b'\n')
+                for linea in lineas:
+                    try:
+                        self._entregar(json.loads(linea))
+                    except ValueError:
+                        logger.warning('Evento ilegible en %s', self._ruta)
+                continue
+            try:
+                rotado = os.stat(self._ruta).st_ino != os.fstat(archivo.fileno()).st_ino
+            except FileNotFoundError:
+                rotado = True
+            if rotado:
+                archivo.close()
+                archivo = self._abrir(al_final=False)
+                resto = b''
+                continue
+            time.sleep(INTERVALO_LECTURA)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def obtener_bus():
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                if getattr(settings, 'EVENTOS_BACKEND', 'local') == 'archivo':
+                    _bus = BusArchivo(settings.EVENTOS_DIR)
+                else:
+                    _bus = BusLocal()
+    return _bus
+
+
+def publicar(tipo, calcular):
+    """
+    Publica un evento `tipo` cuando la transacción en curso confirme.
+    `calcular` arma los datos en ese momento, para leer los contadores ya confirmados.
+    """
+    def _enviar():
+        try:
+            obtener_bus().publicar({'tipo': tipo, 'datos': calcular(), 'ts': timezone.now().isoformat()})
+        except Exception:
+            # Un evento perdido solo retrasa el dashboard; nunca debe afectar la venta
+            logger.exception('No se pudo publicar el evento %s', tipo)
+
+    transaction.on_commit(_enviar)
+
+
+# ============= CONTADORES =============
+
+def ventas_hoy():
+    return Ventas.objects.filter(fecha__date=timezone.now().date()).count()
+
+
+def alertas_pendientes():
+    return Alertas.objects.filter(estado='pendiente').count()
+
+
+def publicar_ventas(ventas):
+    """Evento de ventas nuevas; lo usan también los bulk_create que no emiten señales."""
+    ventas = list(ventas)
+
+    def calcular():
+        return {
+            'ventas': [
+                {'id': v.id, 'folio': v.folio, 'total': str(v.total_con_iva), 'canal': v.canal_venta}
+                for v in ventas
+            ],
+            'ventas_hoy': ventas_hoy(),
+        }
+    publicar('venta', calcular)
+
+
+# ============= SEÑALES =============
+
+@receiver(post_save, sender=Ventas, dispatch_uid='eventos_venta_creada')
+def _venta_creada(sender, instance, created, **kwargs):
+    if created:
+        publicar_ventas([instance])
+
+
+@receiver(pre_save, sender=Alertas, dispatch_uid='eventos_alerta_estado_previo')
+def _alerta_estado_previo(sender, instance, update_fields=None, **kwargs):
+    instance._estado_previo = None
+    if instance.pk and not instance._state.adding and (update_fields is None or 'estado' in update_fields):
+        instance._estado_previo = instance.valor_previo('estado')
+
+
+@receiver(post_save, sender=Alertas, dispatch_uid='eventos_alerta_guardada')
+def _alerta_guardada(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and 'estado' not in update_fields:
+        return
+    previo = getattr(instance, '_estado_previo', None)
+    instance.recordar_guardado('estado')
+    if not created and previo == instance.estado:
+        return
+    alerta = {'id': instance.id, 'tipo': instance.tipo_alerta, 'mensaje': instance.mensaje,
+              'estado': instance.estado}
+    publicar('alerta', lambda: {'alerta': alerta, 'alertas_pendientes': alertas_pendientes()})
+
+
+@receiver(post_delete, sender=Alertas, dispatch_uid='eventos_alerta_eliminada')
+def _alerta_eliminada(sender, instance, **kwargs):
+    if instance.estado == 'pendiente':
+        publicar('alerta', lambda: {'alertas_pendientes': alertas_pendientes()})
+
+
+@receiver(pre_save, sender=Productos, dispatch_uid='eventos_stock_previo')
+def _stock_previo(sender, instance, update_fields=None, **kwargs):
+    instance._stock_previo = None
+    if instance.pk and not instance._state.adding and (update_fields is None or 'stock_actual' in update_fields):
+        instance._stock_previo = instance.valor_previo('stock_actual')
+
+
+@receiver(post_save, sender=Productos, dispatch_uid='eventos_stock_umbral')
+def _stock_umbral(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'stock_actual' not in update_fields:
+        return
+    previo = getattr(instance, '_stock_previo', None)
+    instance.recordar_guardado('stock_actual')
+    if not created:
+        publicar_stock(instance, previo)
+
+
+def publicar_stock(producto, previo):
+    """Evento de stock si `producto` cruzó su stock mínimo desde `previo`; lo usan también los bulk_update."""
+    if previo is None or producto.stock_minimo is None:
+        return
+    minimo = producto.stock_minimo
+    actual = producto.stock_actual or 0
+    if (previo > minimo) == (actual > minimo):
+        return
+    datos = {
+        'producto_id': producto.id,
+        'nombre': producto.nombre,
+        'stock': actual,
+        'minimo': minimo,
+        'bajo': actual <= minimo,
+    }
+    publicar('stock', lambda: datos)
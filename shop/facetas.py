@@ -0,0 +1,152 @@
+"""
+Facetas del catálogo de productos
+
+Conteo_Faceta guarda cuántos productos hay por (categoría, tipo). Las señales
+de Productos ajustan la fila afectada con un UPDATE ... SET cantidad =
+cantidad ± 1 dentro de la misma transacción del guardado, así que un rollback
+deshace también el conteo. Los filtros de la lista de productos leen esta
+tabla (una fila por combinación, no una por producto) para mostrar
+"Pan (120)" sin recorrer Productos.
+
+Los conteos son disyuntivos: los de categoría respetan los tipos elegidos y
+los de tipo respetan las categorías elegidas, de modo que cada número indica
+cuántos productos quedarían al marcar esa opción.
+
+Las escrituras que no emiten señales (QuerySet.update, bulk_create,
+bulk_update sobre tipo o categoría, SQL directo) desalinean la tabla:
+`python manage.py reconstruir_facetas` la recalcula completa.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Lower, Trim
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalogo import categorias_lista
+from .models import Conteo_Faceta, Productos
+
+
+CAMPOS_FACETA = ('Categorias_id_id', 'tipo')
+
+
+def normalizar_tipo(tipo):
+    """Los filtros comparan el tipo sin distinguir mayúsculas: se cuenta normalizado."""
+    return (tipo or '').strip().lower()
+
+
+def _ajustar(categoria_id, tipo, delta):
+    tipo = normalizar_tipo(tipo)
+    if not categoria_id or not tipo:
+        return
+    filtro = Conteo_Faceta.objects.filter(categoria_id_id=categoria_id, tipo=tipo)
+    if filtro.update(cantidad=F('cantidad') + delta) or delta < 0:
+        return
+    # Primera vez que aparece la combinación; get_or_create resuelve la carrera con otro proceso
+    _, creado = Conteo_Faceta.objects.get_or_create(
+        categoria_id_id=categoria_id, tipo=tipo, defaults={'cantidad': delta}
+    )
+    if not creado:
+        filtro.update(cantidad=F('cantidad') + delta)
+
+
+def reconstruir_facetas():
+    """Recalcula Conteo_Faceta desde Productos. Devuelve el número de combinaciones."""
+    conteos = (
+        Productos.objects
+        .annotate(tipo_normalizado=Lower(Trim('tipo')))
+        .exclude(tipo_normalizado='')
+        .values('Categorias_id_id', 'tipo_normalizado')
+        .annotate(cantidad=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        Conteo_Faceta.objects.all().delete()
+        Conteo_Faceta.objects.bulk_create([
+            Conteo_Faceta(
+                categoria_id_id=fila['Categorias_id_id'],
+                tipo=fila['tipo_normalizado'],
+                cantidad=fila['cantidad'],
+            )
+            for fila in conteos
+        ], batch_size=500)
+        return Conteo_Faceta.objects.count()
+
+
+def facetas(categorias_sel=(), tipos_sel=()):
+    """
+    Opciones de los filtros con su conteo:
+    {'categorias': [{'id', 'nombre', 'cantidad', 'seleccionada'}],
+     'tipos': [{'valor', 'cantidad', 'seleccionado'}]}
+    Una consulta sobre Conteo_Faceta; los nombres de categoría vienen del catálogo cacheado.
+    """
+    categorias_sel = set(categorias_sel)
+    tipos_sel = {normalizar_tipo(tipo) for tipo in tipos_sel}
+
+    por_categoria = defaultdict(int)
+    por_tipo = defaultdict(int)
+    for categoria_id, tipo, cantidad in (
+        Conteo_Faceta.objects.filter(cantidad__gt=0).values_list('categoria_id_id', 'tipo', 'cantidad')
+    ):
+        if not tipos_sel or tipo in tipos_sel:
+            por_categoria[categoria_id] += cantidad
+        if not categorias_sel or categoria_id in categorias_sel:
+            por_tipo[tipo] += cantidad
+
+    categorias = [
+        {
+            'id': categoria['id'],
+            'nombre': categoria['nombre'],
+            'cantidad': por_categoria.get(categoria['id'], 0),
+            'seleccionada': categoria['id'] in categorias_sel,
+        }
+        for categoria in categorias_lista()
+    ]
+    tipos = [
+        {'valor': tipo, 'cantidad': por_tipo.get(tipo, 0), 'seleccionado': tipo in tipos_sel}
+        for tipo in sorted(set(por_tipo) | tipos_sel)
+    ]
+    return {'categorias': categorias, 'tipos': tipos}
+
+
+# ============= SEÑALES =============
+
+@receiver(pre_save, sender=Productos, dispatch_uid='facetas_valores_previos')
+def _valores_previos(sender, instance, update_fields=None, **kwargs):
+    instance._faceta_previa = None
+    if not instance.pk or instance._state.adding:
+        return
+    if update_fields is not None and not {'tipo', 'Categorias_id'} & set(update_fields):
+        return
+    cargados = getattr(instance, '_valores_cargados', {})
+    if all(campo in cargados for campo in CAMPOS_FACETA):
+        # Instancia leída de la BD en esta petición: no hace falta otra consulta
+        instance._faceta_previa = tuple(cargados[campo] for campo in CAMPOS_FACETA)
+    else:
+        instance._faceta_previa = (
+            Productos.objects.filter(pk=instance.pk).values_list(*CAMPOS_FACETA).first()
+        )
+
+
+@receiver(post_save, sender=Productos, dispatch_uid='facetas_producto_guardado')
+def _producto_guardado(sender, instance, created, **kwargs):
+    actual = (instance.Categorias_id_id, normalizar_tipo(instance.tipo))
+    previa = getattr(instance, '_faceta_previa', None)
+    if created:
+        _ajustar(*actual, 1)
+    elif previa is not None and (previa[0], normalizar_tipo(previa[1])) != actual:
+        _ajustar(*previa, -1)
+        _ajustar(*actual, 1)
+    else:
+        return
+    # Un segundo save() de la misma instancia debe comparar contra lo recién guardado
+    cargados = getattr(instance, '_valores_cargados', {})
+    cargados.update(zip(CAMPOS_FACETA, (instance.Categorias_id_id, instance.tipo)))
+    instance._valores_cargados = cargados
+
+
+@receiver(post_delete, sender=Productos, dispatch_uid='facetas_producto_eliminado')
+def _producto_eliminado(sender, instance, **kwargs):
+    _ajustar(instance.Categorias_id_id, instance.tipo, -1)
@@ -0,0 +1,76 @@
+"""
+Generador de folios concurrente
+
+Cada proceso reserva un bloque de números de la tabla Secuencias_Folio con
+un único UPDATE atómico y luego entrega folios desde memoria, sin consultas
+adicionales por venta. La unicidad final la garantiza la restricción UNIQUE
+de Ventas.folio. Los números de un bloque no usado (reinicio del proceso)
+quedan como saltos en la numeración.
+"""
+
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Secuencias_Folio
+
+
+PREFIJO_VENTAS = 'VENT'
+# Folio completo (PREFIJO-00001): la búsqueda lo resuelve con el índice UNIQUE de Ventas.folio
+FOLIO_PATRON = re.compile(r'^[A-Za-z]+-\d{5,}$')
+
+_bloques = {}
+_lock = threading.Lock()
+
+
+def _reiniciar_bloques():
+    # Un proceso hijo (fork de gunicorn) no debe reutilizar los bloques del padre
+    _bloques.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_bloques)
+
+
+def reservar_bloque(nombre, tamano):
+    """Reserva `tamano` números consecutivos de la secuencia. Retorna (primero, ultimo)."""
+    with transaction.atomic():
+        actualizados = Secuencias_Folio.objects.filter(nombre=nombre).update(
+            ultimo_valor=F('ultimo_valor') + tamano
+        )
+        if not actualizados:
+            Secuencias_Folio.objects.get_or_create(nombre=nombre)
+            Secuencias_Folio.objects.filter(nombre=nombre).update(ultimo_valor=F('ultimo_valor') + tamano)
+        # El UPDATE mantiene el bloqueo de la fila hasta el commit: la lectura es consistente
+        ultimo = Secuencias_Folio.objects.filter(nombre=nombre).values_list('ultimo_valor', flat=True).get()
+    return ultimo - tamano + 1, ultimo
+
+
+def formatear_folio(nombre, valor):
+    return f"{nombre}-{valor:05d}"
+
+
+def siguiente_folio(nombre=PREFIJO_VENTAS):
+    """
+    Entrega el siguiente folio de la secuencia `nombre`.
+
+    Debe llamarse fuera de la transacción de la venta: si se llama dentro de
+    un bloque atómico se reserva un único número sin guardarlo en memoria,
+    para que un rollback no deje números entregados que otra reserva repita.
+    """
+    if connection.in_atomic_block:
+        valor, _ = reservar_bloque(nombre, 1)
+        return formatear_folio(nombre, valor)
+
+    tamano = getattr(settings, 'FOLIO_TAMANO_BLOQUE', 50)
+    with _lock:
+        bloque = _bloques.get(nombre)
+        if bloque is None or bloque[0] > bloque[1]:
+            bloque = _bloques[nombre] = list(reservar_bloque(nombre, tamano))
+        valor = bloque[0]
+        bloque[0] += 1
+    return formatear_folio(nombre, valor)
@@ -190,16 +190,14 @@ class VentaForm(forms.ModelForm):
         elif not self.instance.pk and not self.data and 'fecha' not in self.initial:
             self.initial['fecha'] = timezone.now().strftime('%Y-%m-%dT%H:%M')
 
-    def clean_folio(self):
-        folio = self.cleaned_data.get('folio')
-        if not folio:
-            return folio
-        qs = Ventas.objects.filter(folio=folio)
-        if self.instance.pk:
-            qs = qs.exclude(pk=self.instance.pk)
-        if qs.exists():
-            raise ValidationError('Ya existe una venta con este folio.')
-        return folio
+    def validate_unique(self):
+        # La unicidad del folio la garantiza la restricción UNIQUE al guardar (ver _guardar_venta)
+        exclude = self._get_validation_exclusions()
+        exclude.add('folio')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
 
 
 class DetalleVentaForm(forms.ModelForm):
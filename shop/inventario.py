@@ -0,0 +1,156 @@
+"""
+Stock histórico a partir del libro de movimientos
+
+El stock de un producto en un instante se obtiene cargando el corte
+(Cortes_Stock) más cercano anterior a ese instante y sumando, en una sola
+consulta agregada, los movimientos registrados después del corte.
+
+Convención de signos de Movimientos_Inventario:
+- entrada: suma `cantidad`
+- salida: resta `cantidad`
+- ajuste: suma `cantidad` (un ajuste negativo se registra con cantidad negativa)
+
+Las ventas (formulario web, admin y caja) mueven el stock con
+`mover_stock_ventas`, que deja la salida o entrada correspondiente en el
+libro con origen 'venta'.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, When
+from django.utils import timezone
+
+from .eventos import publicar_stock
+from .models import Cortes_Stock, Movimientos_Inventario, Productos
+
+
+TAMANO_LOTE_CORTE = 1000
+
+CANTIDAD_CON_SIGNO = Case(
+    When(tipo_movimiento='salida', then=-F('cantidad')),
+    default=F('cantidad'),
+    output_field=IntegerField(),
+)
+
+
+def _corte_base(momento):
+    """Último corte con fecha <= momento: (fecha, creado, {producto_id: stock})."""
+    corte = (
+        Cortes_Stock.objects.filter(fecha__lte=momento)
+        .values('fecha')
+        .annotate(creado=Max('created_at'))
+        .order_by('-fecha')
+        .first()
+    )
+    if corte is None:
+        return None, None, {}
+    stocks = dict(
+        Cortes_Stock.objects.filter(fecha=corte['fecha']).values_list('producto_id', 'stock')
+    )
+    return corte['fecha'], corte['creado'], stocks
+
+
+def stock_en(momento=None, productos_ids=None):
+    """
+    Stock por producto en `momento` (por defecto, ahora) según el libro de movimientos.
+
+    Retorna {producto_id: stock}. Los movimientos con fecha anterior al corte
+    pero registrados después de crearlo (cargas retroactivas) también se suman.
+    """
+    momento = momento or timezone.now()
+    fecha_corte, creado_corte, stocks = _corte_base(momento)
+
+    movimientos = Movimientos_Inventario.objects.filter(fecha__lte=momento)
+    if fecha_corte is not None:
+        movimientos = movimientos.filter(
+            Q(fecha__gt=fecha_corte) | Q(created_at__gt=creado_corte)
+        )
+    if productos_ids is not None:
+        seleccion = set(productos_ids)
+        movimientos = movimientos.filter(producto_id__in=seleccion)
+        stocks = {pid: stock for pid, stock in stocks.items() if pid in seleccion}
+
+    deltas = (
+        movimientos.values('producto_id')
+        .annotate(delta=Sum(CANTIDAD_CON_SIGNO))
+        .order_by()
+    )
+    for fila in deltas:
+        stocks[fila['producto_id']] = stocks.get(fila['producto_id'], 0) + (fila['delta'] or 0)
+
+    if productos_ids is not None:
+        for producto_id in productos_ids:
+            stocks.setdefault(producto_id, 0)
+    return stocks
+
+
+def mover_stock_ventas(unidades):
+    """
+    Descuenta de Productos.stock_actual las unidades vendidas ({producto_id: unidades};
+    negativas si se eliminó la venta o se bajó una cantidad), sin bajar de 0, y
+    registra cada cambio en el libro como salida o entrada de origen 'venta'.
+
+    Debe llamarse dentro de la transacción de la venta. Los productos se
+    bloquean y se actualizan con un único UPDATE; como bulk_update no emite
+    señales, el evento de stock mínimo se publica aquí.
+    """
+    unidades = {producto_id: cantidad for producto_id, cantidad in unidades.items() if cantidad}
+    if not unidades:
+        return
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        productos = list(
+            Productos.objects.select_for_update()
+            .filter(pk__in=unidades.keys())
+            .order_by('id')
+            .only('id', 'nombre', 'stock_actual', 'stock_minimo')
+        )
+        movimientos = []
+        for producto in productos:
+            previo = producto.stock_actual or 0
+            producto.stock_actual = max(previo - unidades[producto.id], 0)
+            cambio = producto.stock_actual - previo
+            if cambio:
+                movimientos.append(Movimientos_Inventario(
+                    producto_id=producto, tipo_movimiento='entrada' if cambio > 0 else 'salida',
+                    cantidad=abs(cambio), fecha=ahora, origen='venta',
+                ))
+            publicar_stock(producto, previo)
+        Productos.objects.bulk_update(productos, ['stock_actual'])
+        Movimientos_Inventario.objects.bulk_create(movimientos)
+
+
+def generar_corte(momento=None):
+    """Guarda un corte de stock de todos los productos en `momento`. Retorna filas creadas."""
+    momento = momento or timezone.now()
+    stocks = stock_en(momento)
+    for producto_id in Productos.objects.values_list('id', flat=True):
+        stocks.setdefault(producto_id, 0)
+    with transaction.atomic():
+        Cortes_Stock.objects.filter(fecha=momento).delete()
+        Cortes_Stock.objects.bulk_create(
+            [Cortes_Stock(producto_id_id=pid, fecha=momento, stock=stock) for pid, stock in stocks.items()],
+            batch_size=TAMANO_LOTE_CORTE,
+        )
+    return len(stocks)
+
+
+def verificar_stock():
+    """
+    Compara el stock derivado del libro con Productos.stock_actual para todo el catálogo.
+    Retorna la lista de diferencias (producto, stock_actual, stock_libro, diferencia).
+    """
+    productos = list(Productos.objects.only('id', 'nombre', 'stock_actual').order_by('id'))
+    stocks = stock_en()
+    diferencias = []
+    for producto in productos:
+        actual = producto.stock_actual or 0
+        libro = stocks.get(producto.id, 0)
+        if actual != libro:
+            diferencias.append({
+                'producto': producto,
+                'stock_actual': actual,
+                'stock_libro': libro,
+                'diferencia': actual - libro,
+            })
+    return diferencias
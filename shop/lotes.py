@@ -0,0 +1,123 @@
+"""
+Consumo de lotes FIFO por caducidad
+
+Las ventas descuentan unidades de los lotes que vencen antes. Los lotes
+se bloquean con SELECT ... FOR UPDATE y se actualizan con un único UPDATE
+(bulk_update genera un CASE por fila), por lo que el costo no crece con el
+número de líneas de la venta.
+
+Eliminar una venta o bajar una cantidad devuelve las unidades en el orden
+inverso: primero a los lotes de caducidad más lejana, que son los últimos
+que se consumieron, sin pasar de su cantidad inicial.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Detalle_Venta, Lotes
+
+
+def cantidades_por_producto(venta):
+    """Unidades por producto registradas en la venta (una consulta agregada)."""
+    if not venta.pk:
+        return {}
+    return dict(
+        Detalle_Venta.objects.filter(venta_id=venta)
+        .values_list('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .order_by()
+    )
+
+
+def consumir_lotes(cantidades):
+    """
+    Descuenta `cantidades` ({producto_id: unidades}) de los lotes vigentes,
+    empezando por los de caducidad más próxima.
+
+    Debe llamarse dentro de la transacción de la venta. Retorna las unidades
+    que no pudieron cubrirse con lotes, por producto; los productos sin lotes
+    registrados no se consideran faltantes.
+    """
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+    if not cantidades:
+        return {}
+
+    with transaction.atomic():
+        lotes = list(
+            Lotes.objects.select_for_update()
+            .disponibles()
+            .filter(producto_id__in=cantidades.keys(), caducidad__gte=timezone.localdate())
+            .order_by('producto_id', 'caducidad', 'id')
+            .only('id', 'producto_id', 'cantidad_disponible')
+        )
+
+        pendientes = dict(cantidades)
+        con_lotes = set()
+        modificados = []
+        for lote in lotes:
+            con_lotes.add(lote.producto_id_id)
+            pendiente = pendientes.get(lote.producto_id_id, 0)
+            if pendiente <= 0:
+                continue
+            usado = min(pendiente, lote.cantidad_disponible)
+            lote.cantidad_disponible -= usado
+            pendientes[lote.producto_id_id] = pendiente - usado
+            modificados.append(lote)
+
+        if modificados:
+            Lotes.objects.bulk_update(modificados, ['cantidad_disponible'])
+
+    return {
+        producto_id: faltante
+        for producto_id, faltante in pendientes.items()
+        if faltante > 0 and producto_id in con_lotes
+    }
+
+
+def devolver_lotes(cantidades):
+    """
+    Devuelve `cantidades` ({producto_id: unidades}) a los lotes del producto,
+    en orden inverso al consumo. Debe llamarse dentro de la transacción de la
+    venta. Retorna las unidades que no cupieron en ningún lote, por producto.
+    """
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+    if not cantidades:
+        return {}
+
+    with transaction.atomic():
+        lotes = list(
+            Lotes.objects.select_for_update()
+            .filter(producto_id__in=cantidades.keys(), deleted_at__isnull=True,
+                    cantidad_disponible__lt=F('cantidad_inicial'))
+            .order_by('producto_id', '-caducidad', '-id')
+            .only('id', 'producto_id', 'cantidad_disponible', 'cantidad_inicial')
+        )
+
+        pendientes = dict(cantidades)
+        modificados = []
+        for lote in lotes:
+            pendiente = pendientes[lote.producto_id_id]
+            if pendiente <= 0:
+                continue
+            devuelto = min(pendiente, lote.cantidad_inicial - lote.cantidad_disponible)
+            lote.cantidad_disponible += devuelto
+            pendientes[lote.producto_id_id] = pendiente - devuelto
+            modificados.append(lote)
+
+        if modificados:
+            Lotes.objects.bulk_update(modificados, ['cantidad_disponible'])
+
+    return {producto_id: sobrante for producto_id, sobrante in pendientes.items() if sobrante > 0}
+
+
+def diferencia_cantidades(anteriores, nuevas):
+    """Unidades adicionales por producto entre dos lecturas de cantidades_por_producto."""
+    diferencia = defaultdict(int)
+    for producto_id, cantidad in nuevas.items():
+        diferencia[producto_id] += cantidad
+    for producto_id, cantidad in anteriores.items():
+        diferencia[producto_id] -= cantidad
+    return dict(diferencia)
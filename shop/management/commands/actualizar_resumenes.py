@@ -0,0 +1,25 @@
+"""
+Comando para actualizar la tabla pre-agregada de reportes (Resumen_Ventas)
+Pensado para ejecutarse periódicamente (cron / systemd timer)
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.reportes import actualizar_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Actualiza Resumen_Ventas de forma incremental desde la última marca de agua'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Reconstruye todo el resumen (usar tras update() o delete() masivos de ventas)',
+        )
+
+    def handle(self, *args, **options):
+        resultado = actualizar_resumenes(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Resumen actualizado: {resultado['dias']} días recalculados, {resultado['filas']} filas"
+        ))
@@ -0,0 +1,122 @@
+"""
+Comando para comparar el rendimiento de servidores WSGI y ASGI con muchas conexiones abiertas
+Cada conexión mantiene keep-alive y repite la petición; se mide throughput y latencia por objetivo
+
+Ejemplo (ambos servidores en la misma máquina y con el mismo número de workers):
+    python manage.py benchmark_concurrencia \
+        --objetivo wsgi=http://127.0.0.1:8001/api/productos/ \
+        --objetivo asgi=http://127.0.0.1:8002/api/productos/ \
+        --conexiones 200 --peticiones 5000 --cookie "sessionid=..."
+"""
+
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def _leer_respuesta(reader):
+    cabecera = await reader.readuntil(b'\r\n\r\n')
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    estado = int(lineas[0].split()[1])
+    headers = {}
+    for linea in lineas[1:]:
+        if ':' in linea:
+            nombre, valor = linea.split(':', 1)
+            headers[nombre.strip().lower()] = valor.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            tamano = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(tamano + 2)
+            if tamano == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return estado, headers.get('connection', '').lower() == 'close'
+
+
+async def _conexion(url, peticion, pendientes, latencias, errores):
+    reader = writer = None
+    while pendientes[0] > 0:
+        pendientes[0] -= 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+            inicio = time.perf_counter()
+            writer.write(peticion)
+            await writer.drain()
+            estado, cerrar = await _leer_respuesta(reader)
+            latencias.append(time.perf_counter() - inicio)
+            if estado >= 400:
+                errores[estado] = errores.get(estado, 0) + 1
+            if cerrar:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+            errores[type(exc).__name__] = errores.get(type(exc).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _medir(url, conexiones, peticiones, cookie):
+    ruta = url.path or '/'
+    if url.query:
+        ruta += '?' + url.query
+    peticion = (
+        f'GET {ruta} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: keep-alive\r\n'
+        + (f'Cookie: {cookie}\r\n' if cookie else '')
+        + '\r\n'
+    ).encode('latin-1')
+
+    pendientes = [peticiones]
+    latencias = []
+    errores = {}
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        _conexion(url, peticion, pendientes, latencias, errores) for _ in range(conexiones)
+    ])
+    return time.perf_counter() - inicio, latencias, errores
+
+
+class Command(BaseCommand):
+    help = 'Mide peticiones por segundo y latencia con N conexiones concurrentes contra uno o más servidores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objetivo', action='append', required=True,
+                            help='nombre=url, repetible (por ejemplo wsgi=http://127.0.0.1:8001/api/info/)')
+        parser.add_argument('--conexiones', type=int, default=100, help='Conexiones abiertas simultáneamente')
+        parser.add_argument('--peticiones', type=int, default=2000, help='Peticiones totales por objetivo')
+        parser.add_argument('--cookie', default='', help='Cabecera Cookie (sessionid) para endpoints con login')
+
+    def handle(self, *args, **options):
+        objetivos = []
+        for objetivo in options['objetivo']:
+            nombre, _, url = objetivo.partition('=')
+            url = urlsplit(url)
+            if not nombre or url.scheme != 'http' or not url.hostname:
+                raise CommandError(f'Objetivo inválido: {objetivo} (usa nombre=http://host:puerto/ruta)')
+            objetivos.append((nombre, url))
+
+        self.stdout.write(
+            f"{'Objetivo':<10} {'Pet/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Errores':>8}"
+        )
+        for nombre, url in objetivos:
+            duracion, latencias, errores = asyncio.run(
+                _medir(url, options['conexiones'], options['peticiones'], options['cookie'])
+            )
+            if len(latencias) < 2:
+                self.stdout.write(self.style.ERROR(f'{nombre}: sin respuestas ({errores})'))
+                continue
+            cuantiles = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f"{nombre:<10} {len(latencias) / duracion:>9.1f} {cuantiles[49] * 1000:>8.1f} "
+                f"{cuantiles[94] * 1000:>8.1f} {cuantiles[98] * 1000:>8.1f} {sum(errores.values()):>8}"
+            )
+            if errores:
+                self.stdout.write(self.style.WARNING(f'  detalle de errores: {errores}'))
@@ -0,0 +1,106 @@
+"""
+Comando para comparar backends de sesión con el patrón de uso de Fornería
+Simula un login (varias claves escritas) seguido de N páginas que leen la sesión
+y vuelven a asignar la preferencia de resultados por página; una de cada
+--cambio-cada páginas la cambia de verdad. Pasa cada petición por SessionMiddleware.
+
+Ejemplo:
+    python manage.py benchmark_sesiones --paginas 2000
+    python manage.py benchmark_sesiones --engine django.contrib.sessions.backends.db --engine shop.sesiones.db
+"""
+
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'shop.sesiones.db',
+    'shop.sesiones.cached_db',
+    'shop.sesiones.signed_cookies',
+]
+PER_PAGE_CHOICES = [5, 15, 30]
+
+
+def _login(request):
+    request.session['_auth_user_id'] = '1'
+    request.session['forneria_user_id'] = 1
+    request.session['forneria_username'] = 'benchmark'
+    request.session['forneria_login_time'] = timezone.now().isoformat()
+    request.session['visitas_forneria'] = request.session.get('visitas_forneria', 0) + 1
+    return HttpResponse()
+
+
+def _pagina(per_page):
+    def vista(request):
+        request.session.get('_auth_user_id')
+        request.session['productos_per_page'] = per_page
+        return HttpResponse()
+    return vista
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas, escrituras y tiempo por petición de cada backend de sesión'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', action='append',
+                            help='SESSION_ENGINE a medir, repetible (default: los de Django y shop.sesiones)')
+        parser.add_argument('--paginas', type=int, default=1000, help='Páginas vistas tras el login')
+        parser.add_argument('--cambio-cada', type=int, default=20,
+                            help='Cada cuántas páginas cambia la preferencia (default: 20)')
+
+    def _medir(self, engine, paginas, cambio_cada):
+        factory = RequestFactory()
+        with override_settings(SESSION_ENGINE=engine):
+            cookie_nombre = settings.SESSION_COOKIE_NAME
+            request = factory.post('/login/')
+            response = SessionMiddleware(_login)(request)
+            cookie = response.cookies[cookie_nombre].value
+
+            tiempos = []
+            escrituras = 0
+            with CaptureQueriesContext(connection) as consultas:
+                for n in range(paginas):
+                    per_page = PER_PAGE_CHOICES[(n // cambio_cada) % len(PER_PAGE_CHOICES)]
+                    request = factory.get('/productos/')
+                    request.COOKIES[cookie_nombre] = cookie
+                    inicio = time.perf_counter()
+                    response = SessionMiddleware(_pagina(per_page))(request)
+                    tiempos.append(time.perf_counter() - inicio)
+                    if cookie_nombre in response.cookies:
+                        escrituras += 1
+                        cookie = response.cookies[cookie_nombre].value
+
+            request = factory.get('/logout/')
+            request.COOKIES[cookie_nombre] = cookie
+            SessionMiddleware(lambda r: r.session.flush() or HttpResponse())(request)
+
+        return {
+            'consultas': len(consultas) / paginas,
+            'escrituras': escrituras,
+            'p50': statistics.median(tiempos) * 1000,
+            'total': sum(tiempos),
+            'cookie': len(cookie),
+        }
+
+    def handle(self, *args, **options):
+        paginas = max(options['paginas'], 1)
+        cambio_cada = max(options['cambio_cada'], 1)
+        self.stdout.write(
+            f"{'Backend':<38} {'Consultas/pág':>13} {'Escrituras':>10} {'p50 ms':>8} {'Total s':>8} {'Cookie':>7}"
+        )
+        for engine in options['engine'] or ENGINES:
+            r = self._medir(engine, paginas, cambio_cada)
+            self.stdout.write(
+                f"{engine:<38} {r['consultas']:>13.2f} {r['escrituras']:>10} {r['p50']:>8.3f} "
+                f"{r['total']:>8.2f} {r['cookie']:>7}"
+            )
@@ -0,0 +1,54 @@
+"""
+Comando para sugerir puntos de reposición y producción de productos propios
+Por defecto solo muestra las sugerencias; con --aplicar las guarda en Productos
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Calcula punto de reorden y producción sugerida para productos de elaboración propia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=56, help='Días de historial a considerar')
+        parser.add_argument('--ventana', type=int, default=7, help='Días del promedio móvil')
+        parser.add_argument('--lead-time', type=int, default=1, help='Días hasta tener nueva producción')
+        parser.add_argument('--cobertura', type=int, default=1, help='Días que debe cubrir cada producción')
+        parser.add_argument('--nivel-servicio', type=float, default=0.95, help='Probabilidad de no quebrar stock')
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Guarda stock_minimo/stock_maximo sugeridos en los productos')
+
+    def handle(self, *args, **options):
+        try:
+            from shop.pronostico import aplicar_reposicion, calcular_reposicion
+        except ImportError as exc:
+            raise CommandError(f'Este comando requiere NumPy ({exc}).')
+
+        if options['dias'] < 2:
+            raise CommandError('Se necesitan al menos 2 días de historial.')
+        if not 0 < options['nivel_servicio'] < 1:
+            raise CommandError('El nivel de servicio debe estar entre 0 y 1.')
+
+        resultados = calcular_reposicion(
+            dias=options['dias'],
+            ventana=options['ventana'],
+            lead_time=options['lead_time'],
+            cobertura=options['cobertura'],
+            nivel_servicio=options['nivel_servicio'],
+        )
+        if not resultados:
+            self.stdout.write(self.style.WARNING('No hay productos propios con historial de demanda.'))
+            return
+
+        self.stdout.write(f"{'Producto':<30} {'Dem/día':>8} {'Seg.':>6} {'Reorden':>8} {'Objetivo':>9} {'Producir':>9}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['producto'].nombre[:30]:<30} {r['demanda_diaria']:>8} {r['stock_seguridad']:>6} "
+                f"{r['punto_reorden']:>8} {r['nivel_objetivo']:>9} {r['produccion_sugerida']:>9}"
+            )
+
+        if options['aplicar']:
+            actualizados = aplicar_reposicion(resultados)
+            self.stdout.write(self.style.SUCCESS(f'✓ {actualizados} productos actualizados'))
+        else:
+            self.stdout.write(self.style.WARNING('Modo simulación: usa --aplicar para guardar los valores.'))
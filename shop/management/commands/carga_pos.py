@@ -0,0 +1,71 @@
+"""
+Comando para generar carga realista contra una instancia local de Fornería
+Varios vendedores simulados (hilos con su propia sesión y token CSRF) mezclan
+logins, refrescos del dashboard, búsquedas de productos, ventas con su formset
+de detalles y exportaciones a Excel. Sirve para dimensionar los workers de
+gunicorn: repetir con distintos --workers del servidor y comparar p95 y errores.
+
+Ejemplo (datos de seed_data, servidor ya levantado):
+    gunicorn forneria.wsgi -w 4 -b 127.0.0.1:8000 &
+    python manage.py carga_pos --url http://127.0.0.1:8000 --workers 16 --duracion 60 \
+        --usuario editor_maria:Editor123! --mezcla login=1,dashboard=4,busqueda=6,venta=2,exportacion=1
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.carga import MEZCLA_POR_DEFECTO, ejecutar, parsear_mezcla
+
+
+class Command(BaseCommand):
+    help = 'Genera tráfico de caja (login, dashboard, búsquedas, ventas, exportaciones) y mide throughput y latencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Instancia a cargar (default: %(default)s)')
+        parser.add_argument('--usuario', action='append',
+                            help='usuario:clave, repetible; se reparten entre los workers (default: editor_maria)')
+        parser.add_argument('--mezcla', default=','.join(f'{k}={v}' for k, v in MEZCLA_POR_DEFECTO.items()),
+                            help='Pesos por operación (default: %(default)s)')
+        parser.add_argument('--workers', type=int, default=8, help='Vendedores simultáneos (default: 8)')
+        parser.add_argument('--duracion', type=float, default=60, help='Segundos de carga (default: 60)')
+        parser.add_argument('--peticiones', type=int, help='Detener tras N operaciones (además de --duracion)')
+        parser.add_argument('--semilla', type=int, help='Semilla para repetir la misma secuencia de operaciones')
+
+    def handle(self, *args, **options):
+        try:
+            mezcla = parsear_mezcla(options['mezcla'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        usuarios = []
+        for valor in options['usuario'] or ['editor_maria:Editor123!']:
+            usuario, separador, clave = valor.partition(':')
+            if not separador or not usuario:
+                raise CommandError(f'Usuario inválido: {valor} (usa usuario:clave)')
+            usuarios.append((usuario, clave))
+
+        workers = max(options['workers'], 1)
+        self.stdout.write(
+            f"Cargando {options['url']} con {workers} workers durante {options['duracion']:.0f}s "
+            f"({', '.join(f'{k}={v}' for k, v in mezcla.items())})..."
+        )
+        resultados, duracion = ejecutar(
+            options['url'], usuarios, mezcla, workers, options['duracion'],
+            options['peticiones'], options['semilla'],
+        )
+
+        filas = resultados.resumen(duracion)
+        if not filas:
+            raise CommandError('No se completó ninguna operación.')
+        self.stdout.write(
+            f"\n{'Operación':<12} {'Peticiones':>10} {'Op/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Error %':>8}"
+        )
+        for fila in filas:
+            linea = (
+                f"{fila['operacion']:<12} {fila['peticiones']:>10} {fila['por_segundo']:>8.1f} {fila['p50']:>8.1f} "
+                f"{fila['p95']:>8.1f} {fila['p99']:>8.1f} {fila['error_pct']:>8.1f}"
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(linea) if fila['operacion'] == 'total' else linea)
+
+        for operacion, errores in sorted(resultados.errores.items()):
+            detalle = ', '.join(f'{nombre}: {cantidad}' for nombre, cantidad in errores.items())
+            self.stdout.write(self.style.WARNING(f'  errores en {operacion}: {detalle}'))
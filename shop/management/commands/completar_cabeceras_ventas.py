@@ -0,0 +1,43 @@
+"""
+Comando para poblar los campos desnormalizados de Ventas
+(cliente_nombre, cliente_correo, items_count, items_qty) por lotes de id.
+Ejecutar una vez tras la migración 0010 y después de cargas que escriban
+Detalle_Venta sin pasar por el guardado de ventas.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.ventas import recalcular_cabeceras
+from shop.models import Ventas
+
+
+class Command(BaseCommand):
+    help = 'Completa cliente e ítems desnormalizados en Ventas, en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Ventas por lote (default: 1000)')
+        parser.add_argument('--desde-id', type=int, default=0, help='Reanudar desde este id de venta')
+        parser.add_argument(
+            '--refrescar-cliente',
+            action='store_true',
+            help='Reemplaza también los nombres ya guardados por el nombre actual del cliente',
+        )
+
+    def handle(self, *args, **options):
+        lote = max(options['lote'], 1)
+        ultimo_id = options['desde_id']
+        total = 0
+
+        while True:
+            ids = list(
+                Ventas.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                total += recalcular_cabeceras(ids, conservar_cliente=not options['refrescar_cliente'])
+            ultimo_id = ids[-1]
+            self.stdout.write(f"  {total} ventas procesadas (último id {ultimo_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Cabeceras completadas: {total} ventas"))
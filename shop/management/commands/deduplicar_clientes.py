@@ -0,0 +1,74 @@
+"""
+Comando para fusionar clientes duplicados (mismo RUT o correo normalizado)
+Por defecto solo informa los grupos encontrados; con --aplicar reasigna las
+ventas al cliente más antiguo de cada grupo y elimina los demás. Los correos
+compartidos por clientes con RUT distintos no se fusionan: se listan para
+revisarlos a mano.
+"""
+
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from shop.clientes import fusionar_grupos, grupos_duplicados
+from shop.models import Clientes
+
+
+class Command(BaseCommand):
+    help = 'Agrupa clientes duplicados por RUT/correo normalizado y los fusiona'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Fusiona los grupos (sin esta opción solo se informa)')
+        parser.add_argument('--lote', type=int, default=200,
+                            help='Grupos fusionados por transacción (default: 200)')
+        parser.add_argument('--mostrar', type=int, default=20,
+                            help='Grupos listados en el informe (default: 20)')
+
+    def handle(self, *args, **options):
+        grupos, revisar = grupos_duplicados()
+        duplicados = sum(len(dups) for dups in grupos.values())
+        self.stdout.write(f"Grupos con duplicados: {len(grupos)} ({duplicados} clientes sobrantes)")
+
+        mostrar = max(options['mostrar'], 0)
+        muestra = dict(islice(grupos.items(), mostrar))
+        muestra_revisar = revisar[:mostrar]
+        nombres = Clientes.objects.in_bulk(
+            list(muestra) + [dup for dups in muestra.values() for dup in dups]
+            + [cliente_id for _, ids in muestra_revisar for cliente_id in ids]
+        )
+        for conservado, dups in muestra.items():
+            self.stdout.write(
+                f"  #{conservado} {nombres[conservado].nombre} <- "
+                + ', '.join(f"#{dup} {nombres[dup].nombre}" for dup in sorted(dups))
+            )
+
+        if revisar:
+            self.stdout.write(self.style.WARNING(
+                f"Correos compartidos por RUT distintos (revisión manual): {len(revisar)}"
+            ))
+            for correo, ids in muestra_revisar:
+                self.stdout.write(
+                    f"  {correo}: " + ', '.join(f"#{c} {nombres[c].nombre} ({nombres[c].rut})" for c in ids)
+                )
+
+        if not options['aplicar']:
+            if grupos:
+                self.stdout.write(self.style.WARNING('Sin cambios: usa --aplicar para fusionar.'))
+            return
+
+        lote = max(options['lote'], 1)
+        items = iter(grupos.items())
+        eliminados = ventas = 0
+        while True:
+            bloque = dict(islice(items, lote))
+            if not bloque:
+                break
+            e, v = fusionar_grupos(bloque)
+            eliminados += e
+            ventas += v
+            self.stdout.write(f"  {eliminados} clientes fusionados, {ventas} ventas reasignadas...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {eliminados} clientes duplicados eliminados, {ventas} ventas reasignadas"
+        ))
@@ -0,0 +1,46 @@
+"""
+Comando para unir perfiles nutricionales con los mismos valores
+Por defecto solo informa; con --aplicar reasigna los productos al perfil más
+antiguo de cada grupo (un UPDATE por lote) y elimina los repetidos.
+"""
+
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from shop.nutricional import fusionar_grupos, grupos_duplicados
+
+
+class Command(BaseCommand):
+    help = 'Fusiona perfiles nutricionales duplicados (misma huella de contenido)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Fusiona los perfiles (sin esta opción solo se informa)')
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Grupos fusionados por transacción (default: 500)')
+
+    def handle(self, *args, **options):
+        grupos = grupos_duplicados()
+        sobrantes = sum(len(dups) for dups in grupos.values())
+        self.stdout.write(f"Perfiles repetidos: {sobrantes} en {len(grupos)} grupos")
+
+        if not options['aplicar']:
+            if grupos:
+                self.stdout.write(self.style.WARNING('Sin cambios: usa --aplicar para fusionar.'))
+            return
+
+        lote = max(options['lote'], 1)
+        items = iter(grupos.items())
+        eliminados = productos = 0
+        while True:
+            bloque = dict(islice(items, lote))
+            if not bloque:
+                break
+            e, p = fusionar_grupos(bloque)
+            eliminados += e
+            productos += p
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {eliminados} perfiles eliminados, {productos} productos reasignados"
+        ))
@@ -0,0 +1,33 @@
+"""
+Comando para guardar un corte (snapshot) diario de stock por producto
+Pensado para ejecutarse una vez al día (cron / systemd timer)
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.inventario import generar_corte
+
+
+class Command(BaseCommand):
+    help = 'Guarda un corte de stock de todos los productos a partir del libro de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Instante del corte en formato YYYY-MM-DD HH:MM (por defecto, ahora)',
+        )
+
+    def handle(self, *args, **options):
+        momento = None
+        if options['fecha']:
+            try:
+                momento = datetime.strptime(options['fecha'], '%Y-%m-%d %H:%M')
+            except ValueError:
+                raise CommandError('Formato de fecha inválido, usa YYYY-MM-DD HH:MM.')
+            momento = timezone.make_aware(momento, timezone.get_current_timezone())
+
+        filas = generar_corte(momento)
+        self.stdout.write(self.style.SUCCESS(f'✓ Corte de stock guardado para {filas} productos'))
@@ -0,0 +1,65 @@
+"""
+Comando para ver las consultas lentas más costosas
+Lee el registro de shop/consultas_lentas.py y agrupa por huella (SQL sin
+literales): tiempo total, veces, promedio y máximo, con las vistas, las
+combinaciones de filtros GET y el sitio del código que más la producen. Con
+--planes muestra el último EXPLAIN guardado de cada huella, para decidir
+qué índice falta.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.consultas_lentas import leer, resumir
+
+
+def _principal(conteos):
+    if not conteos:
+        return '-'
+    valor, veces = max(conteos.items(), key=lambda par: par[1])
+    return valor if len(conteos) == 1 else f'{valor} (+{len(conteos) - 1})'
+
+
+class Command(BaseCommand):
+    help = 'Muestra las huellas de consultas lentas ordenadas por tiempo total'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Huellas a mostrar (default: 20)')
+        parser.add_argument('--vista', help='Solo consultas de esta vista (ej. forneria:ventas_list)')
+        parser.add_argument('--horas', type=float, help='Solo las registradas en las últimas N horas')
+        parser.add_argument('--planes', action='store_true', help='Muestra el último EXPLAIN de cada huella')
+        parser.add_argument('--directorio', help='Registro a leer (default: settings.CONSULTAS_LENTAS_DIR)')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['horas']:
+            desde = (timezone.now() - timedelta(hours=options['horas'])).isoformat(timespec='seconds')
+        grupos = resumir(leer(options['directorio']), options['vista'], desde)
+        if not grupos:
+            self.stdout.write('No hay consultas lentas registradas.')
+            return
+
+        total = sum(g['total_ms'] for g in grupos)
+        self.stdout.write(
+            f"{sum(g['veces'] for g in grupos)} consultas lentas en {len(grupos)} huellas, "
+            f"{total / 1000:.1f} s en total\n"
+        )
+        for posicion, grupo in enumerate(grupos[:max(options['top'], 1)], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{posicion} {grupo['huella']}  {grupo['total_ms'] / 1000:.2f} s ({100 * grupo['total_ms'] / total:.0f}%)  "
+                f"{grupo['veces']}x  prom {grupo['total_ms'] / grupo['veces']:.1f} ms  máx {grupo['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  vista:   {_principal(grupo['vistas'])}")
+            self.stdout.write(f"  filtros: {_principal(grupo['filtros'])}")
+            self.stdout.write(f"  sitio:   {_principal(grupo['sitios'])}")
+            self.stdout.write(f"  sql:     {grupo['sql'][:400]}")
+            if options['planes']:
+                if grupo['plan']:
+                    self.stdout.write('  plan:')
+                    for linea in grupo['plan']:
+                        self.stdout.write(f'    {linea}')
+                else:
+                    self.stdout.write('  plan:    (sin muestra de EXPLAIN)')
+            self.stdout.write('')
@@ -0,0 +1,120 @@
+"""
+Comando para medir el arranque en frío de un worker
+Lanza un intérprete nuevo con `-X importtime` que hace lo mismo que gunicorn
+al cargar la aplicación más la primera petición: leer settings,
+django.setup() (apps, modelos y ready()), importar el URLconf (las vistas) y
+cargar el middleware. Informa la duración de cada fase, los paquetes y
+módulos que más tardan en importarse y verifica el presupuesto:
+
+- --presupuesto-ms: tiempo total máximo (intérprete incluido)
+- --prohibidos: módulos pesados que no deben importarse al arrancar
+  (por defecto openpyxl, numpy y PIL: solo los usan exportaciones,
+  calcular_reposicion y la validación del avatar)
+
+Si se excede, termina con error: sirve como verificación en CI.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+PROHIBIDOS = 'openpyxl,numpy,PIL'
+
+# Corre en el intérprete medido; imprime los tiempos de cada fase como JSON en stdout
+SCRIPT = """
+import json, time
+inicio = time.perf_counter()
+import pymysql
+pymysql.install_as_MySQLdb()
+from django.conf import settings
+settings.INSTALLED_APPS
+fases = {'settings': time.perf_counter() - inicio}
+import django
+django.setup()
+fases['django.setup'] = time.perf_counter() - inicio - sum(fases.values())
+from django.urls import get_resolver
+get_resolver().url_patterns
+fases['urls'] = time.perf_counter() - inicio - sum(fases.values())
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+fases['middleware'] = time.perf_counter() - inicio - sum(fases.values())
+print(json.dumps(fases))
+"""
+
+
+def parsear_importtime(texto):
+    """[(módulo, propio_us, acumulado_us)] desde la salida de -X importtime."""
+    modulos = []
+    for linea in texto.splitlines():
+        if not linea.startswith('import time:') or 'imported package' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|', 2)
+        modulos.append((nombre.strip(), int(propio), int(acumulado)))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = 'Mide el arranque en frío (fases de Django e imports por módulo) y verifica su presupuesto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Arranques a medir; se informa el más rápido (default: 3)')
+        parser.add_argument('--top', type=int, default=15, help='Paquetes y módulos a listar (default: 15)')
+        parser.add_argument('--presupuesto-ms', type=float, help='Tiempo total máximo de arranque')
+        parser.add_argument('--prohibidos', default=PROHIBIDOS,
+                            help='Módulos que no deben importarse al arrancar, separados por coma (default: %(default)s)')
+
+    def _arrancar(self):
+        entorno = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'forneria.settings'),
+            'CALENTAR_AL_INICIAR': 'False',
+        }
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+            cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+        )
+        total = time.perf_counter() - inicio
+        if proceso.returncode:
+            raise CommandError(f'El arranque falló:\n{proceso.stderr[-2000:]}')
+        fases = json.loads(proceso.stdout.strip().splitlines()[-1])
+        return total, fases, parsear_importtime(proceso.stderr)
+
+    def handle(self, *args, **options):
+        corridas = [self._arrancar() for _ in range(max(options['repeticiones'], 1))]
+        total, fases, modulos = min(corridas, key=lambda corrida: corrida[0])
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Arranque en frío: {total * 1000:.0f} ms'))
+        self.stdout.write(f"  {'intérprete':<14} {(total - sum(fases.values())) * 1000:>8.0f} ms")
+        for fase, segundos in fases.items():
+            self.stdout.write(f'  {fase:<14} {segundos * 1000:>8.0f} ms')
+
+        por_paquete = {}
+        for nombre, propio, _ in modulos:
+            paquete = nombre.split('.')[0]
+            por_paquete[paquete] = por_paquete.get(paquete, 0) + propio
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nImports por paquete ({len(modulos)} módulos)'))
+        for paquete, propio in sorted(por_paquete.items(), key=lambda par: -par[1])[:options['top']]:
+            self.stdout.write(f'  {propio / 1000:>8.1f} ms  {paquete}')
+        self.stdout.write(self.style.MIGRATE_HEADING('\nMódulos más lentos (tiempo propio / acumulado)'))
+        for nombre, propio, acumulado in sorted(modulos, key=lambda m: -m[1])[:options['top']]:
+            self.stdout.write(f'  {propio / 1000:>8.1f} / {acumulado / 1000:>8.1f} ms  {nombre}')
+
+        problemas = []
+        if options['presupuesto_ms'] and total * 1000 > options['presupuesto_ms']:
+            problemas.append(f"{total * 1000:.0f} ms superan el presupuesto de {options['presupuesto_ms']:.0f} ms")
+        importados = {nombre for nombre, _, _ in modulos}
+        for prohibido in filter(None, (p.strip() for p in options['prohibidos'].split(','))):
+            if any(nombre == prohibido or nombre.startswith(prohibido + '.') for nombre in importados):
+                problemas.append(f'{prohibido} se importa al arrancar')
+
+        if problemas:
+            raise CommandError('Presupuesto de arranque excedido: ' + '; '.join(problemas))
+        self.stdout.write(self.style.SUCCESS('\n✓ Arranque dentro del presupuesto'))
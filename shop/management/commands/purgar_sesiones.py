@@ -0,0 +1,40 @@
+"""
+Comando para eliminar sesiones expiradas de django_session por lotes
+Alternativa a clearsessions, que las borra en un solo DELETE y bloquea la tabla
+en MySQL mientras dura. Pensado para ejecutarse periódicamente (cron / systemd timer)
+"""
+
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Elimina sesiones expiradas en lotes pequeños'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Sesiones eliminadas por DELETE (default: 1000)')
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help='Segundos de espera entre lotes para ceder la tabla (default: 0)')
+
+    def handle(self, *args, **options):
+        lote = max(options['lote'], 1)
+        ahora = timezone.now()
+        total = 0
+
+        while True:
+            claves = list(
+                Session.objects.filter(expire_date__lt=ahora)
+                .values_list('session_key', flat=True)[:lote]
+            )
+            if not claves:
+                break
+            total += Session.objects.filter(session_key__in=claves).delete()[0]
+            self.stdout.write(f"  {total} sesiones eliminadas...")
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {total} sesiones expiradas eliminadas"))
@@ -0,0 +1,18 @@
+"""
+Comando para recalcular la tabla de conteos de facetas (Conteo_Faceta)
+Necesario tras cargas masivas que no emiten señales (bulk_create, update, SQL directo)
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.facetas import reconstruir_facetas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los conteos de productos por categoría y tipo usados por los filtros'
+
+    def handle(self, *args, **options):
+        combinaciones = reconstruir_facetas()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Facetas reconstruidas: {combinaciones} combinaciones categoría/tipo"
+        ))
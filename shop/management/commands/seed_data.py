@@ -8,6 +8,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from shop.models import *
+from shop.nutricional import obtener_o_crear_perfil
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.db.models import Q
@@ -89,32 +90,32 @@ class Command(BaseCommand):
 
         # 4. Información Nutricional
         self.stdout.write('🥗 Creando información nutricional...')
-        nutri1 = Nutricional.objects.create(
+        nutri1 = obtener_o_crear_perfil(
             calorias=Decimal('250.00'), proteinas=Decimal('8.00'), 
             grasas=Decimal('3.00'), carbohidratos=Decimal('45.00'), 
             azucares=Decimal('2.00'), sodio=Decimal('400.00')
         )
-        nutri2 = Nutricional.objects.create(
+        nutri2 = obtener_o_crear_perfil(
             calorias=Decimal('350.00'), proteinas=Decimal('5.00'), 
             grasas=Decimal('15.00'), carbohidratos=Decimal('50.00'), 
             azucares=Decimal('25.00'), sodio=Decimal('200.00')
         )
-        nutri3 = Nutricional.objects.create(
+        nutri3 = obtener_o_crear_perfil(
             calorias=Decimal('180.00'), proteinas=Decimal('6.00'), 
             grasas=Decimal('2.00'), carbohidratos=Decimal('35.00'), 
             azucares=Decimal('8.00'), sodio=Decimal('300.00')
         )
-        nutri4 = Nutricional.objects.create(
+        nutri4 = obtener_o_crear_perfil(
             calorias=Decimal('120.00'), proteinas=Decimal('3.00'), 
             grasas=Decimal('5.00'), carbohidratos=Decimal('18.00'), 
             azucares=Decimal('10.00'), sodio=Decimal('150.00')
         )
-        nutri5 = Nutricional.objects.create(
+        nutri5 = obtener_o_crear_perfil(
             calorias=Decimal('0.00'), proteinas=Decimal('0.00'), 
             grasas=Decimal('0.00'), carbohidratos=Decimal('0.00'), 
             azucares=Decimal('0.00'), sodio=Decimal('10.00')
         )
-        nutri6 = Nutricional.objects.create(
+        nutri6 = obtener_o_crear_perfil(
             calorias=Decimal('280.00'), proteinas=Decimal('4.00'), 
             grasas=Decimal('12.00'), carbohidratos=Decimal('38.00'), 
             azucares=Decimal('15.00'), sodio=Decimal('180.00')
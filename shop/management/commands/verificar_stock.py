@@ -0,0 +1,24 @@
+"""
+Comando para comparar el stock del libro de movimientos con Productos.stock_actual
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.inventario import verificar_stock
+
+
+class Command(BaseCommand):
+    help = 'Lista los productos cuyo stock_actual no coincide con el libro de movimientos'
+
+    def handle(self, *args, **options):
+        diferencias = verificar_stock()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✓ El stock de todos los productos coincide con el libro'))
+            return
+
+        self.stdout.write(f"{'Producto':<30} {'Actual':>8} {'Libro':>8} {'Dif.':>8}")
+        for d in diferencias:
+            self.stdout.write(
+                f"{d['producto'].nombre[:30]:<30} {d['stock_actual']:>8} {d['stock_libro']:>8} {d['diferencia']:>8}"
+            )
+        self.stdout.write(self.style.WARNING(f'⚠ {len(diferencias)} productos con diferencias'))
@@ -0,0 +1,313 @@
+"""
+Métricas en formato de exposición de Prometheus (/metrics)
+
+Cada proceso acumula contadores e histogramas en memoria (un dict y un lock:
+registrar una petición cuesta unos microsegundos). Un hilo de fondo vuelca
+la foto del proceso a `<METRICAS_DIR>/<pid>.json` cada INTERVALO_VOLCADO
+segundos; /metrics suma los archivos de todos los workers de gunicorn, así
+que cualquier worker responde por el servidor completo. El hilo solo se
+inicia en procesos que atienden peticiones (no en comandos, el shell ni
+`manage.py test`), y al volcar borra los archivos de workers que ya no
+existen: Prometheus toma la baja de esos contadores como un reinicio.
+
+Métricas:
+- forneria_peticion_segundos{vista, metodo}: latencia por nombre de URL
+- forneria_consultas_db_total{vista}: consultas SQL ejecutadas
+- forneria_cache_total{cache, resultado} y forneria_cache_hit_ratio{cache}
+- forneria_cache_recalculos_total{cache, motivo}: valores recalculados al vencer o antes (shop/cache.py)
+- forneria_ventas_total{canal}: ventas registradas; rate(...[1m]) * 60 da ventas por minuto
+- forneria_alertas_pendientes: se cuenta en la BD al momento del scrape
+- forneria_exportacion_segundos{tipo}: duración de las exportaciones a Excel
+
+/metrics responde a usuarios staff o a `Authorization: Bearer <METRICAS_TOKEN>`.
+"""
+
+import bisect
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .eventos import alertas_pendientes
+from .models import Ventas
+
+
+INTERVALO_VOLCADO = 5
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_EXPORTACION = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICAS = {
+    'forneria_peticion_segundos': ('histogram', 'Latencia de las peticiones por vista', BUCKETS_LATENCIA),
+    'forneria_consultas_db_total': ('counter', 'Consultas SQL ejecutadas por vista', None),
+    'forneria_cache_total': ('counter', 'Lecturas de caché por resultado (hit/miss)', None),
+    'forneria_cache_recalculos_total': ('counter', 'Valores de caché recalculados por motivo (vencido/anticipado)', None),
+    'forneria_ventas_total': ('counter', 'Ventas registradas por canal de venta', None),
+    'forneria_exportacion_segundos': ('histogram', 'Duración de las exportaciones a Excel', BUCKETS_EXPORTACION),
+}
+
+
+class Registro:
+    """Valores del proceso: {(nombre, etiquetas): número o [conteos por bucket..., suma, total]}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valores = {}
+        self._pid = os.getpid()
+        self._escritor = None
+        self._servido = False
+
+    def servir(self):
+        """Marca el proceso como servidor de peticiones (lo llama el middleware)."""
+        if self._servido and self._pid == os.getpid():
+            return
+        with self._lock:
+            self._reiniciar_tras_fork()
+            self._servido = True
+            self._preparar()
+
+    def _reiniciar_tras_fork(self):
+        # Tras un fork (gunicorn --preload) el hijo no hereda el hilo y no debe sumar lo del padre
+        if self._pid != os.getpid():
+            self._valores = {}
+            self._pid = os.getpid()
+            self._escritor = None
+            self._servido = False
+
+    def _preparar(self):
+        self._reiniciar_tras_fork()
+        if self._servido and self._escritor is None and getattr(settings, 'METRICAS_DIR', None):
+            self._escritor = threading.Thread(target=self._volcar_periodicamente, daemon=True)
+            self._escritor.start()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._preparar()
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        buckets = METRICAS[nombre][2]
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._preparar()
+            serie = self._valores.get(clave)
+            if serie is None:
+                serie = self._valores[clave] = [0] * (len(buckets) + 3)
+            serie[bisect.bisect_left(buckets, valor)] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def foto(self):
+        with self._lock:
+            return {
+                json.dumps([nombre, etiquetas]): (list(valor) if isinstance(valor, list) else valor)
+                for (nombre, etiquetas), valor in self._valores.items()
+            }
+
+    def volcar(self):
+        directorio = settings.METRICAS_DIR
+        os.makedirs(directorio, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        with os.fdopen(fd, 'w') as archivo:
+            json.dump(self.foto(), archivo)
+        # Reemplazo atómico: quien lee ve la foto anterior o la nueva, nunca una a medias
+        os.replace(temporal, os.path.join(directorio, f'{os.getpid()}.json'))
+        _podar(directorio)
+
+    def _volcar_periodicamente(self):
+        while True:
+            time.sleep(INTERVALO_VOLCADO)
+            try:
+                self.volcar()
+            except OSError:
+                pass
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _podar(directorio):
+    """Borra los `<pid>.json` de procesos que ya no existen."""
+    if os.name != 'posix':
+        # En Windows os.kill termina el proceso en vez de consultarlo
+        return
+    for ruta in glob.glob(os.path.join(directorio, '*.json')):
+        nombre = os.path.basename(ruta)[:-len('.json')]
+        if nombre.isdigit() and not _vivo(int(nombre)):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+
+registro = Registro()
+incrementar = registro.incrementar
+observar = registro.observar
+
+
+class cronometrar(ContextDecorator):
+    """Observa la duración del bloque (o de la función decorada) en un histograma."""
+
+    def __init__(self, nombre, **etiquetas):
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def _recreate_cm(self):
+        # Como decorador, cada llamada usa su propia instancia: el inicio no se comparte entre hilos
+        return type(self)(self.nombre, **self.etiquetas)
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observar(self.nombre, time.perf_counter() - self._inicio, **self.etiquetas)
+        return False
+
+
+def contar_cache(cache, acierto):
+    incrementar('forneria_cache_total', cache=cache, resultado='hit' if acierto else 'miss')
+
+
+def contar_ventas(ventas):
+    """Suma las ventas por canal cuando la transacción se confirma (bulk_create no emite señales)."""
+    canales = [venta.canal_venta for venta in ventas]
+
+    def _contar():
+        for canal in canales:
+            incrementar('forneria_ventas_total', canal=canal)
+    transaction.on_commit(_contar)
+
+
+@receiver(post_save, sender=Ventas, dispatch_uid='metricas_venta_creada')
+def _venta_creada(sender, instance, created, **kwargs):
+    if created:
+        contar_ventas([instance])
+
+
+# ============= MIDDLEWARE =============
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registro.servir()
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        ruta = getattr(request, 'resolver_match', None)
+        vista = (ruta.view_name if ruta else None) or 'sin_ruta'
+        observar('forneria_peticion_segundos', duracion, vista=vista, metodo=request.method)
+        if consultas[0]:
+            incrementar('forneria_consultas_db_total', consultas[0], vista=vista)
+        return response
+
+
+# ============= EXPOSICIÓN =============
+
+def autorizado(request):
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    cabecera = request.headers.get('Authorization', '')
+    if token and cabecera.startswith('Bearer ') and hmac.compare_digest(cabecera[7:], token):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def _sumar(total, foto):
+    for clave, valor in foto.items():
+        if isinstance(valor, list):
+            actual = total.setdefault(clave, [0] * len(valor))
+            for i, v in enumerate(valor):
+                actual[i] += v
+        else:
+            total[clave] = total.get(clave, 0) + valor
+
+
+def _agregado():
+    """Suma de los archivos de todos los workers, con la foto en vivo de este proceso."""
+    total = {}
+    directorio = getattr(settings, 'METRICAS_DIR', None)
+    propio = f'{os.getpid()}.json'
+    if directorio:
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            if os.path.basename(ruta) == propio:
+                continue
+            try:
+                with open(ruta) as archivo:
+                    _sumar(total, json.load(archivo))
+            except (OSError, ValueError):
+                continue
+    _sumar(total, registro.foto())
+    return total
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def exponer():
+    """Texto de exposición de Prometheus (versión 0.0.4)."""
+    series = {}
+    for clave, valor in _agregado().items():
+        nombre, etiquetas = json.loads(clave)
+        series.setdefault(nombre, []).append(([tuple(par) for par in etiquetas], valor))
+
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        for etiquetas, valor in sorted(series.get(nombre, [])):
+            if tipo == 'counter':
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {valor}')
+                continue
+            acumulado = 0
+            for limite, conteo in zip((*buckets, '+Inf'), valor[:-2]):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{_etiquetas([*etiquetas, ("le", limite)])} {acumulado}')
+            lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {valor[-2]}')
+            lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {valor[-1]}')
+
+    lineas += ['# HELP forneria_cache_hit_ratio Proporción de lecturas de caché que encontraron el valor',
+               '# TYPE forneria_cache_hit_ratio gauge']
+    por_cache = {}
+    for etiquetas, valor in series.get('forneria_cache_total', []):
+        datos = dict(etiquetas)
+        por_cache.setdefault(datos['cache'], {}).setdefault(datos['resultado'], valor)
+    for cache, resultados in sorted(por_cache.items()):
+        total = resultados.get('hit', 0) + resultados.get('miss', 0)
+        lineas.append(f'forneria_cache_hit_ratio{_etiquetas([("cache", cache)])} {resultados.get("hit", 0) / total:.4f}')
+
+    lineas += ['# HELP forneria_alertas_pendientes Alertas en estado pendiente',
+               '# TYPE forneria_alertas_pendientes gauge',
+               f'forneria_alertas_pendientes {alertas_pendientes()}']
+    return '\n'.join(lineas) + '\n'
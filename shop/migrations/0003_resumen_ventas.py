@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Marca_Agregacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True, verbose_name='Nombre')),
+                ('marca', models.DateTimeField(blank=True, null=True, verbose_name='Marca de agua')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Fecha Actualización')),
+            ],
+            options={
+                'verbose_name': 'Marca de Agregación',
+                'verbose_name_plural': 'Marcas de Agregación',
+                'db_table': 'Marca_Agregacion',
+            },
+        ),
+        migrations.CreateModel(
+            name='Resumen_Ventas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('hora', models.PositiveSmallIntegerField(verbose_name='Hora')),
+                ('dia_semana', models.PositiveSmallIntegerField(help_text='1 = domingo ... 7 = sábado', verbose_name='Día de la semana')),
+                ('canal_venta', models.CharField(max_length=20, verbose_name='Canal de Venta')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Unidades')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total sin IVA')),
+                ('lineas', models.IntegerField(default=0, verbose_name='Líneas de venta')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas',
+                'verbose_name_plural': 'Resúmenes de Ventas',
+                'db_table': 'Resumen_Ventas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['updated_at'], name='ventas_updated_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='resumen_ventas',
+            name='categoria_id',
+            field=models.ForeignKey(db_column='categoria_id', on_delete=django.db.models.deletion.CASCADE, to='shop.categorias', verbose_name='Categoría'),
+        ),
+        migrations.AddField(
+            model_name='resumen_ventas',
+            name='producto_id',
+            field=models.ForeignKey(db_column='producto_id', on_delete=django.db.models.deletion.CASCADE, to='shop.productos', verbose_name='Producto'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumen_ventas',
+            constraint=models.UniqueConstraint(fields=('fecha', 'hora', 'producto_id', 'canal_venta'), name='resumen_ventas_grano_unico'),
+        ),
+    ]
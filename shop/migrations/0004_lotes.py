@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_resumen_ventas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lotes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(blank=True, max_length=50, null=True, verbose_name='Código de lote')),
+                ('elaboracion', models.DateField(blank=True, null=True, verbose_name='Fecha Elaboración')),
+                ('caducidad', models.DateField(verbose_name='Fecha Caducidad')),
+                ('cantidad_inicial', models.IntegerField(verbose_name='Cantidad Inicial')),
+                ('cantidad_disponible', models.IntegerField(verbose_name='Cantidad Disponible')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha Eliminación')),
+                ('movimiento_id', models.ForeignKey(blank=True, db_column='movimiento_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lotes', to='shop.movimientos_inventario', verbose_name='Movimiento de entrada')),
+                ('producto_id', models.ForeignKey(db_column='producto_id', on_delete=django.db.models.deletion.PROTECT, related_name='lotes', to='shop.productos', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Lote',
+                'verbose_name_plural': 'Lotes',
+                'db_table': 'Lotes',
+                'ordering': ['caducidad', 'id'],
+                'indexes': [models.Index(fields=['producto_id', 'caducidad'], name='lotes_producto_caducidad_idx'), models.Index(fields=['caducidad'], name='lotes_caducidad_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_lotes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cortes_Stock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha del corte')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')),
+            ],
+            options={
+                'verbose_name': 'Corte de Stock',
+                'verbose_name_plural': 'Cortes de Stock',
+                'db_table': 'Cortes_Stock',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientos_inventario',
+            index=models.Index(fields=['fecha'], name='movimientos_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientos_inventario',
+            index=models.Index(fields=['created_at'], name='movimientos_created_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='cortes_stock',
+            name='producto_id',
+            field=models.ForeignKey(db_column='producto_id', on_delete=django.db.models.deletion.CASCADE, related_name='cortes_stock', to='shop.productos', verbose_name='Producto'),
+        ),
+        migrations.AddConstraint(
+            model_name='cortes_stock',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto_id'), name='cortes_stock_fecha_producto_unico'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+def inicializar_secuencia(apps, schema_editor):
+    # Los folios automáticos anteriores eran VENT-{id}; la secuencia parte sobre el mayor id
+    Ventas = apps.get_model('shop', 'Ventas')
+    Secuencias_Folio = apps.get_model('shop', 'Secuencias_Folio')
+    ultimo = Ventas.objects.aggregate(models.Max('id'))['id__max'] or 0
+    Secuencias_Folio.objects.update_or_create(nombre='VENT', defaults={'ultimo_valor': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_cortes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencias_Folio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=20, unique=True, verbose_name='Prefijo')),
+                ('ultimo_valor', models.BigIntegerField(default=0, verbose_name='Último valor reservado')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Folio',
+                'verbose_name_plural': 'Secuencias de Folio',
+                'db_table': 'Secuencias_Folio',
+            },
+        ),
+        migrations.RunPython(inicializar_secuencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_secuencias_folio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventas',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Clave de sincronización'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_conteos(apps, schema_editor):
+    # Mismo criterio que shop/facetas.py: tipo sin espacios y en minúsculas
+    Productos = apps.get_model('shop', 'Productos')
+    Conteo_Faceta = apps.get_model('shop', 'Conteo_Faceta')
+    conteos = {}
+    for categoria_id, tipo in Productos.objects.values_list('Categorias_id_id', 'tipo').iterator():
+        tipo = (tipo or '').strip().lower()
+        if categoria_id and tipo:
+            clave = (categoria_id, tipo)
+            conteos[clave] = conteos.get(clave, 0) + 1
+    Conteo_Faceta.objects.bulk_create([
+        Conteo_Faceta(categoria_id_id=categoria_id, tipo=tipo, cantidad=cantidad)
+        for (categoria_id, tipo), cantidad in conteos.items()
+    ], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_ventas_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conteo_Faceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=100, verbose_name='Tipo')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Productos')),
+                ('categoria_id', models.ForeignKey(db_column='categoria_id', on_delete=django.db.models.deletion.CASCADE, related_name='conteos_faceta', to='shop.categorias', verbose_name='Categoría')),
+            ],
+            options={
+                'verbose_name': 'Conteo de Faceta',
+                'verbose_name_plural': 'Conteos de Facetas',
+                'db_table': 'Conteo_Faceta',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='conteo_faceta',
+            constraint=models.UniqueConstraint(fields=('categoria_id', 'tipo'), name='conteo_faceta_unico'),
+        ),
+        migrations.RunPython(poblar_conteos, migrations.RunPython.noop),
+    ]
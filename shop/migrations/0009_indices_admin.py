@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_conteo_faceta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertas',
+            index=models.Index(fields=['fecha_generada'], name='alertas_fecha_generada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalle_venta',
+            index=models.Index(fields=['created_at'], name='detalle_venta_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['fecha'], name='ventas_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_indices_admin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventas',
+            name='cliente_correo',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Correo del cliente (al vender)'),
+        ),
+        migrations.AddField(
+            model_name='ventas',
+            name='cliente_nombre',
+            field=models.CharField(blank=True, default='', max_length=150, verbose_name='Cliente (al vender)'),
+        ),
+        migrations.AddField(
+            model_name='ventas',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Líneas'),
+        ),
+        migrations.AddField(
+            model_name='ventas',
+            name='items_qty',
+            field=models.IntegerField(default=0, verbose_name='Unidades'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:01
+
+import re
+
+from django.db import migrations, models
+
+
+def poblar_normalizados(apps, schema_editor):
+    # Mismo criterio que shop/clientes.py (normalizar_rut / normalizar_correo)
+    Clientes = apps.get_model('shop', 'Clientes')
+    patron_rut = re.compile(r'^\s*\d{1,3}(?:\.?\d{3})*\s*-?\s*[\dkK]\s*$')
+    patron_correo = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+    modificados = []
+    for cliente in Clientes.objects.only('id', 'rut', 'correo').iterator(chunk_size=2000):
+        rut = None
+        if cliente.rut and patron_rut.match(cliente.rut):
+            limpio = re.sub(r'[^\dkK]', '', cliente.rut).upper()
+            cuerpo = limpio[:-1].lstrip('0')
+            rut = f'{cuerpo}-{limpio[-1]}' if len(cuerpo) >= 6 else None
+        correo = (cliente.correo or '').strip().lower()
+        cliente.rut_normalizado = rut
+        cliente.correo_normalizado = correo if patron_correo.match(correo) else None
+        modificados.append(cliente)
+    Clientes.objects.bulk_update(modificados, ['rut_normalizado', 'correo_normalizado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_ventas_cabecera_desnormalizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientes',
+            name='correo_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, verbose_name='Correo normalizado'),
+        ),
+        migrations.AddField(
+            model_name='clientes',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, verbose_name='RUT normalizado'),
+        ),
+        migrations.AddIndex(
+            model_name='clientes',
+            index=models.Index(fields=['rut_normalizado'], name='clientes_rut_normalizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientes',
+            index=models.Index(fields=['correo_normalizado'], name='clientes_correo_norm_idx'),
+        ),
+        migrations.RunPython(poblar_normalizados, migrations.RunPython.noop),
+    ]
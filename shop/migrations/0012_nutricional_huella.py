@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:03
+
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_huellas(apps, schema_editor):
+    # Mismo criterio que shop/nutricional.calcular_huella
+    Nutricional = apps.get_model('shop', 'Nutricional')
+    campos = ('calorias', 'proteinas', 'grasas', 'carbohidratos', 'azucares', 'sodio')
+    perfiles = []
+    for perfil in Nutricional.objects.only('id', *campos).iterator(chunk_size=2000):
+        partes = []
+        for campo in campos:
+            valor = getattr(perfil, campo)
+            partes.append('' if valor is None else str(Decimal(valor).quantize(Decimal('0.01'))))
+        perfil.huella = hashlib.sha1('|'.join(partes).encode('ascii')).hexdigest()
+        perfiles.append(perfil)
+    Nutricional.objects.bulk_update(perfiles, ['huella'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_clientes_normalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nutricional',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40, null=True, verbose_name='Huella de contenido'),
+        ),
+        migrations.RunPython(poblar_huellas, migrations.RunPython.noop),
+    ]
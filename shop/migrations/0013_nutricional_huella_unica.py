@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:40
+
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fusionar_repetidos(apps, schema_editor):
+    # Antes del índice único: recalcula las huellas (mismo criterio que
+    # shop/nutricional.calcular_huella), apunta los productos al perfil más
+    # antiguo de cada huella y elimina los repetidos
+    Nutricional = apps.get_model('shop', 'Nutricional')
+    Productos = apps.get_model('shop', 'Productos')
+    campos = ('calorias', 'proteinas', 'grasas', 'carbohidratos', 'azucares', 'sodio')
+    conservado_por_huella = {}
+    destino = {}
+    perfiles = []
+    for perfil in Nutricional.objects.only('id', 'huella', *campos).order_by('id').iterator(chunk_size=2000):
+        partes = []
+        for campo in campos:
+            valor = getattr(perfil, campo)
+            partes.append('' if valor is None else str(Decimal(valor).quantize(Decimal('0.01'))))
+        huella = hashlib.sha1('|'.join(partes).encode('ascii')).hexdigest()
+        if huella in conservado_por_huella:
+            destino[perfil.id] = conservado_por_huella[huella]
+            continue
+        conservado_por_huella[huella] = perfil.id
+        if perfil.huella != huella:
+            perfil.huella = huella
+            perfiles.append(perfil)
+
+    for repetido, conservado in destino.items():
+        Productos.objects.filter(Nutricional_id=repetido).update(Nutricional_id=conservado)
+    Nutricional.objects.filter(id__in=list(destino)).delete()
+    Nutricional.objects.bulk_update(perfiles, ['huella'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_nutricional_huella'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_repetidos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='nutricional',
+            name='huella',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, unique=True, verbose_name='Huella de contenido'),
+        ),
+    ]
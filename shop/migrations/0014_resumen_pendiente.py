@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_nutricional_huella_unica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resumen_Pendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Fecha')),
+                ('marcado', models.DateTimeField(verbose_name='Fecha Marcado')),
+            ],
+            options={
+                'verbose_name': 'Día Pendiente de Resumen',
+                'verbose_name_plural': 'Días Pendientes de Resumen',
+                'db_table': 'Resumen_Pendiente',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_resumen_pendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientos_inventario',
+            name='origen',
+            field=models.CharField(choices=[('manual', 'Manual'), ('venta', 'Venta')], default='manual', max_length=10, verbose_name='Origen'),
+        ),
+    ]
@@ -9,9 +9,38 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.db.models import F, Sum, Value, Window, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from datetime import timedelta
 from decimal import Decimal
 
 
+class ValoresCargadosMixin:
+    """
+    Guarda los valores leídos de la BD en `_valores_cargados`: las señales
+    comparan contra ellos sin volver a consultar.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
+    def valor_previo(self, campo):
+        """Valor de `campo` en la BD: el cargado si la instancia lo leyó; si no, una consulta."""
+        cargados = getattr(self, '_valores_cargados', {})
+        if campo in cargados:
+            return cargados[campo]
+        return type(self)._default_manager.filter(pk=self.pk).values_list(campo, flat=True).first()
+
+    def recordar_guardado(self, campo):
+        # Un segundo save() de la misma instancia debe comparar contra lo recién guardado
+        cargados = getattr(self, '_valores_cargados', {})
+        cargados[campo] = getattr(self, campo)
+        self._valores_cargados = cargados
+
+
 class Direccion(models.Model):
     """
     Tabla Maestra: Direcciones
@@ -66,6 +95,11 @@ class Clientes(models.Model):
     rut = models.CharField(max_length=12, unique=True, blank=True, null=True, verbose_name='RUT')
     nombre = models.CharField(max_length=150, verbose_name='Nombre')
     correo = models.EmailField(max_length=100, blank=True, null=True, verbose_name='Correo Electrónico')
+    # Claves de búsqueda exacta y deduplicación; las completa shop/clientes.py al guardar
+    rut_normalizado = models.CharField(max_length=12, blank=True, null=True, editable=False,
+                                       verbose_name='RUT normalizado')
+    correo_normalizado = models.CharField(max_length=100, blank=True, null=True, editable=False,
+                                          verbose_name='Correo normalizado')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha Eliminación')
@@ -75,6 +109,10 @@ class Clientes(models.Model):
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['rut_normalizado'], name='clientes_rut_normalizado_idx'),
+            models.Index(fields=['correo_normalizado'], name='clientes_correo_norm_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -112,6 +150,9 @@ class Nutricional(models.Model):
     carbohidratos = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Carbohidratos (g)')
     azucares = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Azúcares (g)')
     sodio = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Sodio (mg)')
+    # Hash de los valores nutricionales: perfiles iguales comparten fila (ver shop/nutricional.py)
+    huella = models.CharField(max_length=40, blank=True, null=True, editable=False, unique=True,
+                              verbose_name='Huella de contenido')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha Eliminación')
@@ -126,7 +167,7 @@ class Nutricional(models.Model):
         return f"Calorías: {self.calorias if self.calorias else 0} kcal"
 
 
-class Productos(models.Model):
+class Productos(ValoresCargadosMixin, models.Model):
     """
     Tabla Maestra: Productos de la fornería
     Catálogo completo de productos con stock y precios
@@ -183,7 +224,30 @@ class Productos(models.Model):
             })
 
 
-class Ventas(models.Model):
+class Conteo_Faceta(models.Model):
+    """
+    Tabla de Resumen: Productos por categoría y tipo
+    Alimenta los filtros con conteos sin recorrer Productos; la mantienen las señales de shop/facetas.py
+    """
+    categoria_id = models.ForeignKey(Categorias, on_delete=models.CASCADE,
+                                     db_column='categoria_id', related_name='conteos_faceta',
+                                     verbose_name='Categoría')
+    tipo = models.CharField(max_length=100, verbose_name='Tipo')
+    cantidad = models.IntegerField(default=0, verbose_name='Productos')
+
+    class Meta:
+        db_table = 'Conteo_Faceta'
+        verbose_name = 'Conteo de Faceta'
+        verbose_name_plural = 'Conteos de Facetas'
+        constraints = [
+            models.UniqueConstraint(fields=['categoria_id', 'tipo'], name='conteo_faceta_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.categoria_id_id} / {self.tipo}: {self.cantidad}"
+
+
+class Ventas(ValoresCargadosMixin, models.Model):
     """
     Tabla Operativa: Ventas realizadas
     Registro de transacciones de venta
@@ -206,6 +270,15 @@ class Ventas(models.Model):
     folio = models.CharField(max_length=20, blank=True, null=True, unique=True, verbose_name='Folio')
     monto_pagado = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Monto Pagado')
     vuelto = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Vuelto')
+    clave_idempotencia = models.CharField(max_length=64, blank=True, null=True, unique=True,
+                                          verbose_name='Clave de sincronización')
+    # Desnormalizados: los listados y la búsqueda leen solo Ventas (ver ventas.resumen_items)
+    cliente_nombre = models.CharField(max_length=150, blank=True, default='',
+                                      verbose_name='Cliente (al vender)')
+    cliente_correo = models.CharField(max_length=100, blank=True, default='',
+                                      verbose_name='Correo del cliente (al vender)')
+    items_count = models.PositiveIntegerField(default=0, verbose_name='Líneas')
+    items_qty = models.IntegerField(default=0, verbose_name='Unidades')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha Eliminación')
@@ -215,11 +288,59 @@ class Ventas(models.Model):
         verbose_name = 'Venta'
         verbose_name_plural = 'Ventas'
         ordering = ['-fecha']
+        indexes = [
+            # Marca de agua para la actualización incremental de Resumen_Ventas
+            models.Index(fields=['updated_at'], name='ventas_updated_at_idx'),
+            # Orden y jerarquía de fechas del admin
+            models.Index(fields=['fecha'], name='ventas_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Venta {self.folio or self.id} - {self.fecha.strftime('%d/%m/%Y')}"
 
 
+class Secuencias_Folio(models.Model):
+    """
+    Tabla de control: Secuencias para folios
+    Cada proceso reserva bloques de números con un UPDATE atómico (ver shop/folios.py)
+    """
+    nombre = models.CharField(max_length=20, unique=True, verbose_name='Prefijo')
+    ultimo_valor = models.BigIntegerField(default=0, verbose_name='Último valor reservado')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
+
+    class Meta:
+        db_table = 'Secuencias_Folio'
+        verbose_name = 'Secuencia de Folio'
+        verbose_name_plural = 'Secuencias de Folio'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_valor}"
+
+
+class Detalle_VentaQuerySet(models.QuerySet):
+    """QuerySet con cálculos de subtotal resueltos en la base de datos"""
+
+    def with_subtotals(self, incluir_total=True):
+        """
+        Anota `subtotal_sql` (cantidad × precio_unitario × (1 − descuento_pct/100))
+        y, opcionalmente, `subtotal_venta` con la suma de todas las líneas
+        de la misma venta usando una función de ventana.
+        """
+        subtotal = ExpressionWrapper(
+            F('cantidad') * F('precio_unitario')
+            * (Value(Decimal('1')) - Coalesce(F('descuento_pct'), Value(Decimal('0'))) * Value(Decimal('0.01'))),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        qs = self.annotate(subtotal_sql=subtotal)
+        if incluir_total:
+            qs = qs.annotate(subtotal_venta=Window(
+                expression=Sum(subtotal),
+                partition_by=[F('venta_id')],
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ))
+        return qs
+
+
 class Detalle_Venta(models.Model):
     """
     Tabla Operativa: Detalle de cada venta
@@ -237,11 +358,17 @@ class Detalle_Venta(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha Eliminación')
 
+    objects = Detalle_VentaQuerySet.as_manager()
+
     class Meta:
         db_table = 'Detalle_Venta'
         verbose_name = 'Detalle de Venta'
         verbose_name_plural = 'Detalles de Venta'
         ordering = ['venta_id', 'id']
+        indexes = [
+            # Orden y jerarquía de fechas del admin
+            models.Index(fields=['created_at'], name='detalle_venta_created_at_idx'),
+        ]
 
     def __str__(self):
         if self.producto_id and self.cantidad:
@@ -250,7 +377,10 @@ class Detalle_Venta(models.Model):
 
     @property
     def subtotal(self):
-        """Calcula el subtotal del item con descuento aplicado"""
+        """
+        Subtotal del item con descuento aplicado, desde los valores actuales de la instancia.
+        El calculado en SQL por `with_subtotals()` queda en `subtotal_sql`.
+        """
         if self.cantidad is None or self.precio_unitario is None:
             return 0
         subtotal_base = self.cantidad * self.precio_unitario
@@ -270,11 +400,17 @@ class Movimientos_Inventario(models.Model):
         ('salida', 'Salida'),
         ('ajuste', 'Ajuste'),
     ]
+    ORIGEN_CHOICES = [
+        ('manual', 'Manual'),
+        ('venta', 'Venta'),
+    ]
     
     producto_id = models.ForeignKey(Productos, on_delete=models.PROTECT, 
                                     db_column='producto_id', verbose_name='Producto')
     tipo_movimiento = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name='Tipo de Movimiento')
     cantidad = models.IntegerField(verbose_name='Cantidad')
+    # Los de origen 'venta' los registra inventario.mover_stock_ventas; el pronóstico ya cuenta esas ventas
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES, default='manual', verbose_name='Origen')
     fecha = models.DateTimeField(default=timezone.now, verbose_name='Fecha')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
@@ -285,12 +421,106 @@ class Movimientos_Inventario(models.Model):
         verbose_name = 'Movimiento de Inventario'
         verbose_name_plural = 'Movimientos de Inventario'
         ordering = ['-fecha']
+        indexes = [
+            # Reproducción del libro de movimientos desde un corte de stock
+            models.Index(fields=['fecha'], name='movimientos_fecha_idx'),
+            models.Index(fields=['created_at'], name='movimientos_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_movimiento_display()} - {self.producto_id.nombre} ({self.cantidad})"
 
 
-class Alertas(models.Model):
+class LotesQuerySet(models.QuerySet):
+    """Consultas de lotes apoyadas en los índices por caducidad"""
+
+    def disponibles(self):
+        # Los lotes dados de baja (deleted_at) no se venden ni cuentan como stock
+        return self.filter(cantidad_disponible__gt=0, deleted_at__isnull=True)
+
+    def por_vencer(self, horas=48):
+        """Lotes con stock que vencen entre hoy y las próximas `horas` horas."""
+        hoy = timezone.localdate()
+        limite = timezone.localtime(timezone.now() + timedelta(hours=horas)).date()
+        return self.disponibles().filter(caducidad__gte=hoy, caducidad__lte=limite)
+
+    def vencidos(self):
+        return self.disponibles().filter(caducidad__lt=timezone.localdate())
+
+
+class Lotes(models.Model):
+    """
+    Tabla Operativa: Lotes de producción
+    Cada entrada de inventario puede generar uno o más lotes con su propia caducidad;
+    las ventas consumen primero los lotes que vencen antes (FIFO por caducidad)
+    """
+    producto_id = models.ForeignKey(Productos, on_delete=models.PROTECT,
+                                    db_column='producto_id', related_name='lotes', verbose_name='Producto')
+    movimiento_id = models.ForeignKey('Movimientos_Inventario', on_delete=models.SET_NULL, null=True, blank=True,
+                                      db_column='movimiento_id', related_name='lotes',
+                                      verbose_name='Movimiento de entrada')
+    codigo = models.CharField(max_length=50, blank=True, null=True, verbose_name='Código de lote')
+    elaboracion = models.DateField(blank=True, null=True, verbose_name='Fecha Elaboración')
+    caducidad = models.DateField(verbose_name='Fecha Caducidad')
+    cantidad_inicial = models.IntegerField(verbose_name='Cantidad Inicial')
+    cantidad_disponible = models.IntegerField(verbose_name='Cantidad Disponible')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha Modificación')
+    deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha Eliminación')
+
+    objects = LotesQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'Lotes'
+        verbose_name = 'Lote'
+        verbose_name_plural = 'Lotes'
+        ordering = ['caducidad', 'id']
+        indexes = [
+            models.Index(fields=['producto_id', 'caducidad'], name='lotes_producto_caducidad_idx'),
+            models.Index(fields=['caducidad'], name='lotes_caducidad_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lote {self.codigo or self.id} - vence {self.caducidad.strftime('%d/%m/%Y')}"
+
+    def clean(self):
+        if self.elaboracion and self.caducidad and self.caducidad <= self.elaboracion:
+            raise ValidationError({
+                'caducidad': 'La fecha de caducidad debe ser posterior a la fecha de elaboración.'
+            })
+        if self.cantidad_disponible is not None and self.cantidad_inicial is not None:
+            if self.cantidad_disponible < 0 or self.cantidad_disponible > self.cantidad_inicial:
+                raise ValidationError({
+                    'cantidad_disponible': 'La cantidad disponible debe estar entre 0 y la cantidad inicial.'
+                })
+
+
+class Cortes_Stock(models.Model):
+    """
+    Tabla Operativa: Cortes (snapshots) de stock por producto
+    El stock en cualquier instante se reconstruye desde el corte más cercano
+    sumando solo los movimientos posteriores
+    """
+    producto_id = models.ForeignKey(Productos, on_delete=models.CASCADE,
+                                    db_column='producto_id', related_name='cortes_stock', verbose_name='Producto')
+    fecha = models.DateTimeField(verbose_name='Fecha del corte')
+    stock = models.IntegerField(verbose_name='Stock')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha Creación')
+
+    class Meta:
+        db_table = 'Cortes_Stock'
+        verbose_name = 'Corte de Stock'
+        verbose_name_plural = 'Cortes de Stock'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto_id'], name='cortes_stock_fecha_producto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id_id} @ {self.fecha:%d/%m/%Y %H:%M}: {self.stock}"
+
+
+class Alertas(ValoresCargadosMixin, models.Model):
     """
     Tabla Operativa: Alertas de stock y vencimiento
     Sistema de notificaciones para administración
@@ -322,6 +552,10 @@ class Alertas(models.Model):
         verbose_name = 'Alerta'
         verbose_name_plural = 'Alertas'
         ordering = ['-fecha_generada']
+        indexes = [
+            # Orden y jerarquía de fechas del admin
+            models.Index(fields=['fecha_generada'], name='alertas_fecha_generada_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_alerta_display()} - {self.producto_id.nombre}"
@@ -378,3 +612,69 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
     else:
         UserProfile.objects.get_or_create(user=instance)
+
+
+class Resumen_Ventas(models.Model):
+    """
+    Tabla de Resumen: Ventas pre-agregadas para reportes
+    Una fila por día, hora, producto y canal; se recalcula con `actualizar_resumenes`
+    """
+    fecha = models.DateField(verbose_name='Fecha')
+    hora = models.PositiveSmallIntegerField(verbose_name='Hora')
+    dia_semana = models.PositiveSmallIntegerField(verbose_name='Día de la semana',
+                                                  help_text='1 = domingo ... 7 = sábado')
+    producto_id = models.ForeignKey(Productos, on_delete=models.CASCADE,
+                                    db_column='producto_id', verbose_name='Producto')
+    categoria_id = models.ForeignKey(Categorias, on_delete=models.CASCADE,
+                                     db_column='categoria_id', verbose_name='Categoría')
+    canal_venta = models.CharField(max_length=20, verbose_name='Canal de Venta')
+    cantidad = models.IntegerField(default=0, verbose_name='Unidades')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Total sin IVA')
+    lineas = models.IntegerField(default=0, verbose_name='Líneas de venta')
+
+    class Meta:
+        db_table = 'Resumen_Ventas'
+        verbose_name = 'Resumen de Ventas'
+        verbose_name_plural = 'Resúmenes de Ventas'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'hora', 'producto_id', 'canal_venta'],
+                                    name='resumen_ventas_grano_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.hora:02d}h - {self.producto_id_id} ({self.canal_venta})"
+
+
+class Resumen_Pendiente(models.Model):
+    """
+    Tabla de control: días del resumen que deben recalcularse aunque ninguna
+    venta de ese día tenga updated_at posterior a la marca (una venta
+    eliminada o movida a otra fecha)
+    """
+    fecha = models.DateField(unique=True, verbose_name='Fecha')
+    marcado = models.DateTimeField(verbose_name='Fecha Marcado')
+
+    class Meta:
+        db_table = 'Resumen_Pendiente'
+        verbose_name = 'Día Pendiente de Resumen'
+        verbose_name_plural = 'Días Pendientes de Resumen'
+
+    def __str__(self):
+        return f"{self.fecha} (marcado {self.marcado})"
+
+
+class Marca_Agregacion(models.Model):
+    """
+    Tabla de control: última marca de agua procesada por cada proceso de agregación
+    """
+    nombre = models.CharField(max_length=50, unique=True, verbose_name='Nombre')
+    marca = models.DateTimeField(null=True, blank=True, verbose_name='Marca de agua')
+    actualizado = models.DateTimeField(auto_now=True, verbose_name='Fecha Actualización')
+
+    class Meta:
+        db_table = 'Marca_Agregacion'
+        verbose_name = 'Marca de Agregación'
+        verbose_name_plural = 'Marcas de Agregación'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.marca or 'sin procesar'}"
@@ -0,0 +1,161 @@
+"""
+Detector de consultas N+1
+
+Durante una petición registra cada SELECT (vía `connection.execute_wrapper`)
+junto con su origen: la relación del modelo que la disparó (por ejemplo
+`Alertas.producto_id` al leer `alerta.producto_id.nombre` sin
+select_related), el primer archivo del proyecto en la pila y la plantilla y
+línea si se ejecutó al renderizar. Las consultas con el mismo SQL y el mismo
+origen que solo cambian en sus parámetros (la PK) son un N+1 cuando se
+repiten DETECTOR_NMAS1_UMBRAL veces o más.
+
+DETECTOR_NMAS1 en settings elige qué hacer al final de la petición:
+'log' (advertencia en el logger shop.nmas1), 'error' (lanza ConsultasNMas1;
+el cliente de pruebas la propaga al test) o '' (el middleware no se instala).
+Recorrer la pila en cada consulta tiene costo: solo para DEBUG y pruebas.
+Las vistas async consultan desde otros hilos (sync_to_async) y no se vigilan.
+
+Fuera de una petición (tests, comandos) se usa `vigilar()`:
+
+    with vigilar() as registro:
+        ...
+    registro.repetidas()
+"""
+
+import logging
+import os
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+UMBRAL_POR_DEFECTO = 3
+_DESCRIPTORES = os.path.join('django', 'db', 'models', 'fields', 'related_descriptors.py')
+_QUERYSETS = os.path.join('django', 'db', 'models', 'query.py')
+_PLANTILLAS = os.path.join('django', 'template', 'base.py')
+# Otros execute_wrapper del proyecto: aparecen en la pila pero no originan la consulta
+_INSTRUMENTACION = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), nombre)
+    for nombre in ('consultas_lentas.py', 'metricas.py', 'nmas1.py', 'perfilador.py')
+}
+
+
+class ConsultasNMas1(Exception):
+    pass
+
+
+def _relacion(descriptor):
+    """'Modelo.campo' de un descriptor o manager de relación de Django, o None."""
+    if hasattr(descriptor, 'prefetch_cache_name') and hasattr(descriptor, 'instance'):
+        # Manager de una relación muchos-a-muchos
+        return f"{type(descriptor.instance).__name__}.{descriptor.prefetch_cache_name}"
+    campo = getattr(descriptor, 'field', None)
+    if campo is None:
+        relacionado = getattr(descriptor, 'related', None)
+        if relacionado is None:
+            return None
+        # OneToOne inversa: vista desde el modelo apuntado
+        return f"{relacionado.model.__name__}.{relacionado.get_accessor_name()}"
+    return f"{campo.model.__name__}.{campo.name}"
+
+
+def _relacion_inversa(queryset):
+    """'Modelo.accesor' si el QuerySet viene de un manager de FK inversa (venta.detalles.all())."""
+    conocidos = getattr(queryset, '_known_related_objects', None)
+    if not conocidos:
+        return None
+    campo = next(iter(conocidos))
+    return f"{campo.remote_field.model.__name__}.{campo.remote_field.get_accessor_name()}"
+
+
+def _origen(raiz):
+    """(relación, sitio en el código, plantilla:línea) de la consulta en curso."""
+    relacion = plantilla = None
+    sitios = []
+    frame = sys._getframe(2)
+    while frame is not None and (relacion is None or plantilla is None or len(sitios) < 2):
+        archivo = frame.f_code.co_filename
+        if relacion is None and archivo.endswith(_DESCRIPTORES):
+            relacion = _relacion(frame.f_locals.get('self'))
+        elif relacion is None and archivo.endswith(_QUERYSETS):
+            relacion = _relacion_inversa(frame.f_locals.get('self'))
+        elif plantilla is None and archivo.endswith(_PLANTILLAS):
+            nodo = frame.f_locals.get('self')
+            origen, token = getattr(nodo, 'origin', None), getattr(nodo, 'token', None)
+            if origen is not None and token is not None:
+                plantilla = f"{origen.template_name}:{token.lineno}"
+        elif (
+            len(sitios) < 2
+            and archivo.startswith(raiz)
+            and archivo not in _INSTRUMENTACION
+            and 'site-packages' not in archivo
+        ):
+            sitios.append(f"{os.path.relpath(archivo, raiz)}:{frame.f_lineno} ({frame.f_code.co_name})")
+        frame = frame.f_back
+    return relacion, ' <- '.join(sitios), plantilla
+
+
+class RegistroConsultas:
+    """Wrapper de ejecución que agrupa los SELECT por (SQL, origen)."""
+
+    def __init__(self, umbral=None):
+        self.umbral = umbral or getattr(settings, 'DETECTOR_NMAS1_UMBRAL', UMBRAL_POR_DEFECTO)
+        self.raiz = str(settings.BASE_DIR) + os.sep
+        self.grupos = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            relacion, sitio, plantilla = _origen(self.raiz)
+            grupo = self.grupos.setdefault((sql, relacion or sitio), {
+                'relacion': relacion, 'sitio': sitio, 'plantilla': plantilla,
+                'sql': sql, 'veces': 0, 'parametros': set(),
+            })
+            grupo['veces'] += 1
+            grupo['parametros'].add(repr(params))
+        return execute(sql, params, many, context)
+
+    def repetidas(self):
+        """Grupos con al menos `umbral` consultas iguales salvo por sus parámetros."""
+        return [grupo for grupo in self.grupos.values() if len(grupo['parametros']) >= self.umbral]
+
+    def informe(self, etiqueta=''):
+        lineas = [f"Consultas N+1{f' en {etiqueta}' if etiqueta else ''}:"]
+        for grupo in self.repetidas():
+            linea = f"  {grupo['veces']}x {grupo['relacion'] or 'consulta repetida'} desde {grupo['sitio'] or '?'}"
+            if grupo['plantilla']:
+                linea += f" (plantilla {grupo['plantilla']})"
+            lineas.append(f"{linea}\n      {grupo['sql'][:200]}")
+        return '\n'.join(lineas)
+
+
+@contextmanager
+def vigilar(umbral=None):
+    """Registra las consultas de todas las conexiones mientras dura el bloque."""
+    registro = RegistroConsultas(umbral)
+    with ExitStack() as pila:
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(registro))
+        yield registro
+
+
+class DetectorNMas1Middleware:
+    def __init__(self, get_response):
+        self.modo = getattr(settings, 'DETECTOR_NMAS1', '')
+        if not self.modo:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with vigilar() as registro:
+            response = self.get_response(request)
+        if registro.repetidas():
+            mensaje = registro.informe(f"{request.method} {request.path}")
+            if self.modo == 'error':
+                raise ConsultasNMas1(mensaje)
+            logger.warning(mensaje)
+        return response
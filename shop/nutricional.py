@@ -0,0 +1,146 @@
+"""
+Perfiles nutricionales compartidos
+
+Cada fila de Nutricional lleva una `huella` única (SHA-1 de sus seis
+valores con dos decimales). Los perfiles con los mismos valores son
+intercambiables: `obtener_o_crear_perfil` reutiliza el existente en vez de
+crear otro, y `python manage.py fusionar_nutricional` une los repetidos que
+se hayan cargado sin señales (bulk_create no calcula la huella).
+
+Un perfil puede estar compartido por muchos productos, así que no se edita
+en sitio: cambiar los valores de un producto lo apunta a otro perfil
+(`reasignar_perfil`, copia al escribir) y los demás productos no cambian.
+
+`perfil(id)` lee desde el caché de dos niveles (shop/cache.py): la ficha de
+producto no consulta Nutricional en cada visita. Guardar o eliminar un
+perfil lo saca de L2 y del L1 de este proceso; los demás workers lo
+refrescan al vencer TTL_PERFIL_LOCAL.
+"""
+
+import copy
+import hashlib
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import CacheDosNiveles
+from .models import Nutricional, Productos
+
+
+CAMPOS_NUTRICIONALES = ('calorias', 'proteinas', 'grasas', 'carbohidratos', 'azucares', 'sodio')
+MAX_PERFILES_CACHE = 512
+TTL_PERFIL = 60 * 60
+TTL_PERFIL_LOCAL = 5 * 60
+
+
+def calcular_huella(valores):
+    """SHA-1 de los valores nutricionales (dict o instancia); None cuenta como vacío, no como 0."""
+    obtener = valores.get if isinstance(valores, dict) else lambda campo: getattr(valores, campo)
+    partes = []
+    for campo in CAMPOS_NUTRICIONALES:
+        valor = obtener(campo)
+        partes.append('' if valor is None else str(Decimal(valor).quantize(Decimal('0.01'))))
+    return hashlib.sha1('|'.join(partes).encode('ascii')).hexdigest()
+
+
+def obtener_o_crear_perfil(**valores):
+    """Perfil con exactamente estos valores; se crea solo si no existe uno igual."""
+    huella = calcular_huella(valores)
+    existente = Nutricional.objects.filter(huella=huella).first()
+    if existente is not None:
+        return existente
+    try:
+        with transaction.atomic():
+            return Nutricional.objects.create(**{campo: valores.get(campo) for campo in CAMPOS_NUTRICIONALES})
+    except IntegrityError:
+        # Otra petición creó el mismo perfil entre la lectura y el INSERT
+        return Nutricional.objects.get(huella=huella)
+
+
+def valores_perfil(nutricional):
+    """{campo: valor} de los seis valores nutricionales (vacío si no hay perfil)."""
+    return {campo: getattr(nutricional, campo, None) for campo in CAMPOS_NUTRICIONALES}
+
+
+def reasignar_perfil(producto, valores):
+    """
+    Apunta `producto` (sin guardarlo) al perfil con `valores`. El perfil
+    anterior no se modifica: puede estar compartido. Retorna True si cambió.
+    """
+    actual = perfil(producto.Nutricional_id_id)
+    if actual is not None and calcular_huella(actual) == calcular_huella(valores):
+        return False
+    producto.Nutricional_id = obtener_o_crear_perfil(**valores)
+    return True
+
+
+# ============= CACHÉ DE PERFILES =============
+
+_perfiles = CacheDosNiveles('nutricional', TTL_PERFIL, TTL_PERFIL_LOCAL, MAX_PERFILES_CACHE)
+
+
+def perfil(nutricional_id):
+    """Nutricional por id desde el caché (una copia: el llamador puede modificarla). None si no existe."""
+    if nutricional_id is None:
+        return None
+    instancia = _perfiles.obtener(
+        nutricional_id, lambda: Nutricional.objects.filter(pk=nutricional_id).first()
+    )
+    return copy.copy(instancia) if instancia is not None else None
+
+
+def asignar_perfil(producto):
+    """Deja el perfil del producto en la caché de la relación: `producto.Nutricional_id` no consulta."""
+    if producto.Nutricional_id_id and not Productos.Nutricional_id.is_cached(producto):
+        instancia = perfil(producto.Nutricional_id_id)
+        if instancia is not None:
+            Productos.Nutricional_id.field.set_cached_value(producto, instancia)
+    return producto
+
+
+@receiver(pre_save, sender=Nutricional, dispatch_uid='nutricional_huella')
+def _huella(sender, instance, **kwargs):
+    instance.huella = calcular_huella(instance)
+
+
+@receiver(post_save, sender=Nutricional, dispatch_uid='nutricional_guardado')
+@receiver(post_delete, sender=Nutricional, dispatch_uid='nutricional_eliminado')
+def _descartar_perfil(sender, instance, **kwargs):
+    _perfiles.descartar(instance.pk)
+    # Un rollback dejaría en el caché una versión que nunca se confirmó
+    transaction.on_commit(lambda: _perfiles.descartar(instance.pk))
+
+
+# ============= FUSIÓN DE DUPLICADOS =============
+
+def grupos_duplicados():
+    """{id conservado: [ids duplicados]} de los perfiles con la misma huella."""
+    por_huella = {}
+    filas = Nutricional.objects.values_list('id', *CAMPOS_NUTRICIONALES).order_by('id')
+    for fila in filas.iterator(chunk_size=2000):
+        # Se recalcula en memoria: cubre filas sin huella o cargadas sin señales
+        huella = calcular_huella(dict(zip(CAMPOS_NUTRICIONALES, fila[1:])))
+        por_huella.setdefault(huella, []).append(fila[0])
+    return {ids[0]: ids[1:] for ids in por_huella.values() if len(ids) > 1}
+
+
+def fusionar_grupos(grupos):
+    """
+    Reasigna los productos de los perfiles duplicados al conservado (un
+    UPDATE ... CASE) y elimina los duplicados. Retorna (eliminados, productos).
+    """
+    destino = {dup: conservado for conservado, dups in grupos.items() for dup in dups}
+    if not destino:
+        return 0, 0
+    with transaction.atomic():
+        productos = Productos.objects.filter(Nutricional_id__in=list(destino)).update(
+            Nutricional_id=Case(
+                *[When(Nutricional_id=dup, then=Value(conservado)) for dup, conservado in destino.items()],
+                output_field=IntegerField(),
+            )
+        )
+        eliminados, _ = Nutricional.objects.filter(id__in=list(destino)).delete()
+    return eliminados, productos
@@ -0,0 +1,162 @@
+"""
+Perfilado a pedido de una petición
+
+Un superusuario agrega `?_perfil=1` (o la cabecera `X-Perfil: 1`) a cualquier
+URL y esa petición corre bajo cProfile, registrando además cada consulta SQL
+con su duración y el tiempo de render de cada plantilla. El resultado queda
+en PERFILES_DIR como dos archivos:
+
+    <id>.prof  estadísticas de cProfile (pstats, snakeviz, etc.)
+    <id>.txt   informe legible: árbol de llamadas, SQL y plantillas
+
+La respuesta original vuelve con las cabeceras X-Perfil-Id y X-Perfil-Url
+(descarga en /perfiles/<id>/). Con `?_perfil=informe` se devuelve el informe
+en vez de la página.
+
+Las peticiones normales solo pagan la búsqueda del parámetro y de la
+cabecera: el parche de Template._render se instala al empezar un perfil y se
+retira cuando no queda ninguno en curso.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.template.base import Template
+from django.urls import reverse
+from django.utils import timezone
+
+
+PARAMETRO = '_perfil'
+CABECERA = 'X-Perfil'
+ID_PATRON = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+FUNCIONES_INFORME = 60
+
+_local = threading.local()
+_lock = threading.Lock()
+_activos = 0
+_render_original = Template._render
+
+
+def _render_medido(self, context):
+    plantillas = getattr(_local, 'plantillas', None)
+    if plantillas is None:
+        return _render_original(self, context)
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context)
+    finally:
+        nombre = self.origin.template_name if self.origin else '<cadena>'
+        plantillas[nombre][0] += 1
+        plantillas[nombre][1] += time.perf_counter() - inicio
+
+
+def _activar_plantillas():
+    global _activos
+    with _lock:
+        _activos += 1
+        Template._render = _render_medido
+
+
+def _desactivar_plantillas():
+    global _activos
+    with _lock:
+        _activos -= 1
+        if not _activos:
+            Template._render = _render_original
+
+
+def ruta_perfil(perfil_id, extension):
+    if not ID_PATRON.match(perfil_id) or extension not in ('prof', 'txt'):
+        raise ValueError(perfil_id)
+    return os.path.join(settings.PERFILES_DIR, f'{perfil_id}.{extension}')
+
+
+def _solicitado(request):
+    valor = request.GET.get(PARAMETRO) or request.headers.get(CABECERA)
+    return valor if valor in ('1', 'informe') else None
+
+
+def _informe(request, response, duracion, perfilador, consultas, plantillas):
+    salida = io.StringIO()
+    salida.write(f"{request.method} {request.get_full_path()} -> {response.status_code}\n")
+    salida.write(f"Fecha: {timezone.now().isoformat()}  Usuario: {request.user.get_username()}\n")
+    tiempo_sql = sum(ms for _, ms in consultas)
+    salida.write(
+        f"Total: {duracion * 1000:.1f} ms | SQL: {len(consultas)} consultas, {tiempo_sql:.1f} ms | "
+        f"Plantillas: {sum(n for n, _ in plantillas.values())} renders\n"
+    )
+
+    salida.write('\n=== Llamadas (tiempo acumulado) ===\n')
+    estadisticas = pstats.Stats(perfilador, stream=salida)
+    estadisticas.sort_stats('cumulative').print_stats(FUNCIONES_INFORME)
+    salida.write('=== Quién llama a las más costosas ===\n')
+    estadisticas.print_callers(15)
+
+    salida.write('\n=== SQL (más lentas primero) ===\n')
+    for sql, ms in sorted(consultas, key=lambda c: -c[1]):
+        salida.write(f"{ms:8.2f} ms  {sql}\n")
+
+    salida.write('\n=== Plantillas (tiempo inclusivo: cuenta el de sus sub-plantillas) ===\n')
+    for nombre, (renders, segundos) in sorted(plantillas.items(), key=lambda p: -p[1][1]):
+        salida.write(f"{segundos * 1000:8.2f} ms  {renders:4d}x  {nombre}\n")
+    return salida.getvalue()
+
+
+class PerfiladorMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        modo = _solicitado(request)
+        if modo is None or not getattr(request.user, 'is_superuser', False):
+            return self.get_response(request)
+        return self._perfilar(request, modo)
+
+    def _perfilar(self, request, modo):
+        consultas = []
+
+        def registrar(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                consultas.append((sql, (time.perf_counter() - inicio) * 1000))
+
+        perfilador = cProfile.Profile()
+        _local.plantillas = plantillas = defaultdict(lambda: [0, 0.0])
+        _activar_plantillas()
+        inicio = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(registrar):
+                perfilador.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    perfilador.disable()
+        finally:
+            duracion = time.perf_counter() - inicio
+            _local.plantillas = None
+            _desactivar_plantillas()
+
+        perfil_id = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        informe = _informe(request, response, duracion, perfilador, consultas, plantillas)
+        os.makedirs(settings.PERFILES_DIR, exist_ok=True)
+        perfilador.dump_stats(ruta_perfil(perfil_id, 'prof'))
+        with open(ruta_perfil(perfil_id, 'txt'), 'w', encoding='utf-8') as archivo:
+            archivo.write(informe)
+
+        if modo == 'informe':
+            response = HttpResponse(informe, content_type='text/plain; charset=utf-8')
+        response['X-Perfil-Id'] = perfil_id
+        response['X-Perfil-Url'] = reverse('forneria:perfil_descarga', args=[perfil_id])
+        return response
@@ -0,0 +1,149 @@
+"""
+Pronóstico de demanda y puntos de reposición para productos de elaboración propia
+
+La demanda diaria por producto se obtiene en una sola consulta agregada
+(ventas + salidas de inventario que no vienen de una venta) y se arma una matriz densa productos × días.
+Promedios móviles, estacionalidad por día de la semana y stock de seguridad
+se calculan de forma vectorizada para todo el catálogo a la vez.
+"""
+
+import math
+from datetime import datetime, time, timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Detalle_Venta, Movimientos_Inventario, Productos
+
+
+TIPO_PROPIA = 'propia'
+
+
+def _rango(dias, hasta):
+    tz = timezone.get_current_timezone()
+    inicio = hasta - timedelta(days=dias - 1)
+    desde_dt = timezone.make_aware(datetime.combine(inicio, time.min), tz)
+    hasta_dt = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), tz)
+    return inicio, desde_dt, hasta_dt
+
+
+def demanda_diaria(productos_ids, dias, hasta):
+    """
+    Matriz de demanda (len(productos_ids) × dias) con las unidades vendidas
+    y las salidas de inventario de cada día. Ventas y movimientos se leen en
+    una sola consulta UNION ALL ya agregada por producto y día.
+    """
+    inicio, desde_dt, hasta_dt = _rango(dias, hasta)
+
+    ventas = (
+        Detalle_Venta.objects
+        .filter(producto_id__in=productos_ids, venta_id__fecha__gte=desde_dt, venta_id__fecha__lt=hasta_dt)
+        .annotate(dia=TruncDate('venta_id__fecha'), producto=F('producto_id'))
+        .values('producto', 'dia')
+        .annotate(unidades=Sum('cantidad'))
+        .order_by()
+    )
+    salidas = (
+        Movimientos_Inventario.objects
+        .filter(producto_id__in=productos_ids, tipo_movimiento='salida', origen='manual',
+                fecha__gte=desde_dt, fecha__lt=hasta_dt)
+        .annotate(dia=TruncDate('fecha'), producto=F('producto_id'))
+        .values('producto', 'dia')
+        .annotate(unidades=Sum('cantidad'))
+        .order_by()
+    )
+
+    indice = {producto_id: fila for fila, producto_id in enumerate(productos_ids)}
+    filas, columnas, unidades = [], [], []
+    for registro in ventas.union(salidas, all=True):
+        columna = (registro['dia'] - inicio).days
+        if 0 <= columna < dias:
+            filas.append(indice[registro['producto']])
+            columnas.append(columna)
+            unidades.append(registro['unidades'] or 0)
+
+    matriz = np.zeros((len(productos_ids), dias), dtype=float)
+    # add.at acumula los índices repetidos (venta y salida del mismo día)
+    np.add.at(matriz, (np.asarray(filas, dtype=int), np.asarray(columnas, dtype=int)), unidades)
+    return inicio, matriz
+
+
+def calcular_reposicion(dias=56, ventana=7, lead_time=1, cobertura=1, nivel_servicio=0.95, hasta=None):
+    """
+    Calcula punto de reorden, nivel objetivo y producción sugerida para cada
+    producto de elaboración propia con historial de demanda.
+
+    - `ventana`: días del promedio móvil usado como nivel base de demanda.
+    - `lead_time`: días que tarda en estar disponible una nueva producción.
+    - `cobertura`: días de demanda que debe cubrir cada tanda de producción.
+    - `nivel_servicio`: probabilidad objetivo de no quebrar stock (define z).
+    """
+    hasta = hasta or timezone.localdate()
+    productos = list(
+        Productos.objects.filter(tipo=TIPO_PROPIA)
+        .only('id', 'nombre', 'stock_actual', 'stock_minimo', 'stock_maximo')
+        .order_by('id')
+    )
+    if not productos:
+        return []
+
+    ventana = max(1, min(ventana, dias))
+    inicio, matriz = demanda_diaria([p.id for p in productos], dias, hasta)
+
+    # Promedio móvil de `ventana` días para cada producto (via suma acumulada)
+    acumulada = np.cumsum(np.pad(matriz, ((0, 0), (1, 0))), axis=1)
+    promedio_movil = (acumulada[:, ventana:] - acumulada[:, :-ventana]) / ventana
+    nivel = promedio_movil[:, -1]
+
+    # Estacionalidad semanal: demanda media de cada día de la semana sobre la media global
+    dia_semana = (inicio.weekday() + np.arange(dias)) % 7
+    una_caliente = np.eye(7)[dia_semana]
+    dias_por_semana = una_caliente.sum(axis=0)
+    media_por_dia = (matriz @ una_caliente) / np.maximum(dias_por_semana, 1)
+    media_global = matriz.mean(axis=1, keepdims=True)
+    estacionalidad = np.divide(media_por_dia, media_global,
+                               out=np.ones_like(media_por_dia), where=media_global > 0)
+
+    # Demanda esperada en los próximos días, ajustada por día de la semana
+    futuros = (hasta.weekday() + 1 + np.arange(lead_time + cobertura)) % 7
+    factores = estacionalidad[:, futuros]
+    demanda_lead = nivel * factores[:, :lead_time].sum(axis=1)
+    demanda_cobertura = nivel * factores[:, lead_time:].sum(axis=1)
+
+    z = NormalDist().inv_cdf(nivel_servicio)
+    desviacion = matriz.std(axis=1, ddof=1) if dias > 1 else np.zeros(len(productos))
+    stock_seguridad = z * desviacion * math.sqrt(lead_time)
+
+    punto_reorden = np.ceil(demanda_lead + stock_seguridad).astype(int)
+    nivel_objetivo = np.maximum(np.ceil(punto_reorden + demanda_cobertura).astype(int), punto_reorden + 1)
+    con_historial = matriz.sum(axis=1) > 0
+
+    resultados = []
+    for i, producto in enumerate(productos):
+        if not con_historial[i]:
+            continue
+        stock_actual = producto.stock_actual or 0
+        resultados.append({
+            'producto': producto,
+            'demanda_diaria': round(float(nivel[i]), 2),
+            'stock_seguridad': round(float(stock_seguridad[i]), 2),
+            'punto_reorden': int(punto_reorden[i]),
+            'nivel_objetivo': int(nivel_objetivo[i]),
+            'produccion_sugerida': max(0, int(nivel_objetivo[i]) - stock_actual),
+        })
+    return resultados
+
+
+def aplicar_reposicion(resultados):
+    """Guarda punto de reorden (stock_minimo) y nivel objetivo (stock_maximo) con bulk_update."""
+    productos = []
+    for resultado in resultados:
+        producto = resultado['producto']
+        producto.stock_minimo = resultado['punto_reorden']
+        producto.stock_maximo = resultado['nivel_objetivo']
+        productos.append(producto)
+    Productos.objects.bulk_update(productos, ['stock_minimo', 'stock_maximo'], batch_size=500)
+    return len(productos)
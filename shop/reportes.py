@@ -0,0 +1,438 @@
+"""
+Reportes de ventas para Fornería
+
+Los reportes se sirven desde la tabla pre-agregada `Resumen_Ventas`
+(día × hora × producto × canal), que se actualiza de forma incremental
+usando una marca de agua sobre `Ventas.updated_at`. Si el resumen aún no
+se ha construido, se usa una consulta SQL directa sobre Detalle_Venta.
+Los resultados se guardan en caché por (reporte, parámetros).
+
+Lo que no deja rastro en updated_at se registra con señales:
+
+- Guardar o eliminar un Detalle_Venta toca updated_at de su venta, una vez
+  por venta al confirmar la transacción.
+- Eliminar una venta, o moverla a otra fecha, marca el día que deja en
+  Resumen_Pendiente; la siguiente actualización lo recalcula.
+
+Los `update()` y `delete()` masivos no emiten señales: tras ellos hay que
+reconstruir con `actualizar_resumenes(completo=True)`.
+"""
+
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Detalle_Venta, Marca_Agregacion, Resumen_Pendiente, Resumen_Ventas, Ventas
+
+
+MARCA_RESUMEN = 'resumen_ventas'
+
+# Margen de relectura: cubre transacciones que guardaron antes de la marca
+# pero confirmaron después de leerla. Recalcular un día dos veces es inocuo.
+MARGEN_MARCA = timedelta(minutes=5)
+
+DIAS_POR_LOTE = 31
+TAMANO_LOTE_INSERCION = 1000
+
+CACHE_VERSION_KEY = 'reportes:version'
+CACHE_TIMEOUT_RESUMEN = 60 * 60
+CACHE_TIMEOUT_SQL = 60
+
+DIAS_SEMANA = {
+    1: 'Domingo',
+    2: 'Lunes',
+    3: 'Martes',
+    4: 'Miércoles',
+    5: 'Jueves',
+    6: 'Viernes',
+    7: 'Sábado',
+}
+
+# dimensión -> (campos en Resumen_Ventas, campos equivalentes en Detalle_Venta)
+DIMENSIONES = {
+    'producto': (
+        ('producto_id', 'producto_id__nombre'),
+        ('producto_id', 'producto_id__nombre'),
+    ),
+    'categoria': (
+        ('categoria_id', 'categoria_id__nombre'),
+        ('producto_id__Categorias_id', 'producto_id__Categorias_id__nombre'),
+    ),
+    'canal': (
+        ('canal_venta',),
+        ('venta_id__canal_venta',),
+    ),
+    'hora': (
+        ('hora',),
+        ('hora',),
+    ),
+    'dia_semana': (
+        ('dia_semana',),
+        ('dia_semana',),
+    ),
+}
+
+NOMBRES_DIMENSION = {
+    'producto': 'Producto',
+    'categoria': 'Categoría',
+    'canal': 'Canal de venta',
+    'hora': 'Hora del día',
+    'dia_semana': 'Día de la semana',
+}
+
+
+# ============= DÍAS PENDIENTES =============
+
+def _dia(fecha):
+    """Día local de la venta, el mismo que usa TruncDate en las consultas."""
+    return timezone.localtime(fecha).date()
+
+
+def marcar_pendiente(*dias):
+    """Registra días que la próxima actualización debe recalcular."""
+    ahora = timezone.now()
+    Resumen_Pendiente.objects.bulk_create(
+        [Resumen_Pendiente(fecha=dia, marcado=ahora) for dia in set(dias)],
+        update_conflicts=True, unique_fields=['fecha'], update_fields=['marcado'],
+    )
+
+
+@receiver(pre_save, sender=Ventas, dispatch_uid='reportes_venta_fecha_anterior')
+def _recordar_fecha(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._fecha_anterior = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'fecha' not in update_fields:
+        return
+    instance._fecha_anterior = instance.valor_previo('fecha')
+
+
+@receiver(post_save, sender=Ventas, dispatch_uid='reportes_venta_movida')
+def _venta_movida(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'fecha' not in update_fields):
+        return
+    anterior = getattr(instance, '_fecha_anterior', None)
+    instance.recordar_guardado('fecha')
+    if anterior is not None and _dia(anterior) != _dia(instance.fecha):
+        marcar_pendiente(_dia(anterior))
+
+
+@receiver(post_delete, sender=Ventas, dispatch_uid='reportes_venta_eliminada')
+def _venta_eliminada(sender, instance, **kwargs):
+    marcar_pendiente(_dia(instance.fecha))
+
+
+@receiver(post_save, sender=Detalle_Venta, dispatch_uid='reportes_detalle_guardado')
+@receiver(post_delete, sender=Detalle_Venta, dispatch_uid='reportes_detalle_eliminado')
+def _tocar_venta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Las ventas de todas las líneas de la transacción se tocan con un único UPDATE al
+    # confirmar: el primer callback toma todo el conjunto y los demás lo encuentran vacío
+    conexion = transaction.get_connection()
+    if not hasattr(conexion, '_ventas_por_tocar'):
+        conexion._ventas_por_tocar = set()
+    conexion._ventas_por_tocar.add(instance.venta_id_id)
+    transaction.on_commit(lambda: _tocar_ventas(conexion))
+
+
+def _tocar_ventas(conexion):
+    ids, conexion._ventas_por_tocar = conexion._ventas_por_tocar, set()
+    if ids:
+        Ventas.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+# ============= ACTUALIZACIÓN DEL RESUMEN =============
+
+def _detalles_agregados(dias):
+    """Agrega Detalle_Venta al grano de Resumen_Ventas para los días indicados."""
+    return (
+        Detalle_Venta.objects.with_subtotals(incluir_total=False)
+        .filter(venta_id__fecha__date__in=dias)
+        .annotate(
+            dia=TruncDate('venta_id__fecha'),
+            hora=ExtractHour('venta_id__fecha'),
+            dia_semana=ExtractWeekDay('venta_id__fecha'),
+        )
+        .values('dia', 'hora', 'dia_semana', 'producto_id',
+                'producto_id__Categorias_id', 'venta_id__canal_venta')
+        .annotate(
+            total_cantidad=Sum('cantidad'),
+            total_monto=Sum('subtotal_sql'),
+            total_lineas=Count('id'),
+        )
+        .order_by()
+    )
+
+
+def _recalcular_dias(dias):
+    """Reemplaza las filas del resumen de los días indicados."""
+    filas = 0
+    with transaction.atomic():
+        Resumen_Ventas.objects.filter(fecha__in=dias).delete()
+        lote = []
+        for fila in _detalles_agregados(dias).iterator():
+            lote.append(Resumen_Ventas(
+                fecha=fila['dia'],
+                hora=fila['hora'],
+                dia_semana=fila['dia_semana'],
+                producto_id_id=fila['producto_id'],
+                categoria_id_id=fila['producto_id__Categorias_id'],
+                canal_venta=fila['venta_id__canal_venta'],
+                cantidad=fila['total_cantidad'] or 0,
+                total=fila['total_monto'] or Decimal('0.00'),
+                lineas=fila['total_lineas'],
+            ))
+            if len(lote) >= TAMANO_LOTE_INSERCION:
+                Resumen_Ventas.objects.bulk_create(lote)
+                filas += len(lote)
+                lote = []
+        if lote:
+            Resumen_Ventas.objects.bulk_create(lote)
+            filas += len(lote)
+    return filas
+
+
+def actualizar_resumenes(completo=False):
+    """
+    Actualiza Resumen_Ventas desde la última marca de agua.
+
+    Se recalculan los días que tienen ventas modificadas después de la marca
+    y los marcados en Resumen_Pendiente (ventas eliminadas o movidas de día).
+    Con `completo=True` se reconstruye todo el resumen (necesario tras
+    `update()` o `delete()` masivos, que no emiten señales).
+    Retorna un diccionario con los días y filas procesados.
+    """
+    marca, _ = Marca_Agregacion.objects.get_or_create(nombre=MARCA_RESUMEN)
+    corte = timezone.now()
+
+    ventas = Ventas.objects.all()
+    pendientes = Resumen_Pendiente.objects.filter(marcado__lte=corte)
+    if completo:
+        Resumen_Ventas.objects.all().delete()
+    elif marca.marca is not None:
+        ventas = ventas.filter(updated_at__gt=marca.marca - MARGEN_MARCA)
+    ventas = ventas.filter(updated_at__lte=corte)
+
+    dias = set(ventas.annotate(dia=TruncDate('fecha')).values_list('dia', flat=True).order_by())
+    if not completo:
+        # Se borran al final solo los días leídos aquí: uno marcado mientras se recalcula queda
+        pendientes = pendientes.filter(fecha__in=list(pendientes.values_list('fecha', flat=True)))
+        dias.update(pendientes.values_list('fecha', flat=True))
+    dias = sorted(dias)
+
+    filas = 0
+    for inicio in range(0, len(dias), DIAS_POR_LOTE):
+        filas += _recalcular_dias(dias[inicio:inicio + DIAS_POR_LOTE])
+    # Un día marcado después del corte se conserva para la próxima actualización
+    pendientes.delete()
+
+    marca.marca = corte
+    marca.save(update_fields=['marca', 'actualizado'])
+    invalidar_cache_reportes()
+    return {'dias': len(dias), 'filas': filas}
+
+
+def marca_resumen():
+    """Fecha-hora hasta la que el resumen está al día, o None si no se ha construido."""
+    return Marca_Agregacion.objects.filter(
+        nombre=MARCA_RESUMEN, marca__isnull=False,
+    ).values_list('marca', flat=True).first()
+
+
+def resumen_disponible():
+    return marca_resumen() is not None
+
+
+# ============= CONSULTAS =============
+
+def _cache_key(reporte, params):
+    version = cache.get(CACHE_VERSION_KEY, 1)
+    firma = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'reportes:{version}:{reporte}:{firma}'
+
+
+def invalidar_cache_reportes():
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 2, None)
+
+
+def _etiqueta(dimension, fila, campos):
+    if dimension == 'dia_semana':
+        return DIAS_SEMANA.get(fila[campos[0]], '')
+    if dimension == 'hora':
+        return f"{fila[campos[0]]:02d}:00"
+    return str(fila[campos[-1]] or '')
+
+
+def _orden(dimension, campos):
+    # Las dimensiones de tiempo se leen en orden natural; el resto, de mayor a menor venta
+    if dimension in ('hora', 'dia_semana'):
+        return (campos[0],)
+    return ('-total_monto', campos[0])
+
+
+def _consulta_resumen(dimension, desde, hasta, canal):
+    campos = DIMENSIONES[dimension][0]
+    qs = Resumen_Ventas.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+    if canal:
+        qs = qs.filter(canal_venta=canal)
+    qs = qs.values(*campos).annotate(
+        total_cantidad=Sum('cantidad'),
+        total_monto=Sum('total'),
+    ).order_by(*_orden(dimension, campos))
+    return campos, qs
+
+
+def _consulta_sql(dimension, desde, hasta, canal):
+    campos = DIMENSIONES[dimension][1]
+    # Rango por fecha-hora (y no por __date) para que MySQL pueda usar el índice de fecha
+    tz = timezone.get_current_timezone()
+    inicio = timezone.make_aware(datetime.combine(desde, time.min), tz)
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), tz)
+    qs = Detalle_Venta.objects.with_subtotals(incluir_total=False).filter(
+        venta_id__fecha__gte=inicio,
+        venta_id__fecha__lt=fin,
+    )
+    if canal:
+        qs = qs.filter(venta_id__canal_venta=canal)
+    if dimension == 'hora':
+        qs = qs.annotate(hora=ExtractHour('venta_id__fecha'))
+    elif dimension == 'dia_semana':
+        qs = qs.annotate(dia_semana=ExtractWeekDay('venta_id__fecha'))
+    qs = qs.values(*campos).annotate(
+        total_cantidad=Sum('cantidad'),
+        total_monto=Sum('subtotal_sql'),
+    ).order_by(*_orden(dimension, campos))
+    return campos, qs
+
+
+def ventas_por(dimension, desde, hasta, canal=None, origen='auto'):
+    """
+    Ventas agrupadas por `dimension` entre las fechas `desde` y `hasta` (inclusive).
+
+    `origen` puede ser 'resumen', 'sql' o 'auto'. 'auto' usa el resumen para
+    los días anteriores al de la marca de agua y SQL directo desde ese día
+    (lo vendido después de la última actualización aún no está en el resumen).
+    Retorna una lista de diccionarios con clave, etiqueta, cantidad y total.
+    """
+    if dimension not in DIMENSIONES:
+        raise ValueError(f'Dimensión no soportada: {dimension}')
+
+    if origen == 'auto':
+        marca = marca_resumen()
+        dia_marca = _dia(marca) if marca is not None else None
+        if dia_marca is None or desde >= dia_marca:
+            origen = 'sql'
+        elif hasta < dia_marca:
+            origen = 'resumen'
+        else:
+            return _unir(
+                dimension,
+                ventas_por(dimension, desde, dia_marca - timedelta(days=1), canal, 'resumen'),
+                ventas_por(dimension, dia_marca, hasta, canal, 'sql'),
+            )
+
+    params = {'dimension': dimension, 'desde': desde, 'hasta': hasta, 'canal': canal or '', 'origen': origen}
+    key = _cache_key('ventas_por', params)
+    resultado = cache.get(key)
+    if resultado is not None:
+        return resultado
+
+    if origen == 'resumen':
+        campos, qs = _consulta_resumen(dimension, desde, hasta, canal)
+        timeout = CACHE_TIMEOUT_RESUMEN
+    else:
+        campos, qs = _consulta_sql(dimension, desde, hasta, canal)
+        timeout = CACHE_TIMEOUT_SQL
+
+    resultado = [
+        {
+            'clave': fila[campos[0]],
+            'etiqueta': _etiqueta(dimension, fila, campos),
+            'cantidad': fila['total_cantidad'] or 0,
+            'total': (fila['total_monto'] or Decimal('0')).quantize(Decimal('0.01')),
+        }
+        for fila in qs
+    ]
+    cache.set(key, resultado, timeout)
+    return resultado
+
+
+def _unir(dimension, *partes):
+    """Suma por clave los resultados de ventas_por() y los ordena como _orden()."""
+    filas = {}
+    for parte in partes:
+        for fila in parte:
+            registro = filas.setdefault(fila['clave'], {**fila, 'cantidad': 0, 'total': Decimal('0.00')})
+            registro['cantidad'] += fila['cantidad']
+            registro['total'] += fila['total']
+    resultado = list(filas.values())
+    if dimension in ('hora', 'dia_semana'):
+        resultado.sort(key=lambda r: r['clave'])
+    else:
+        resultado.sort(key=lambda r: r['total'], reverse=True)
+    return resultado
+
+
+def _restar_un_anio(fecha):
+    try:
+        return fecha.replace(year=fecha.year - 1)
+    except ValueError:
+        # 29 de febrero
+        return fecha.replace(year=fecha.year - 1, day=28)
+
+
+def comparativo_anual(dimension, desde, hasta, canal=None, origen='auto'):
+    """
+    Compara el rango indicado con el mismo rango del año anterior.
+    Cada fila incluye los totales de ambos períodos y la variación porcentual.
+    """
+    actual = ventas_por(dimension, desde, hasta, canal, origen)
+    anterior = ventas_por(dimension, _restar_un_anio(desde), _restar_un_anio(hasta), canal, origen)
+
+    filas = {}
+    for fila in anterior:
+        filas[fila['clave']] = {
+            'clave': fila['clave'],
+            'etiqueta': fila['etiqueta'],
+            'cantidad': 0,
+            'total': Decimal('0.00'),
+            'cantidad_anterior': fila['cantidad'],
+            'total_anterior': fila['total'],
+        }
+    for fila in actual:
+        registro = filas.setdefault(fila['clave'], {
+            'clave': fila['clave'],
+            'etiqueta': fila['etiqueta'],
+            'cantidad_anterior': 0,
+            'total_anterior': Decimal('0.00'),
+        })
+        registro['etiqueta'] = fila['etiqueta']
+        registro['cantidad'] = fila['cantidad']
+        registro['total'] = fila['total']
+
+    resultado = []
+    for registro in filas.values():
+        if registro['total_anterior']:
+            variacion = (registro['total'] - registro['total_anterior']) / registro['total_anterior'] * 100
+            registro['variacion_pct'] = variacion.quantize(Decimal('0.1'))
+        else:
+            registro['variacion_pct'] = None
+        resultado.append(registro)
+    if dimension in ('hora', 'dia_semana'):
+        resultado.sort(key=lambda r: r['clave'])
+    else:
+        resultado.sort(key=lambda r: r['total'], reverse=True)
+    return resultado
@@ -0,0 +1,11 @@
+"""
+Backends de sesión de Fornería
+
+Variantes de los backends de Django con escrituras coalescidas (ver base.py).
+Se eligen con SESSION_ENGINE en settings:
+- shop.sesiones.db: tabla django_session (por defecto).
+- shop.sesiones.cached_db: caché + tabla; las lecturas no tocan MySQL mientras
+  la sesión esté en caché. Con varios workers requiere un caché compartido.
+- shop.sesiones.signed_cookies: la sesión viaja firmada en la cookie; sin
+  tabla ni caché, pero todo lo guardado queda visible para el navegador.
+"""
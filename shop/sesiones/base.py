@@ -0,0 +1,39 @@
+"""
+Escrituras coalescidas de sesión
+
+SessionBase marca la sesión como modificada en cada asignación, aunque el
+valor sea el mismo, y el middleware la vuelve a escribir completa. Las vistas
+guardan preferencias (`productos_per_page`, `ventas_per_page`) en cada visita:
+sin este mixin cada página listada reescribe la fila de la sesión.
+"""
+
+import copy
+
+
+class EscrituraCoalescidaMixin:
+    """Omite asignaciones sin cambio y el guardado cuando los datos son los ya cargados."""
+
+    _datos_cargados = None
+
+    def load(self):
+        datos = super().load()
+        self._datos_cargados = copy.deepcopy(datos)
+        return datos
+
+    def __setitem__(self, key, value):
+        # Se compara con la copia cargada y no solo con _session: un valor
+        # mutado en sitio y reasignado es el mismo objeto, pero sí cambió
+        sesion = self._session
+        cargados = self._datos_cargados
+        if (cargados is not None and key in cargados and key in sesion
+                and cargados[key] == value and sesion[key] == value):
+            return
+        super().__setitem__(key, value)
+
+    def save(self, must_create=False):
+        if (not must_create and self.session_key is not None
+                and self._datos_cargados is not None
+                and self._get_session() == self._datos_cargados):
+            return
+        super().save(must_create=must_create)
+        self._datos_cargados = copy.deepcopy(self._get_session(no_load=True))
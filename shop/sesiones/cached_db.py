@@ -0,0 +1,9 @@
+"""Sesiones en caché con respaldo en django_session y escrituras coalescidas"""
+
+from django.contrib.sessions.backends.cached_db import SessionStore as _SessionStore
+
+from .base import EscrituraCoalescidaMixin
+
+
+class SessionStore(EscrituraCoalescidaMixin, _SessionStore):
+    pass
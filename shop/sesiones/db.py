@@ -0,0 +1,9 @@
+"""Sesiones en la tabla django_session con escrituras coalescidas"""
+
+from django.contrib.sessions.backends.db import SessionStore as _SessionStore
+
+from .base import EscrituraCoalescidaMixin
+
+
+class SessionStore(EscrituraCoalescidaMixin, _SessionStore):
+    pass
@@ -0,0 +1,9 @@
+"""Sesiones firmadas en la cookie con escrituras coalescidas"""
+
+from django.contrib.sessions.backends.signed_cookies import SessionStore as _SessionStore
+
+from .base import EscrituraCoalescidaMixin
+
+
+class SessionStore(EscrituraCoalescidaMixin, _SessionStore):
+    pass
@@ -0,0 +1,41 @@
+// Service worker de la caja: mantiene la página y el catálogo disponibles sin conexión.
+// Las ventas no pasan por aquí; la página las encola y las sincroniza por lotes.
+const CACHE = 'forneria-caja-v1';
+const PAGINA = '{% url "forneria:caja_pos" %}';
+const CATALOGO = '{% url "forneria:api_caja_catalogo" %}';
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(caches.open(CACHE).then((cache) => cache.addAll([PAGINA, CATALOGO])));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(keys.filter((key) => key !== CACHE).map((key) => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    const propio = url.origin === self.location.origin && (url.pathname === PAGINA || url.pathname === CATALOGO);
+    const cdn = url.origin !== self.location.origin && request.destination in { script: 1, style: 1 };
+    if (!propio && !cdn) return;
+
+    // Red primero; si falla, la última copia guardada
+    event.respondWith(
+        fetch(request)
+            .then((response) => {
+                if (response.ok || response.type === 'opaque') {
+                    const copia = response.clone();
+                    caches.open(CACHE).then((cache) => cache.put(request, copia));
+                }
+                return response;
+            })
+            .catch(() => caches.match(request))
+    );
+});
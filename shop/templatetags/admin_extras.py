@@ -0,0 +1,110 @@
+"""
+Etiquetas para el admin de Fornería
+
+`jerarquia_fechas` reemplaza a `date_hierarchy` en los listados de shop. La
+etiqueta de Django arma los años, meses y días con SELECT DISTINCT sobre la
+columna, que recorre todo el índice en tablas grandes (Detalle_Venta). Aquí
+los periodos se generan desde el MIN/MAX del listado filtrado, dos lecturas
+de un extremo del índice. A cambio pueden aparecer periodos sin registros.
+"""
+
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.db.models import Max, Min
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+def _rango(cl):
+    """(primera, última) fecha local del listado filtrado, o (None, None) si está vacío."""
+    rango = cl.queryset.aggregate(primero=Min(cl.date_hierarchy), ultimo=Max(cl.date_hierarchy))
+    extremos = [rango['primero'], rango['ultimo']]
+    if extremos[0] is None:
+        return None, None
+    for i, valor in enumerate(extremos):
+        if isinstance(valor, datetime.datetime):
+            extremos[i] = (timezone.localtime(valor) if timezone.is_aware(valor) else valor).date()
+    return tuple(extremos)
+
+
+def jerarquia_fechas(cl):
+    if not cl.date_hierarchy:
+        return None
+    field_name = cl.date_hierarchy
+    year_field = '%s__year' % field_name
+    month_field = '%s__month' % field_name
+    day_field = '%s__day' % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, ['%s__' % field_name])
+
+    primero = ultimo = None
+    if not (year_lookup or month_lookup or day_lookup):
+        primero, ultimo = _rango(cl)
+        if primero and primero.year == ultimo.year:
+            year_lookup = primero.year
+            if primero.month == ultimo.month:
+                month_lookup = primero.month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+        }
+
+    if primero is None:
+        primero, ultimo = _rango(cl)
+
+    if year_lookup and month_lookup:
+        dias = [primero + datetime.timedelta(days=n) for n in range((ultimo - primero).days + 1)] if primero else []
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: dia.day}),
+                    'title': capfirst(formats.date_format(dia, 'MONTH_DAY_FORMAT')),
+                }
+                for dia in dias
+            ],
+        }
+    if year_lookup:
+        meses = [datetime.date(int(year_lookup), mes, 1)
+                 for mes in range(primero.month, ultimo.month + 1)] if primero else []
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: mes.month}),
+                    'title': capfirst(formats.date_format(mes, 'YEAR_MONTH_FORMAT')),
+                }
+                for mes in meses
+            ],
+        }
+    anios = range(primero.year, ultimo.year + 1) if primero else []
+    return {
+        'show': True,
+        'back': None,
+        'choices': [{'link': link({year_field: str(anio)}), 'title': str(anio)} for anio in anios],
+    }
+
+
+@register.tag(name='jerarquia_fechas')
+def jerarquia_fechas_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token, func=jerarquia_fechas, template_name='date_hierarchy.html', takes_context=False,
+    )
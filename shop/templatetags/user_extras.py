@@ -3,8 +3,15 @@ from django import template
 register = template.Library()
 
 
+def grupos_usuario(user):
+    """Nombres de grupo del usuario, consultados una sola vez por instancia (por petición)."""
+    if not hasattr(user, '_grupos_nombres'):
+        user._grupos_nombres = frozenset(user.groups.values_list('name', flat=True))
+    return user._grupos_nombres
+
+
 @register.filter
 def has_group(user, group_name):
     if not getattr(user, "is_authenticated", False):
         return False
-    return user.groups.filter(name=group_name).exists()
+    return group_name in grupos_usuario(user)
@@ -1,12 +1,892 @@
-from django.test import TestCase
+"""
+Pruebas de regresión de rendimiento
 
-# Create your tests here.
+Cada ruta de shop/urls.py y los listados principales del admin se piden con
+cada rol de seed_data (Administrador, Editor, Lector) sobre un conjunto de
+datos mediano. Se verifica un máximo de consultas SQL y de tamaño de
+respuesta por ruta: los presupuestos no dependen del volumen de datos, así
+que un bucle que consulte por fila (o una plantilla que siga una FK sin
+select_related) los supera y falla aquí en vez de llegar a producción.
 
+Con `manage.py test` el detector de N+1 (shop/nmas1.py) corre en modo
+'error': cualquier consulta repetida por relación también hace fallar la
+prueba, con la relación y la línea de la plantilla en el mensaje.
 
+Si un cambio necesita más consultas a propósito, se sube el presupuesto de
+esa ruta en el mismo commit.
+"""
 
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
+from .cache import CacheDosNiveles, invalidar, limpiar_local
+from .caja import sincronizar_ventas
+from .clientes import fusionar_grupos, grupos_duplicados, ids_exactos
+from .facetas import reconstruir_facetas
+from .folios import _reiniciar_bloques, reservar_bloque, siguiente_folio
+from .inventario import verificar_stock
+from .models import (
+    Alertas, Categorias, Clientes, Detalle_Venta, Lotes, Movimientos_Inventario, Nutricional, Productos,
+    Resumen_Ventas, Ventas,
+)
+from .nutricional import obtener_o_crear_perfil
+from .reportes import actualizar_resumenes, ventas_por
+from .ventas import recalcular_cabeceras
 
 
+PRODUCTOS = 200
+CLIENTES = 120
+VENTAS = 400
+MAX_DETALLES_POR_VENTA = 4
 
+# Ruta -> (máximo de consultas, máximo de KB). El máximo es sobre los tres
+# roles con el caché vacío; las rutas que un rol no puede ver redirigen y
+# quedan muy por debajo.
+PRESUPUESTOS = {
+    'forneria:dashboard_admin': (12, 16),
+    'forneria:dashboard_vendedor': (9, 8),
+    'forneria:session_info': (7, 12),
+    'forneria:password_change': (7, 8),
+    'forneria:password_change_done': (7, 8),
+    'forneria:password_reset': (7, 8),
+    'forneria:password_reset_done': (7, 8),
+    'forneria:password_reset_confirm': (8, 8),
+    'forneria:password_reset_complete': (7, 8),
+    'forneria:perfil': (8, 12),
+    'forneria:clear_session': (4, 8),
+    'forneria:productos_list': (11, 72),
+    'forneria:productos_list:xlsx': (7, 24),
+    'forneria:productos_create': (8, 16),
+    'forneria:productos_detail': (9, 20),
+    'forneria:productos_edit': (9, 20),
+    'forneria:productos_delete': (7, 8),
+    'forneria:ventas_list': (9, 60),
+    'forneria:ventas_list:xlsx': (7, 36),
+    'forneria:ventas_create': (12, 112),
+    'forneria:ventas_detail': (9, 16),
+    'forneria:ventas_edit': (15, 128),
+    'forneria:ventas_delete': (7, 8),
+    'forneria:reportes_ventas': (9, 68),
+    'forneria:caja_pos': (7, 28),
+    'forneria:caja_service_worker': (7, 8),
+    'forneria:api_caja_catalogo': (8, 40),
+    'forneria:api_caja_sincronizar': (6, 8),
+    'forneria:api_productos': (7, 48),
+    'forneria:api_productos_autocompletar': (6, 8),
+    'forneria:api_dashboard_contadores': (11, 8),
+    'forneria:api_stock_historico': (8, 12),
+    'forneria:info': (2, 8),
+    # Crece con las vistas que ya atendió el proceso (una serie por vista), no con los datos
+    'forneria:metricas': (6, 256),
+    'forneria:perfil_descarga': (6, 8),
+    'forneria:salud': (0, 1),
+    'forneria:login': (7, 8),
+    'forneria:logout': (6, 8),
+}
 
+PRESUPUESTOS_ADMIN = {
+    'admin:index': (6, 20),
+    'admin:shop_productos_changelist': (10, 52),
+    'admin:shop_ventas_changelist': (8, 48),
+    'admin:shop_detalle_venta_changelist': (8, 40),
+    'admin:shop_clientes_changelist': (8, 36),
+    'admin:shop_movimientos_inventario_changelist': (8, 40),
+    'admin:shop_lotes_changelist': (8, 44),
+    'admin:shop_alertas_changelist': (8, 32),
+    'admin:shop_nutricional_changelist': (8, 28),
+    'admin:shop_ventas_change': (12, 56),
+    'admin:shop_productos_change': (10, 40),
+}
+
+# El stream SSE no termina: el cliente de pruebas no puede consumir su cuerpo
+RUTAS_SIN_MEDIR = {'forneria:api_dashboard_eventos'}
+
+# Respuestas del Administrador que no son 200 por diseño (GET sobre acciones)
+ESTADOS_ADMINISTRADOR = {
+    'forneria:logout': 302,
+    'forneria:clear_session': 302,
+    'forneria:productos_delete': 302,
+    'forneria:ventas_delete': 302,
+    'forneria:api_caja_sincronizar': 405,
+    'forneria:perfil_descarga': 404,
+}
+
+
+def _poblar(categorias):
+    """Conjunto mediano con bulk_create; luego se rehacen los datos que mantienen las señales."""
+    rnd = random.Random(42)
+    hoy = timezone.localdate()
+    perfil = obtener_o_crear_perfil(calorias=Decimal('250'), proteinas=Decimal('8'))
+
+    productos = Productos.objects.bulk_create([
+        Productos(
+            nombre=f'Producto {i}',
+            precio=Decimal(rnd.randint(5, 80) * 100),
+            caducidad=hoy + timedelta(days=rnd.randint(-5, 60)),
+            tipo=rnd.choice(['propia', 'envasado']),
+            Categorias_id=rnd.choice(categorias),
+            stock_actual=rnd.randint(0, 120),
+            Nutricional_id=perfil,
+        )
+        for i in range(PRODUCTOS)
+    ])
+    clientes = Clientes.objects.bulk_create([
+        Clientes(
+            nombre=f'Cliente {i}',
+            rut=f'{20000000 + i}-{i % 10}',
+            rut_normalizado=f'{20000000 + i}-{i % 10}',
+            correo=f'cliente{i}@correo.cl',
+            correo_normalizado=f'cliente{i}@correo.cl',
+        )
+        for i in range(CLIENTES)
+    ])
+    ventas = Ventas.objects.bulk_create([
+        Ventas(
+            fecha=timezone.now() - timedelta(hours=rnd.randint(0, 24 * 90)),
+            cliente_id=rnd.choice(clientes),
+            total_sin_iva=0, total_iva=0, total_con_iva=0,
+            canal_venta=rnd.choice(['Local', 'UberEats', 'Instagram', 'WhatsApp']),
+            folio=f'PERF-{i:05d}',
+        )
+        for i in range(VENTAS)
+    ])
+    detalles = []
+    for indice, venta in enumerate(ventas):
+        # La primera venta (la que se abre en las pruebas) lleva el máximo de líneas
+        lineas = MAX_DETALLES_POR_VENTA if indice == 0 else rnd.randint(1, MAX_DETALLES_POR_VENTA)
+        for producto in rnd.sample(productos, lineas):
+            detalles.append(Detalle_Venta(
+                venta_id=venta, producto_id=producto,
+                cantidad=rnd.randint(1, 5), precio_unitario=producto.precio,
+            ))
+    Detalle_Venta.objects.bulk_create(detalles, batch_size=500)
+
+    movimientos = Movimientos_Inventario.objects.bulk_create([
+        Movimientos_Inventario(producto_id=producto, tipo_movimiento='entrada', cantidad=producto.stock_actual)
+        for producto in productos
+    ])
+    Lotes.objects.bulk_create([
+        Lotes(
+            producto_id=movimiento.producto_id, movimiento_id=movimiento,
+            codigo=f'L-{movimiento.pk}', caducidad=movimiento.producto_id.caducidad,
+            cantidad_inicial=movimiento.cantidad, cantidad_disponible=movimiento.cantidad,
+        )
+        for movimiento in movimientos
+    ])
+    Alertas.objects.bulk_create([
+        Alertas(producto_id=producto, tipo_alerta='Stock bajo', mensaje=f'{producto.nombre} con poco stock')
+        for producto in productos if producto.stock_actual < 5
+    ])
+
+    reconstruir_facetas()
+    recalcular_cabeceras([venta.pk for venta in ventas], conservar_cliente=False)
+    return productos[0], ventas[0]
+
+
+class PresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', stdout=StringIO())
+        producto, venta = _poblar(list(Categorias.objects.all()))
+        cls.producto_id, cls.venta_id = producto.pk, venta.pk
+
+        administrador = User.objects.create_user('admin_perf', password='x', is_staff=True)
+        administrador.groups.set([Group.objects.get(name='Administrador')])
+        cls.roles = {
+            'Administrador': administrador,
+            'Editor': User.objects.get(username='editor_maria'),
+            'Lector': User.objects.get(username='lector_pedro'),
+        }
+        cls.superusuario = User.objects.create_superuser('super_perf', 'super@forneria.cl', 'x')
+
+    def setUp(self):
+        cache.clear()
+        limpiar_local()
+
+    def _rutas(self):
+        """(clave de presupuesto, URL) de cada ruta de shop/urls.py."""
+        argumentos = {
+            'productos_detail': [self.producto_id],
+            'productos_edit': [self.producto_id],
+            'productos_delete': [self.producto_id],
+            'ventas_detail': [self.venta_id],
+            'ventas_edit': [self.venta_id],
+            'ventas_delete': [self.venta_id],
+            'password_reset_confirm': ['MQ', 'token-invalido'],
+            'perfil_descarga': ['20260101-000000-00000000'],
+        }
+        from .urls import urlpatterns
+
+        rutas = []
+        for patron in urlpatterns:
+            clave = f'forneria:{patron.name}'
+            if clave in RUTAS_SIN_MEDIR:
+                continue
+            url = reverse(clave, args=argumentos.get(patron.name, []))
+            rutas.append((clave, url))
+            if patron.name in ('productos_list', 'ventas_list'):
+                rutas.append((f'{clave}:xlsx', f'{url}?export=xlsx'))
+        return rutas
+
+    def _medir(self, usuario, clave, url, presupuestos):
+        self.client.force_login(usuario)
+        cache.clear()
+        limpiar_local()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        max_consultas, max_kb = presupuestos[clave]
+        etiqueta = f"{clave} ({usuario.username}) -> {response.status_code}"
+        self.assertLess(response.status_code, 500, etiqueta)
+        self.assertLessEqual(
+            len(consultas), max_consultas,
+            f"{etiqueta}: {len(consultas)} consultas (máximo {max_consultas})\n"
+            + '\n'.join(q['sql'][:160] for q in consultas.captured_queries),
+        )
+        tamano = len(response.content) if not response.streaming else 0
+        self.assertLessEqual(tamano, max_kb * 1024, f"{etiqueta}: {tamano} bytes (máximo {max_kb} KB)")
+        return response
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        from .urls import urlpatterns
+
+        nombres = {f'forneria:{patron.name}' for patron in urlpatterns}
+        self.assertEqual(nombres - set(PRESUPUESTOS) - RUTAS_SIN_MEDIR, set())
+
+    def test_rutas_por_rol(self):
+        for rol, usuario in self.roles.items():
+            for clave, url in self._rutas():
+                with self.subTest(rol=rol, ruta=clave):
+                    self._medir(usuario, clave, url, PRESUPUESTOS)
+
+    def test_rutas_administrador_responden(self):
+        """El presupuesto solo protege si la página se genera: el Administrador debe ver las vistas."""
+        for clave, url in self._rutas():
+            with self.subTest(ruta=clave):
+                response = self._medir(self.roles['Administrador'], clave, url, PRESUPUESTOS)
+                self.assertEqual(response.status_code, ESTADOS_ADMINISTRADOR.get(clave, 200), clave)
+
+    def test_listados_admin(self):
+        argumentos = {
+            'admin:shop_ventas_change': [self.venta_id],
+            'admin:shop_productos_change': [self.producto_id],
+        }
+        for clave in PRESUPUESTOS_ADMIN:
+            with self.subTest(ruta=clave):
+                url = reverse(clave, args=argumentos.get(clave, []))
+                response = self._medir(self.superusuario, clave, url, PRESUPUESTOS_ADMIN)
+                self.assertEqual(response.status_code, 200, clave)
+
+
+class EventosDashboardTests(TestCase):
+    """Bajo WSGI (el cliente de pruebas) los eventos no deben retener el worker."""
+
+    def setUp(self):
+        administrador = User.objects.create_superuser('admin_eventos', 'eventos@forneria.cl', 'x')
+        self.client.force_login(administrador)
+        self.url = reverse('forneria:api_dashboard_eventos')
+
+    def test_sse_responde_204(self):
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    def test_poll_no_espera(self):
+        from .eventos import obtener_bus
+
+        ultimo = obtener_bus().ultimo_id()
+        inicio = time.monotonic()
+        response = self.client.get(self.url, {'modo': 'poll', 'desde': ultimo, 'espera': '20'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['eventos'], [])
+        self.assertLess(time.monotonic() - inicio, 1)
+
+    def test_dashboard_consulta_contadores(self):
+        response = self.client.get(reverse('forneria:dashboard_admin'))
+        self.assertFalse(response.context['eventos_en_vivo'])
+        self.assertContains(response, reverse('forneria:api_dashboard_contadores'))
+
+
+class SesionCoalescidaTests(TestCase):
+    def _recargar(self, clave):
+        from .sesiones.db import SessionStore
+
+        return SessionStore(session_key=clave)
+
+    def test_mutar_y_reasignar_se_guarda(self):
+        sesion = self._recargar(None)
+        sesion['carrito'] = [1]
+        sesion.save()
+
+        sesion = self._recargar(sesion.session_key)
+        carrito = sesion['carrito']
+        carrito.append(2)
+        sesion['carrito'] = carrito
+        self.assertTrue(sesion.modified)
+        sesion.save()
+        self.assertEqual(self._recargar(sesion.session_key)['carrito'], [1, 2])
+
+    def test_misma_asignacion_no_marca_modificada(self):
+        sesion = self._recargar(None)
+        sesion['productos_per_page'] = 25
+        sesion.save()
+
+        sesion = self._recargar(sesion.session_key)
+        sesion['productos_per_page'] = 25
+        self.assertFalse(sesion.modified)
+
+
+class MetricasArchivosTests(TestCase):
+    def test_sin_peticiones_no_inicia_escritor(self):
+        from .metricas import Registro
+
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        registro = Registro()
+        with self.settings(METRICAS_DIR=directorio):
+            registro.incrementar('forneria_ventas_total', canal='Local')
+        self.assertIsNone(registro._escritor)
+
+    def test_poda_archivos_de_procesos_terminados(self):
+        from .metricas import _podar
+
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        terminado = subprocess.Popen([sys.executable, '-c', 'pass'])
+        terminado.wait()
+        for pid in (os.getpid(), terminado.pid):
+            with open(os.path.join(directorio, f'{pid}.json'), 'w') as archivo:
+                archivo.write('{}')
+        _podar(directorio)
+        self.assertEqual(os.listdir(directorio), [f'{os.getpid()}.json'])
+
+
+class DatosVentaMixin:
+    """Un producto, un cliente y un superusuario para las pruebas de comportamiento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categorias.objects.create(nombre='Panadería')
+        cls.producto = Productos.objects.create(
+            nombre='Marraqueta', precio=Decimal('1000'), caducidad=timezone.localdate() + timedelta(days=5),
+            tipo='propia', Categorias_id=categoria, stock_actual=10,
+            Nutricional_id=obtener_o_crear_perfil(calorias=Decimal('250')),
+        )
+        cls.cliente = Clientes.objects.create(nombre='Ana', rut='11111111-1', correo='ana@correo.cl')
+        cls.superusuario = User.objects.create_superuser('super_ventas', 'ventas@forneria.cl', 'x')
+
+    def _venta(self, cantidades=(2,), **campos):
+        venta = Ventas.objects.create(
+            cliente_id=self.cliente, total_sin_iva=0, total_iva=0, total_con_iva=0, **campos,
+        )
+        for cantidad in cantidades:
+            Detalle_Venta.objects.create(
+                venta_id=venta, producto_id=self.producto, cantidad=cantidad, precio_unitario=self.producto.precio,
+            )
+        recalcular_cabeceras([venta.pk])
+        return venta
+
+    def _post_venta(self, url, lineas, **campos):
+        """POST del formulario de venta con su formset; `lineas` son dicts de campos de Detalle_Venta."""
+        datos = {
+            'cliente_id': self.cliente.pk, 'fecha': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            'canal_venta': 'Local', 'folio': '', 'descuento': '', 'monto_pagado': '',
+            'detalles-TOTAL_FORMS': len(lineas), 'detalles-INITIAL_FORMS': sum('id' in linea for linea in lineas),
+            'detalles-MIN_NUM_FORMS': 1, 'detalles-MAX_NUM_FORMS': 1000, **campos,
+        }
+        for i, linea in enumerate(lineas):
+            linea = {'producto_id': self.producto.pk, 'precio_unitario': '', 'descuento_pct': '0', **linea}
+            datos.update({f'detalles-{i}-{campo}': valor for campo, valor in linea.items()})
+        self.client.force_login(self.superusuario)
+        return self.client.post(url, datos)
+
+
+class DetalleVentaAdminTests(DatosVentaMixin, TestCase):
+    def test_editar_y_borrar_detalle_recalcula_cabecera(self):
+        venta = self._venta((2, 3))
+        detalle = venta.detalles.order_by('id').first()
+        self.client.force_login(self.superusuario)
+        self.client.post(reverse('admin:shop_detalle_venta_change', args=[detalle.pk]), {
+            'venta_id': venta.pk, 'producto_id': self.producto.pk,
+            'cantidad': 7, 'precio_unitario': '1000', 'descuento_pct': '0',
+        })
+        venta.refresh_from_db()
+        self.assertEqual((venta.items_count, venta.items_qty), (2, 10))
+
+        self.client.post(reverse('admin:shop_detalle_venta_delete', args=[detalle.pk]), {'post': 'yes'})
+        venta.refresh_from_db()
+        self.assertEqual((venta.items_count, venta.items_qty), (1, 3))
+
+
+class SincronizarVentasTests(DatosVentaMixin, TestCase):
+    def _lote(self, clave, cantidad=2, **campos):
+        return [{
+            'clave': clave, 'cliente_id': self.cliente.pk,
+            'detalles': [{'producto_id': self.producto.pk, 'cantidad': cantidad}], **campos,
+        }]
+
+    def test_reenvio_es_idempotente_y_descuenta_stock(self):
+        resultados, _ = sincronizar_ventas(self._lote('caja-1'))
+        self.assertEqual(resultados[0]['estado'], 'creada')
+        reenvio, _ = sincronizar_ventas(self._lote('caja-1'))
+        self.assertEqual(reenvio[0]['estado'], 'duplicada')
+        self.assertEqual(reenvio[0]['id'], resultados[0]['id'])
+        self.assertEqual(Ventas.objects.filter(clave_idempotencia='caja-1').count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 8)
+        self.assertEqual(
+            list(Movimientos_Inventario.objects.values_list('tipo_movimiento', 'cantidad', 'origen')),
+            [('salida', 2, 'venta')],
+        )
+
+    def test_conflicto_de_stock_entre_lotes(self):
+        sincronizar_ventas(self._lote('caja-1', cantidad=7))
+        resultados, _ = sincronizar_ventas(self._lote('caja-2', cantidad=7))
+        self.assertEqual(resultados[0]['estado'], 'conflicto')
+        self.assertEqual(resultados[0]['conflictos'][0]['disponible'], 3)
+
+        forzada, _ = sincronizar_ventas(self._lote('caja-2', cantidad=7, forzar=True))
+        self.assertEqual(forzada[0]['estado'], 'creada')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 0)
+
+    def test_duplicado_en_curso_se_informa_como_duplicado(self):
+        """La misma clave confirmada por otra petición después de la primera lectura."""
+        from . import caja
+
+        original = caja.siguiente_folio
+
+        def folio_y_venta_concurrente():
+            if not Ventas.objects.filter(clave_idempotencia='caja-1').exists():
+                self._venta(clave_idempotencia='caja-1', folio='OTRA-00001')
+            return original()
+
+        with mock.patch.object(caja, 'siguiente_folio', folio_y_venta_concurrente):
+            resultados, _ = sincronizar_ventas(self._lote('caja-1'))
+        self.assertEqual(resultados[0]['estado'], 'duplicada')
+        self.assertEqual(resultados[0]['folio'], 'OTRA-00001')
+
+    def test_valida_cantidad_y_precio(self):
+        lote = self._lote('caja-1', cantidad=True) + self._lote('caja-2')
+        lote[1]['detalles'][0]['precio_unitario'] = '99999999'
+        resultados, _ = sincronizar_ventas(lote)
+        self.assertEqual([r['estado'] for r in resultados], ['invalida', 'invalida'])
+
+    def test_ids_no_escalares_son_invalidos(self):
+        lote = self._lote('caja-1', cliente_id=[self.cliente.pk]) + self._lote('caja-2', canal_venta=['Local'])
+        lote += self._lote('caja-3', detalles=[{'producto_id': {'id': self.producto.pk}, 'cantidad': 1}])
+        lote += self._lote('caja-4', detalles={'producto_id': self.producto.pk})
+        resultados, _ = sincronizar_ventas(lote)
+        self.assertEqual([r['estado'] for r in resultados], ['invalida'] * 4)
+
+
+class DeduplicarClientesTests(TestCase):
+    def test_no_agrupa_rut_distintos_por_correo(self):
+        ana = Clientes.objects.create(nombre='Ana', rut='11.111.111-1', correo='familia@correo.cl')
+        luis = Clientes.objects.create(nombre='Luis', rut='22222222-2', correo='Familia@correo.cl ')
+        sin_rut = Clientes.objects.create(nombre='Ana P.', correo='familia@correo.cl')
+        mismo_rut = Clientes.objects.create(nombre='Ana Pérez', rut='111111111')
+
+        grupos, revisar = grupos_duplicados()
+        self.assertEqual(grupos, {ana.pk: [mismo_rut.pk]})
+        self.assertEqual(revisar, [('familia@correo.cl', [ana.pk, luis.pk, sin_rut.pk])])
+
+    def test_correo_sin_conflicto_agrupa(self):
+        ana = Clientes.objects.create(nombre='Ana', rut='11111111-1', correo='ana@correo.cl')
+        pedido = Clientes.objects.create(nombre='Ana IG', correo='ANA@correo.cl')
+        grupos, revisar = grupos_duplicados()
+        self.assertEqual((grupos, revisar), ({ana.pk: [pedido.pk]}, []))
+
+        self.assertEqual(fusionar_grupos(grupos)[0], 1)
+        self.assertFalse(Clientes.objects.filter(pk=pedido.pk).exists())
+
+    def test_fusionar_omite_grupos_con_rut_distintos(self):
+        ana = Clientes.objects.create(nombre='Ana', rut='11111111-1')
+        luis = Clientes.objects.create(nombre='Luis', rut='22222222-2')
+        self.assertEqual(fusionar_grupos({ana.pk: [luis.pk]}), (0, 0))
+        self.assertTrue(Clientes.objects.filter(pk=luis.pk).exists())
+
+    def test_busqueda_por_numero_sin_cliente_usa_coincidencia_parcial(self):
+        Clientes.objects.create(nombre='Ana', rut='11111111-1')
+        self.assertIsNotNone(ids_exactos('11.111.111-1'))
+        self.assertIsNone(ids_exactos('1234567-8'))
+
+
+class PerfilNutricionalTests(DatosVentaMixin, TestCase):
+    def _editar_producto(self, producto, **valores):
+        datos = {
+            'nombre': producto.nombre, 'precio': producto.precio, 'caducidad': producto.caducidad,
+            'tipo': producto.tipo, 'Categorias_id': producto.Categorias_id_id,
+            'stock_actual': producto.stock_actual, 'stock_minimo': 5, 'stock_maximo': 100, **valores,
+        }
+        self.client.force_login(self.superusuario)
+        response = self.client.post(reverse('admin:shop_productos_change', args=[producto.pk]), datos)
+        self.assertEqual(response.status_code, 302)
+        producto.refresh_from_db()
+
+    def test_editar_valores_no_modifica_el_perfil_compartido(self):
+        compartido = self.producto.Nutricional_id
+        otro = Productos.objects.create(
+            nombre='Hallulla', precio=Decimal('900'), caducidad=self.producto.caducidad, tipo='propia',
+            Categorias_id=self.producto.Categorias_id, Nutricional_id=compartido,
+        )
+        self._editar_producto(self.producto, calorias='300')
+
+        self.assertNotEqual(self.producto.Nutricional_id_id, compartido.pk)
+        self.assertEqual(self.producto.Nutricional_id.calorias, Decimal('300'))
+        compartido.refresh_from_db()
+        self.assertEqual(compartido.calorias, Decimal('250'))
+        otro.refresh_from_db()
+        self.assertEqual(otro.Nutricional_id_id, compartido.pk)
+
+        # Volver a los valores originales reutiliza el perfil compartido
+        self._editar_producto(self.producto, calorias='250')
+        self.assertEqual(self.producto.Nutricional_id_id, compartido.pk)
+
+    def test_creacion_concurrente_relee_el_perfil(self):
+        existente = obtener_o_crear_perfil(calorias=Decimal('120'))
+        with mock.patch.object(Nutricional.objects, 'filter') as filtrar:
+            filtrar.return_value.first.return_value = None
+            self.assertEqual(obtener_o_crear_perfil(calorias=Decimal('120')).pk, existente.pk)
+
+    def test_admin_no_crea_un_perfil_repetido(self):
+        datos = {campo: '' for campo in ('proteinas', 'grasas', 'carbohidratos', 'azucares', 'sodio')}
+        self.client.force_login(self.superusuario)
+        response = self.client.post(reverse('admin:shop_nutricional_add'), {**datos, 'calorias': '250'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ya existe el perfil nutricional', response.content.decode())
+        self.assertEqual(Nutricional.objects.count(), 1)
+
+        response = self.client.post(reverse('admin:shop_nutricional_add'), {**datos, 'calorias': '260'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Nutricional.objects.count(), 2)
+
+
+class LotesVentaTests(DatosVentaMixin, TestCase):
+    def setUp(self):
+        self.lote = Lotes.objects.create(
+            producto_id=self.producto, codigo='L-1', caducidad=self.producto.caducidad,
+            cantidad_inicial=10, cantidad_disponible=10,
+        )
+
+    def _disponible(self):
+        self.lote.refresh_from_db()
+        return self.lote.cantidad_disponible
+
+    def test_editar_y_eliminar_devuelven_unidades(self):
+        self._post_venta(reverse('forneria:ventas_create'), [{'cantidad': 3}])
+        venta = Ventas.objects.get()
+        self.assertEqual(self._disponible(), 7)
+
+        detalle = venta.detalles.get()
+        self._post_venta(reverse('forneria:ventas_edit', args=[venta.pk]), [{'id': detalle.pk, 'cantidad': 1}])
+        self.assertEqual(self._disponible(), 9)
+
+        self.client.post(reverse('forneria:ventas_delete', args=[venta.pk]))
+        self.assertFalse(Ventas.objects.exists())
+        self.assertEqual(self._disponible(), 10)
+
+    def test_admin_mueve_lotes_y_stock(self):
+        self.client.force_login(self.superusuario)
+        ahora = timezone.localtime()
+        response = self.client.post(reverse('admin:shop_ventas_add'), {
+            'folio': 'ADM-00001', 'fecha_0': ahora.strftime('%Y-%m-%d'), 'fecha_1': ahora.strftime('%H:%M:%S'),
+            'cliente_id': self.cliente.pk, 'canal_venta': 'Local', 'total_sin_iva': '0', 'total_iva': '0',
+            'descuento': '0', 'total_con_iva': '0',
+            'detalles-TOTAL_FORMS': 1, 'detalles-INITIAL_FORMS': 0, 'detalles-MIN_NUM_FORMS': 1,
+            'detalles-MAX_NUM_FORMS': 1000, 'detalles-0-producto_id': self.producto.pk,
+            'detalles-0-cantidad': 4, 'detalles-0-precio_unitario': '1000', 'detalles-0-descuento_pct': '0',
+        })
+        self.assertEqual(response.status_code, 302)
+        detalle = Detalle_Venta.objects.get()
+        self.assertEqual(self._disponible(), 6)
+
+        self.client.post(reverse('admin:shop_detalle_venta_change', args=[detalle.pk]), {
+            'venta_id': detalle.venta_id_id, 'producto_id': self.producto.pk,
+            'cantidad': 1, 'precio_unitario': '1000', 'descuento_pct': '0',
+        })
+        self.assertEqual(self._disponible(), 9)
+
+        self.client.post(reverse('admin:shop_detalle_venta_delete', args=[detalle.pk]), {'post': 'yes'})
+        self.assertEqual(self._disponible(), 10)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 10)
+
+    def test_lotes_dados_de_baja_no_se_consumen(self):
+        Lotes.objects.filter(pk=self.lote.pk).update(deleted_at=timezone.now())
+        self.assertFalse(Lotes.objects.disponibles().exists())
+        self._post_venta(reverse('forneria:ventas_create'), [{'cantidad': 3}])
+        self.assertTrue(Ventas.objects.exists())
+        self.assertEqual(self._disponible(), 10)
+
+
+class ResumenVentasTests(DatosVentaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoy = timezone.localdate()
+        self.ayer = self.hoy - timedelta(days=1)
+
+    def _cantidades(self):
+        return dict(
+            Resumen_Ventas.objects.values_list('fecha').annotate(total=Sum('cantidad')).order_by()
+        )
+
+    def test_venta_movida_o_eliminada_recalcula_su_dia(self):
+        venta = self._venta((2,), fecha=timezone.now() - timedelta(days=1))
+        actualizar_resumenes()
+        self.assertEqual(self._cantidades(), {self.ayer: 2})
+
+        venta.fecha = timezone.now()
+        venta.save()
+        actualizar_resumenes()
+        self.assertEqual(self._cantidades(), {self.hoy: 2})
+
+        venta.delete()
+        actualizar_resumenes()
+        self.assertEqual(self._cantidades(), {})
+
+    def test_formset_toca_la_venta_una_vez(self):
+        venta = self._venta((1, 1, 1))
+        detalles = list(venta.detalles.all())
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for detalle in detalles:
+                    detalle.cantidad = 2
+                    detalle.save()
+                venta.fecha = venta.fecha - timedelta(days=1)
+                venta.save()
+        actualizaciones = [q['sql'] for q in consultas if q['sql'].startswith('UPDATE "Ventas"')]
+        self.assertEqual(len(actualizaciones), 2)
+        self.assertFalse([q['sql'] for q in consultas if q['sql'].startswith('SELECT') and 'FROM "Ventas"' in q['sql']])
+
+    def test_editar_detalle_toca_la_venta(self):
+        venta = self._venta((2,), fecha=timezone.now() - timedelta(days=1))
+        actualizar_resumenes()
+        detalle = venta.detalles.get()
+        detalle.cantidad = 5
+        detalle.save()
+        actualizar_resumenes()
+        self.assertEqual(self._cantidades(), {self.ayer: 5})
+
+    def test_auto_suma_lo_vendido_despues_de_la_marca(self):
+        self._venta((2,), fecha=timezone.now() - timedelta(days=1))
+        actualizar_resumenes()
+        self._venta((3,))
+        self.assertEqual(ventas_por('producto', self.ayer, self.hoy, origen='resumen')[0]['cantidad'], 2)
+        self.assertEqual(ventas_por('producto', self.ayer, self.hoy)[0]['cantidad'], 5)
+
+
+@override_settings(FOLIO_TAMANO_BLOQUE=3)
+class FoliosTests(TestCase):
+    def setUp(self):
+        _reiniciar_bloques()
+        self.addCleanup(_reiniciar_bloques)
+
+    def test_bloques_consecutivos_no_se_solapan(self):
+        self.assertEqual(reservar_bloque('PRUEBA', 3), (1, 3))
+        self.assertEqual(reservar_bloque('PRUEBA', 5), (4, 8))
+
+    def test_folios_unicos_entre_bloques_procesos_y_transacciones(self):
+        folios = []
+        # TestCase corre dentro de una transacción: se simula el camino por bloques en memoria
+        with mock.patch('shop.folios.connection') as conexion:
+            conexion.in_atomic_block = False
+            folios += [siguiente_folio('PRUEBA') for _ in range(4)]
+            # Otro proceso (fork) con los bloques vacíos
+            _reiniciar_bloques()
+            folios += [siguiente_folio('PRUEBA') for _ in range(2)]
+        # Dentro de una transacción se reserva un número suelto
+        folios += [siguiente_folio('PRUEBA') for _ in range(2)]
+        with mock.patch('shop.folios.connection') as conexion:
+            conexion.in_atomic_block = False
+            folios.append(siguiente_folio('PRUEBA'))
+
+        self.assertEqual(len(set(folios)), len(folios))
+        self.assertEqual(folios[:4], ['PRUEBA-00001', 'PRUEBA-00002', 'PRUEBA-00003', 'PRUEBA-00004'])
+        self.assertEqual(folios[4:6], ['PRUEBA-00007', 'PRUEBA-00008'])
+        self.assertEqual(folios[6:], ['PRUEBA-00010', 'PRUEBA-00011', 'PRUEBA-00009'])
+
+
+class CacheDosNivelesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        limpiar_local()
+        self.llamadas = 0
+
+    def _calcular(self, espera=0):
+        def calcular():
+            self.llamadas += 1
+            time.sleep(espera)
+            return self.llamadas
+        return calcular
+
+    def test_un_solo_vuelo_por_clave(self):
+        cacheado = CacheDosNiveles('prueba_vuelo', 60)
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(cacheado.obtener('clave', self._calcular(0.2))))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(resultados, [1] * 5)
+
+    def test_vencimiento_anticipado(self):
+        cacheado = CacheDosNiveles('prueba_xfetch', 60, beta=1000)
+        calcular = self._calcular(0.01)
+        self.assertEqual(cacheado.obtener('clave', calcular), 1)
+        with mock.patch('shop.cache.random.random', return_value=0.0):
+            self.assertEqual(cacheado.obtener('clave', calcular), 1)
+        # Con el sorteo en el extremo, costo × beta × -log(1 - r) supera el ttl: se recalcula antes de vencer
+        with mock.patch('shop.cache.random.random', return_value=1 - 1e-12):
+            self.assertEqual(cacheado.obtener('clave', calcular), 2)
+        self.assertEqual(self.llamadas, 2)
+
+    def test_invalidar_etiqueta_cambia_la_clave(self):
+        cacheado = CacheDosNiveles('prueba_etiquetas', 60)
+        calcular = self._calcular()
+        self.assertEqual(cacheado.obtener('clave', calcular, etiquetas=('prueba',)), 1)
+        self.assertEqual(cacheado.obtener('clave', calcular, etiquetas=('prueba',)), 1)
+        invalidar('prueba')
+        self.assertEqual(cacheado.obtener('clave', calcular, etiquetas=('prueba',)), 2)
+        # Una clave sin la etiqueta no se ve afectada
+        self.assertEqual(cacheado.obtener('otra', calcular), 3)
+        invalidar('prueba')
+        self.assertEqual(cacheado.obtener('otra', calcular), 3)
+
+
+class VentasCrearTests(DatosVentaMixin, TestCase):
+    def test_crear_venta_con_detalles_calcula_cabecera(self):
+        response = self._post_venta(reverse('forneria:ventas_create'), [
+            {'cantidad': 2}, {'cantidad': 1, 'descuento_pct': '10'},
+        ], monto_pagado='5000')
+        venta = Ventas.objects.get()
+        self.assertRedirects(response, reverse('forneria:ventas_detail', args=[venta.pk]))
+        self.assertTrue(venta.folio)
+        self.assertEqual((venta.items_count, venta.items_qty), (2, 3))
+        self.assertEqual((venta.cliente_nombre, venta.cliente_correo), ('Ana', 'ana@correo.cl'))
+        self.assertEqual(
+            (venta.total_sin_iva, venta.total_iva, venta.total_con_iva, venta.vuelto),
+            (Decimal('2900.00'), Decimal('551.00'), Decimal('3451.00'), Decimal('1549.00')),
+        )
+        self.assertEqual(sorted(venta.detalles.values_list('cantidad', flat=True)), [1, 2])
+
+    def test_folio_repetido_vuelve_al_formulario(self):
+        existente = self._venta(folio='VENT-99999')
+        response = self._post_venta(reverse('forneria:ventas_create'), [{'cantidad': 1}], folio=existente.folio)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(Ventas.objects.count(), 1)
+
+
+class EventosSenalesTests(DatosVentaMixin, TestCase):
+    def _selects(self, consultas, tabla):
+        return [q['sql'] for q in consultas if q['sql'].startswith('SELECT') and f'FROM "{tabla}"' in q['sql']]
+
+    def test_cruce_de_stock_sin_releer_el_producto(self):
+        producto = Productos.objects.get(pk=self.producto.pk)
+        producto.stock_minimo = 5
+        producto.stock_actual = 3
+        with mock.patch('shop.eventos.publicar') as publicar, CaptureQueriesContext(connection) as consultas:
+            producto.save()
+        self.assertEqual(self._selects(consultas, 'Productos'), [])
+        self.assertEqual([llamada.args[0] for llamada in publicar.call_args_list], ['stock'])
+
+        # El segundo guardado compara contra lo recién guardado: no vuelve a cruzar
+        with mock.patch('shop.eventos.publicar') as publicar:
+            producto.save()
+        publicar.assert_not_called()
+
+    def test_cambio_de_estado_de_alerta_sin_releer(self):
+        Alertas.objects.create(producto_id=self.producto, tipo_alerta='Stock bajo', mensaje='Quedan 3')
+        alerta = Alertas.objects.get()
+        alerta.estado = 'atendida'
+        with mock.patch('shop.eventos.publicar') as publicar, CaptureQueriesContext(connection) as consultas:
+            alerta.save()
+        self.assertEqual(self._selects(consultas, 'Alertas'), [])
+        self.assertEqual(publicar.call_count, 1)
+
+
+class StockVentasTests(DatosVentaMixin, TestCase):
+    def setUp(self):
+        Movimientos_Inventario.objects.create(producto_id=self.producto, tipo_movimiento='entrada', cantidad=10)
+
+    def _stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock_actual
+
+    def test_venta_web_mueve_stock_y_libro(self):
+        self._post_venta(reverse('forneria:ventas_create'), [{'cantidad': 3}])
+        venta = Ventas.objects.get()
+        self.assertEqual(self._stock(), 7)
+        self.assertEqual(verificar_stock(), [])
+
+        detalle = venta.detalles.get()
+        self._post_venta(reverse('forneria:ventas_edit', args=[venta.pk]), [{'id': detalle.pk, 'cantidad': 1}])
+        self.assertEqual(self._stock(), 9)
+        self.assertEqual(verificar_stock(), [])
+
+        self.client.post(reverse('forneria:ventas_delete', args=[venta.pk]))
+        self.assertEqual(self._stock(), 10)
+        self.assertEqual(verificar_stock(), [])
+
+    def test_venta_de_caja_publica_el_cruce_del_minimo(self):
+        Productos.objects.filter(pk=self.producto.pk).update(stock_minimo=5)
+        with mock.patch('shop.eventos.publicar') as publicar:
+            sincronizar_ventas([{
+                'clave': 'caja-1', 'cliente_id': self.cliente.pk,
+                'detalles': [{'producto_id': self.producto.pk, 'cantidad': 6}],
+            }])
+        self.assertIn('stock', [llamada.args[0] for llamada in publicar.call_args_list])
+        self.assertEqual(self._stock(), 4)
+        self.assertEqual(verificar_stock(), [])
+
+
+class NavegacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        limpiar_local()
+        self.usuario = User.objects.create_user('vendedora', 'vendedora@forneria.cl', 'x')
+        self.client.force_login(self.usuario)
+
+    def _consultas_permisos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('forneria:perfil'))
+        sql = [q['sql'] for q in consultas if 'auth_group' in q['sql'] or 'auth_permission' in q['sql']]
+        return response.context['rol_usuario'], sql
+
+    def test_grupos_y_permisos_se_cachean_por_usuario(self):
+        rol, sql = self._consultas_permisos()
+        self.assertEqual(rol, 'otro')
+        self.assertTrue(sql)
+        rol, sql = self._consultas_permisos()
+        self.assertEqual((rol, sql), ('otro', []))
+
+    def test_cambiar_grupos_invalida_la_navegacion(self):
+        self._consultas_permisos()
+        grupo = Group.objects.create(name='Editor')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.groups.add(grupo)
+        limpiar_local()
+        rol, _ = self._consultas_permisos()
+        self.assertEqual(rol, 'vendedor')
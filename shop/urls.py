@@ -40,5 +40,28 @@ urlpatterns = [
     path('ventas/<int:venta_id>/editar/', views.ventas_edit, name='ventas_edit'),
     path('ventas/<int:venta_id>/eliminar/', views.ventas_delete, name='ventas_delete'),
 
+    # Reportes
+    path('reportes/', views.reportes_ventas, name='reportes_ventas'),
+
+    # Caja sin conexión
+    path('caja/', views.caja_pos, name='caja_pos'),
+    path('caja/sw.js', views.caja_service_worker, name='caja_service_worker'),
+    path('api/caja/catalogo/', views.api_caja_catalogo, name='api_caja_catalogo'),
+    path('api/caja/sincronizar/', views.api_caja_sincronizar, name='api_caja_sincronizar'),
+
+    # API de lectura asíncrona
+    path('api/productos/', views.api_productos, name='api_productos'),
+    path('api/productos/autocompletar/', views.api_productos_autocompletar, name='api_productos_autocompletar'),
+    path('api/dashboard/contadores/', views.api_dashboard_contadores, name='api_dashboard_contadores'),
+    path('api/dashboard/eventos/', views.api_dashboard_eventos, name='api_dashboard_eventos'),
+
+    path('api/inventario/stock/', views.api_stock_historico, name='api_stock_historico'),
     path('api/info/', info, name='info'),
+
+    # Métricas para Prometheus
+    path('metrics', views.metricas_view, name='metricas'),
+    # Estado de calentamiento del worker para el balanceador
+    path('salud/', views.salud, name='salud'),
+    # Perfiles de ?_perfil=1 (solo superusuarios)
+    path('perfiles/<str:perfil_id>/', views.perfil_descarga, name='perfil_descarga'),
 ]
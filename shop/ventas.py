@@ -0,0 +1,84 @@
+"""
+Cabeceras de ventas
+
+Totales y datos desnormalizados de la cabecera (items_count, items_qty,
+nombre y correo del cliente al vender) que comparten los formularios de
+venta, la caja, el admin y el comando completar_cabeceras_ventas, y el
+movimiento de lotes y stock que produce guardar o eliminar una venta.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .inventario import mover_stock_ventas
+from .lotes import consumir_lotes, devolver_lotes, diferencia_cantidades
+from .models import Detalle_Venta, Ventas
+
+
+def calcular_totales(venta, detalles):
+    """Subtotal, IVA (19%) y total con IVA menos el descuento de la venta."""
+    subtotal = Decimal('0.00')
+    for detalle in detalles:
+        if detalle.cantidad and detalle.precio_unitario:
+            linea = Decimal(detalle.cantidad) * detalle.precio_unitario
+            descuento_pct = detalle.descuento_pct or Decimal('0')
+            linea = linea * (Decimal('1') - descuento_pct / Decimal('100'))
+            subtotal += linea
+    subtotal = subtotal.quantize(Decimal('0.01'))
+    iva = (subtotal * Decimal('0.19')).quantize(Decimal('0.01'))
+    descuento = venta.descuento or Decimal('0.00')
+    total_con_iva = (subtotal + iva - descuento).quantize(Decimal('0.01'))
+    if total_con_iva < Decimal('0.00'):
+        total_con_iva = Decimal('0.00')
+    return subtotal, iva, total_con_iva
+
+
+def resumen_items(detalles):
+    """(líneas, unidades) de la venta; se guardan en la cabecera para no unir Detalle_Venta en los listados."""
+    detalles = list(detalles)
+    return len(detalles), sum(detalle.cantidad or 0 for detalle in detalles)
+
+
+def copiar_cliente(venta, cliente):
+    """Guarda en la venta el nombre y correo del cliente tal como estaban al vender."""
+    venta.cliente_nombre = cliente.nombre or ''
+    venta.cliente_correo = cliente.correo or ''
+
+
+def recalcular_cabeceras(ventas_ids, conservar_cliente=True):
+    """
+    Recalcula items_count/items_qty (y el cliente si está vacío, o siempre con
+    conservar_cliente=False) para las ventas indicadas. Tres consultas por llamada.
+    Retorna el número de ventas actualizadas.
+    """
+    ventas = list(
+        Ventas.objects.filter(id__in=ventas_ids)
+        .select_related('cliente_id')
+        .only('id', 'cliente_nombre', 'cliente_correo', 'cliente_id__nombre', 'cliente_id__correo')
+    )
+    totales = {
+        fila['venta_id']: (fila['lineas'], fila['unidades'] or 0)
+        for fila in Detalle_Venta.objects.filter(venta_id__in=ventas_ids)
+        .values('venta_id').annotate(lineas=Count('id'), unidades=Sum('cantidad')).order_by()
+    }
+    for venta in ventas:
+        venta.items_count, venta.items_qty = totales.get(venta.id, (0, 0))
+        if not conservar_cliente or not venta.cliente_nombre:
+            copiar_cliente(venta, venta.cliente_id)
+    Ventas.objects.bulk_update(ventas, ['cliente_nombre', 'cliente_correo', 'items_count', 'items_qty'])
+    return len(ventas)
+
+
+def mover_inventario(anteriores, nuevas):
+    """
+    Consume de los lotes y del stock las unidades agregadas entre dos lecturas
+    de cantidades_por_producto y devuelve las quitadas (`nuevas` vacío al
+    eliminar la venta). Debe llamarse dentro de la transacción de la venta.
+    Retorna las unidades que no pudieron cubrirse con lotes, por producto.
+    """
+    diferencia = diferencia_cantidades(anteriores, nuevas)
+    faltantes = consumir_lotes(diferencia)
+    devolver_lotes({producto_id: -cantidad for producto_id, cantidad in diferencia.items() if cantidad < 0})
+    mover_stock_ventas(diferencia)
+    return faltantes
@@ -1,9 +1,12 @@
+import json
+import os
+import time as time_module
 from datetime import datetime, time
 from decimal import Decimal
 
 from django.http import JsonResponse
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
@@ -11,7 +14,9 @@ from django.contrib import messages
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIRequest
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import (
@@ -24,9 +29,20 @@ from django.contrib.auth.views import (
 )
 from django.urls import reverse_lazy
 from django.utils.safestring import mark_safe
-from openpyxl import Workbook
-from .decorators import permission_or_redirect, admin_required, groups_required
-from .models import Productos, Clientes, Ventas, Detalle_Venta, Alertas, Categorias, UserProfile, Nutricional
+from .decorators import permission_or_redirect, admin_required, groups_required, api_permission_required, async_api_permission_required
+from . import reportes
+from .cache import CacheDosNiveles
+from .caja import MAX_VENTAS_POR_LOTE, catalogo_caja, sincronizar_ventas
+from .clientes import ids_exactos
+from .eventos import obtener_bus
+from .facetas import facetas, normalizar_tipo
+from .folios import FOLIO_PATRON, siguiente_folio
+from .inventario import stock_en
+from .lotes import cantidades_por_producto
+from . import calentamiento, metricas, perfilador
+from .nutricional import asignar_perfil, obtener_o_crear_perfil
+from .ventas import calcular_totales, copiar_cliente, mover_inventario, resumen_items
+from .models import Productos, Clientes, Ventas, Detalle_Venta, Alertas, UserProfile, Lotes
 from .forms import (
     UserForm,
     UserProfileForm,
@@ -63,11 +79,9 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
+            # login() ya regenera la clave de sesión (previene fijación)
             login(request, user)
 
-            # Regenerar la clave de sesión para prevenir fijación
-            request.session.cycle_key()
-
             # Configurar datos de sesión específicos
             request.session['forneria_user_id'] = user.id
             request.session['forneria_username'] = user.username
@@ -106,32 +120,21 @@ def logout_view(request):
 
 @login_required
 def dashboard_admin(request):
-    """Dashboard para administradores"""
-    total_productos = Productos.objects.count()
-    total_clientes = Clientes.objects.count()
-    ventas_hoy = Ventas.objects.filter(fecha__date=timezone.now().date()).count()
-    alertas_pendientes = Alertas.objects.filter(estado='pendiente').count()
-    
-    context = {
-        'total_productos': total_productos,
-        'total_clientes': total_clientes,
-        'ventas_hoy': ventas_hoy,
-        'alertas_pendientes': alertas_pendientes,
-    }
-    
+    """Dashboard para administradores; los contadores se actualizan luego por eventos en vivo"""
+    context = dict(async_to_sync(_contadores_dashboard)())
+    # Sin ASGI no hay eventos en vivo: la plantilla consulta los contadores cada cierto tiempo
+    context['eventos_en_vivo'] = isinstance(request, ASGIRequest)
+    context['intervalo_contadores'] = EVENTOS_INTERVALO_CONTADORES
     return render(request, 'shop/dashboard_admin.html', context)
 
 
 @login_required
 def dashboard_vendedor(request):
     """Dashboard para vendedores"""
-    total_productos = Productos.objects.count()
-    ventas_hoy = Ventas.objects.filter(fecha__date=timezone.now().date()).count()
-    
-    context = {
-        'total_productos': total_productos,
-        'ventas_hoy': ventas_hoy,
-    }
+    context = dict(_contadores.obtener('vendedor', lambda: {
+        'total_productos': Productos.objects.count(),
+        'ventas_hoy': Ventas.objects.filter(fecha__date=timezone.now().date()).count(),
+    }))
     
     return render(request, 'shop/dashboard_vendedor.html', context)
 
@@ -207,8 +210,9 @@ def productos_list(request):
         per_page = request.session.get(per_page_session_key, per_page_choices[1])
 
     search = (request.GET.get('search') or '').strip()
-    categoria_id = request.GET.get('categoria')
-    tipo = (request.GET.get('tipo') or '').strip()
+    # Facetas de selección múltiple: ?categoria=1&categoria=3&tipo=propia
+    categorias_sel = sorted({int(valor) for valor in request.GET.getlist('categoria') if valor.isdigit()})
+    tipos_sel = sorted({normalizar_tipo(valor) for valor in request.GET.getlist('tipo')} - {''})
     order_param = request.GET.get('order', '-creado')
 
     allowed_orders = {
@@ -235,11 +239,14 @@ def productos_list(request):
             | Q(Categorias_id__nombre__icontains=search)
         )
 
-    if categoria_id and categoria_id.isdigit():
-        productos_qs = productos_qs.filter(Categorias_id_id=int(categoria_id))
+    if categorias_sel:
+        productos_qs = productos_qs.filter(Categorias_id_id__in=categorias_sel)
 
-    if tipo:
-        productos_qs = productos_qs.filter(tipo__iexact=tipo)
+    if tipos_sel:
+        filtro_tipos = Q()
+        for tipo in tipos_sel:
+            filtro_tipos |= Q(tipo__iexact=tipo)
+        productos_qs = productos_qs.filter(filtro_tipos)
 
     productos_qs = productos_qs.order_by(order_by)
 
@@ -281,22 +288,14 @@ def productos_list(request):
     export_params['export'] = 'xlsx'
     export_url = f"?{export_params.urlencode()}" if export_params else '?export=xlsx'
 
-    categorias = Categorias.objects.all().order_by('nombre')
-    tipos_disponibles = list(
-        Productos.objects.order_by('tipo')
-        .values_list('tipo', flat=True)
-        .distinct()
-    )
-    tipos_disponibles = [t for t in tipos_disponibles if t]
-
     context = {
         'page_obj': page_obj,
         'total_resultados': paginator.count,
         'search': search,
-        'categoria_selected': int(categoria_id) if categoria_id and categoria_id.isdigit() else None,
-        'tipo_selected': tipo,
-        'categorias': categorias,
-        'tipos': tipos_disponibles,
+        'categoria_selected': categorias_sel,
+        'tipo_selected': tipos_sel,
+        # Se evalúa solo si el fragmento de filtros no está en caché
+        'facetas': lambda: facetas(categorias_sel, tipos_sel),
         'per_page': per_page,
         'per_page_choices': per_page_choices,
         'order_param': order_param,
@@ -320,15 +319,8 @@ def productos_create(request):
         if form.is_valid():
             producto = form.save(commit=False)
             if not producto.Nutricional_id_id:
-                nutricional = Nutricional.objects.first()
-                if nutricional is None:
-                    messages.error(request, 'Debes crear al menos un perfil nutricional antes de registrar productos.')
-                    return render(request, 'shop/productos_create.html', {
-                        'form': form,
-                        'title': 'Crear nuevo producto',
-                        'submit_label': 'Crear producto',
-                    })
-                producto.Nutricional_id = nutricional
+                # Perfil "sin datos" compartido, no uno ajeno elegido al azar
+                producto.Nutricional_id = obtener_o_crear_perfil()
             producto.save()
             messages.success(request, mark_safe(f'Producto "{producto.nombre}" creado correctamente.'))
             return redirect('forneria:productos_detail', producto.id)
@@ -387,7 +379,7 @@ def productos_detail(request, producto_id):
     """
     Ver detalles de un producto
     """
-    producto = get_object_or_404(Productos, id=producto_id)
+    producto = asignar_perfil(get_object_or_404(Productos.objects.select_related('Categorias_id'), id=producto_id))
     
     context = {
         'producto': producto,
@@ -400,7 +392,11 @@ def productos_detail(request, producto_id):
 
 
 
+@metricas.cronometrar('forneria_exportacion_segundos', tipo='productos')
 def _export_productos_excel(queryset):
+    # openpyxl se importa al exportar: el arranque de cada worker y de manage.py no lo carga
+    from openpyxl import Workbook
+
     workbook = Workbook()
     worksheet = workbook.active
     worksheet.title = 'Productos'
@@ -528,14 +524,22 @@ def ventas_list(request):
         order_param = '-fecha'
     order_by = allowed_orders[order_param]
 
-    ventas_qs = Ventas.objects.select_related('cliente_id').prefetch_related('detalles__producto_id').all()
+    # Cliente y conteo de ítems desnormalizados en Ventas: ni JOIN ni prefetch de detalles
+    ventas_qs = Ventas.objects.all()
 
     if search:
-        ventas_qs = ventas_qs.filter(
-            Q(folio__icontains=search)
-            | Q(cliente_id__nombre__icontains=search)
-            | Q(cliente_id__correo__icontains=search)
-        )
+        clientes_ids = ids_exactos(search)
+        if clientes_ids:
+            # RUT o correo: lectura del índice de Clientes en vez de recorrer Ventas
+            ventas_qs = ventas_qs.filter(cliente_id__in=clientes_ids)
+        elif FOLIO_PATRON.match(search):
+            ventas_qs = ventas_qs.filter(folio=search.upper())
+        else:
+            ventas_qs = ventas_qs.filter(
+                Q(folio__icontains=search)
+                | Q(cliente_nombre__icontains=search)
+                | Q(cliente_correo__icontains=search)
+            )
 
     if canal:
         ventas_qs = ventas_qs.filter(canal_venta=canal)
@@ -638,23 +642,6 @@ def ventas_list(request):
     return render(request, 'shop/ventas_list.html', context)
 
 
-def _calcular_totales(venta, detalles):
-    subtotal = Decimal('0.00')
-    for detalle in detalles:
-        if detalle.cantidad and detalle.precio_unitario:
-            linea = Decimal(detalle.cantidad) * detalle.precio_unitario
-            descuento_pct = detalle.descuento_pct or Decimal('0')
-            linea = linea * (Decimal('1') - descuento_pct / Decimal('100'))
-            subtotal += linea
-    subtotal = subtotal.quantize(Decimal('0.01'))
-    iva = (subtotal * Decimal('0.19')).quantize(Decimal('0.01'))
-    descuento = venta.descuento or Decimal('0.00')
-    total_con_iva = (subtotal + iva - descuento).quantize(Decimal('0.01'))
-    if total_con_iva < Decimal('0.00'):
-        total_con_iva = Decimal('0.00')
-    return subtotal, iva, total_con_iva
-
-
 @login_required
 @permission_or_redirect('shop.add_ventas', 'forneria:ventas_list', 'No puedes crear ventas.')
 def ventas_create(request):
@@ -664,7 +651,9 @@ def ventas_create(request):
 
     if request.method == 'POST':
         if form.is_valid() and formset.is_valid():
-            return _guardar_venta(request, form, formset, venta, 'Venta registrada correctamente.')
+            response = _guardar_venta(request, form, formset, venta, 'Venta registrada correctamente.')
+            if response is not None:
+                return response
         messages.error(request, 'Revisa los campos del formulario de venta y sus detalles.')
 
     context = {
@@ -686,7 +675,9 @@ def ventas_edit(request, venta_id):
 
     if request.method == 'POST':
         if form.is_valid() and formset.is_valid():
-            return _guardar_venta(request, form, formset, venta, 'Venta actualizada correctamente.')
+            response = _guardar_venta(request, form, formset, venta, 'Venta actualizada correctamente.')
+            if response is not None:
+                return response
         messages.error(request, 'Revisa los campos del formulario de venta y sus detalles.')
 
     context = {
@@ -707,7 +698,9 @@ def ventas_delete(request, venta_id):
 
     if request.method == 'POST':
         folio = venta.folio or venta.id
-        venta.delete()
+        with transaction.atomic():
+            mover_inventario(cantidades_por_producto(venta), {})
+            venta.delete()
         messages.success(request, f'Venta "{folio}" eliminada correctamente.')
     else:
         messages.warning(request, 'La eliminación debe confirmarse desde los botones correspondientes.')
@@ -722,19 +715,18 @@ def ventas_delete(request, venta_id):
 @permission_or_redirect('shop.view_ventas', 'forneria:ventas_list', 'No puedes ver los detalles de ventas.')
 def ventas_detail(request, venta_id):
     venta = get_object_or_404(Ventas.objects.select_related('cliente_id'), id=venta_id)
-    detalles = venta.detalles.select_related('producto_id').all()
-
-    detalles_info = []
-    for detalle in detalles:
-        subtotal = Decimal(detalle.cantidad) * detalle.precio_unitario
-        descuento_pct = detalle.descuento_pct or Decimal('0')
-        subtotal = subtotal * (Decimal('1') - descuento_pct / Decimal('100'))
-        subtotal = subtotal.quantize(Decimal('0.01'))
-        detalles_info.append({'registro': detalle, 'subtotal': subtotal})
+    # Subtotales por línea y total de la venta calculados en una sola consulta
+    detalles = list(
+        Detalle_Venta.objects.filter(venta_id=venta)
+        .select_related('producto_id')
+        .with_subtotals()
+    )
+    subtotal_detalles = detalles[0].subtotal_venta if detalles else Decimal('0.00')
 
     context = {
         'venta': venta,
-        'detalles_info': detalles_info,
+        'detalles': detalles,
+        'subtotal_detalles': subtotal_detalles,
         'user_can_change': request.user.has_perm('shop.change_ventas'),
         'user_can_delete': request.user.has_perm('shop.delete_ventas'),
         'user_can_add': request.user.has_perm('shop.add_ventas'),
@@ -743,57 +735,95 @@ def ventas_detail(request, venta_id):
 
 
 def _guardar_venta(request, form, formset, venta, success_message):
-    with transaction.atomic():
-        venta = form.save(commit=False)
-        descuento = form.cleaned_data.get('descuento') or Decimal('0.00')
-        venta.descuento = descuento
-
-        # Valores por defecto para evitar columnas NOT NULL en el primer guardado
-        if venta.total_sin_iva is None:
-            venta.total_sin_iva = Decimal('0.00')
-        if venta.total_iva is None:
-            venta.total_iva = Decimal('0.00')
-        if venta.total_con_iva is None:
-            venta.total_con_iva = Decimal('0.00')
-        if venta.monto_pagado is None:
-            venta.monto_pagado = Decimal('0.00')
-        if venta.vuelto is None:
-            venta.vuelto = Decimal('0.00')
-
-        venta.save()
-
-        detalles = formset.save(commit=False)
-        for detalle in formset.deleted_objects:
-            detalle.delete()
-
-        for detalle in detalles:
-            detalle.venta_id = venta
-            detalle.save()
-
-        subtotal, iva, total_con_iva = _calcular_totales(venta, venta.detalles.all())
-        venta.total_sin_iva = subtotal
-        venta.total_iva = iva
-        venta.total_con_iva = total_con_iva
-
-        monto_pagado = form.cleaned_data.get('monto_pagado')
-        if monto_pagado is None:
-            monto_pagado = total_con_iva
-        venta.monto_pagado = Decimal(monto_pagado).quantize(Decimal('0.01'))
-        venta.vuelto = (venta.monto_pagado - total_con_iva).quantize(Decimal('0.01'))
-        if venta.vuelto < Decimal('0.00'):
-            venta.vuelto = Decimal('0.00')
-
-        venta.save()
-
-        if not venta.folio:
-            venta.folio = f"VENT-{venta.id:05d}"
-            venta.save(update_fields=['folio'])
+    # El folio se asigna antes del INSERT y fuera de la transacción (ver shop/folios.py)
+    folio_original = venta.folio
+    folio = form.cleaned_data.get('folio') or siguiente_folio()
+    era_nueva = venta.pk is None
+    detalles_nuevos = [f.instance for f in formset.forms if f.instance.pk is None]
+
+    try:
+        with transaction.atomic():
+            faltantes = _guardar_venta_atomica(form, formset, venta, folio)
+    except IntegrityError as exc:
+        if 'folio' not in str(exc):
+            raise
+        # Revertir las claves asignadas en la transacción anulada para volver a mostrar el formulario
+        venta.folio = folio_original
+        if era_nueva:
+            venta.pk = None
+            venta._state.adding = True
+        for detalle in detalles_nuevos:
+            detalle.pk = None
+            detalle._state.adding = True
+        form.add_error('folio', 'Ya existe una venta con este folio.')
+        return None
 
     messages.success(request, success_message)
+    if faltantes:
+        nombres = Productos.objects.filter(id__in=faltantes.keys()).values_list('nombre', flat=True)
+        messages.warning(request, f"Lotes insuficientes para: {', '.join(nombres)}.")
     return redirect('forneria:ventas_detail', venta.id)
 
 
+def _guardar_venta_atomica(form, formset, venta, folio):
+    """Guarda cabecera, detalles y consumo de lotes. Retorna los faltantes de lotes."""
+    cantidades_previas = cantidades_por_producto(venta)
+    venta = form.save(commit=False)
+    venta.folio = folio
+    descuento = form.cleaned_data.get('descuento') or Decimal('0.00')
+    venta.descuento = descuento
+    # El nombre del cliente queda fijo al vender; solo cambia si se cambia el cliente
+    if 'cliente_id' in form.changed_data or not venta.cliente_nombre:
+        copiar_cliente(venta, form.cleaned_data['cliente_id'])
+
+    # Valores por defecto para evitar columnas NOT NULL en el primer guardado
+    if venta.total_sin_iva is None:
+        venta.total_sin_iva = Decimal('0.00')
+    if venta.total_iva is None:
+        venta.total_iva = Decimal('0.00')
+    if venta.total_con_iva is None:
+        venta.total_con_iva = Decimal('0.00')
+    if venta.monto_pagado is None:
+        venta.monto_pagado = Decimal('0.00')
+    if venta.vuelto is None:
+        venta.vuelto = Decimal('0.00')
+
+    venta.save()
+
+    detalles = formset.save(commit=False)
+    for detalle in formset.deleted_objects:
+        detalle.delete()
+
+    for detalle in detalles:
+        detalle.venta_id = venta
+        detalle.save()
+
+    # Descontar de los lotes (FIFO por caducidad) y del stock solo las unidades nuevas y devolver las quitadas
+    faltantes = mover_inventario(cantidades_previas, cantidades_por_producto(venta))
+
+    detalles_guardados = list(venta.detalles.all())
+    subtotal, iva, total_con_iva = calcular_totales(venta, detalles_guardados)
+    venta.items_count, venta.items_qty = resumen_items(detalles_guardados)
+    venta.total_sin_iva = subtotal
+    venta.total_iva = iva
+    venta.total_con_iva = total_con_iva
+
+    monto_pagado = form.cleaned_data.get('monto_pagado')
+    if monto_pagado is None:
+        monto_pagado = total_con_iva
+    venta.monto_pagado = Decimal(monto_pagado).quantize(Decimal('0.01'))
+    venta.vuelto = (venta.monto_pagado - total_con_iva).quantize(Decimal('0.01'))
+    if venta.vuelto < Decimal('0.00'):
+        venta.vuelto = Decimal('0.00')
+
+    venta.save()
+    return faltantes
+
+
+@metricas.cronometrar('forneria_exportacion_segundos', tipo='ventas')
 def _export_ventas_excel(queryset):
+    from openpyxl import Workbook
+
     workbook = Workbook()
     worksheet = workbook.active
     worksheet.title = 'Ventas'
@@ -819,7 +849,7 @@ def _export_ventas_excel(queryset):
             venta.id,
             venta.folio or '',
             fecha.strftime('%Y-%m-%d %H:%M'),
-            venta.cliente_id.nombre if venta.cliente_id else '',
+            venta.cliente_nombre,
             venta.get_canal_venta_display(),
             float(venta.total_sin_iva or 0),
             float(venta.total_iva or 0),
@@ -838,8 +868,356 @@ def _export_ventas_excel(queryset):
     return response
 
 
+# ============= REPORTES =============
+
+@login_required
+@permission_or_redirect('shop.view_ventas', 'forneria:dashboard_vendedor', 'No puedes acceder a los reportes.')
+def reportes_ventas(request):
+    dimension = request.GET.get('dimension', 'producto')
+    if dimension not in reportes.DIMENSIONES:
+        dimension = 'producto'
+    canal = (request.GET.get('canal') or '').strip()
+    comparar = request.GET.get('comparar') == '1'
+
+    hoy = timezone.localdate()
+    desde = _parse_fecha_param(request.GET.get('desde')) or hoy.replace(day=1)
+    hasta = _parse_fecha_param(request.GET.get('hasta')) or hoy
+    if desde > hasta:
+        messages.warning(request, 'La fecha de inicio es posterior a la de término; se intercambiaron.')
+        desde, hasta = hasta, desde
+
+    if comparar:
+        filas = reportes.comparativo_anual(dimension, desde, hasta, canal or None)
+    else:
+        filas = reportes.ventas_por(dimension, desde, hasta, canal or None)
+
+    if request.GET.get('export') == 'xlsx':
+        return _export_reporte_excel(dimension, filas, comparar, desde, hasta)
+
+    export_params = request.GET.copy()
+    export_params['export'] = 'xlsx'
+
+    context = {
+        'filas': filas,
+        'dimension': dimension,
+        'dimensiones': reportes.NOMBRES_DIMENSION.items(),
+        'nombre_dimension': reportes.NOMBRES_DIMENSION[dimension],
+        'canal_selected': canal,
+        'canal_choices': Ventas.CANAL_CHOICES,
+        'comparar': comparar,
+        'desde': desde.strftime('%Y-%m-%d'),
+        'hasta': hasta.strftime('%Y-%m-%d'),
+        'total_cantidad': sum(f['cantidad'] for f in filas),
+        'total_monto': sum((f['total'] for f in filas), Decimal('0.00')),
+        'export_url': f"?{export_params.urlencode()}",
+    }
+    return render(request, 'shop/reportes.html', context)
+
+
+def _parse_fecha_param(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+@metricas.cronometrar('forneria_exportacion_segundos', tipo='reporte')
+def _export_reporte_excel(dimension, filas, comparar, desde, hasta):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = 'Reporte'
 
-def info(request):
+    headers = [reportes.NOMBRES_DIMENSION[dimension], 'Unidades', 'Total sin IVA']
+    if comparar:
+        headers += ['Unidades año anterior', 'Total año anterior', 'Variación (%)']
+    worksheet.append(headers)
+
+    for fila in filas:
+        valores = [fila['etiqueta'], fila['cantidad'], float(fila['total'])]
+        if comparar:
+            variacion = fila['variacion_pct']
+            valores += [
+                fila['cantidad_anterior'],
+                float(fila['total_anterior']),
+                float(variacion) if variacion is not None else '',
+            ]
+        worksheet.append(valores)
+
+    response = HttpResponse(
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    filename = f"reporte_{dimension}_{desde:%Y%m%d}_{hasta:%Y%m%d}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+    workbook.save(response)
+    return response
+
+# ============= CAJA SIN CONEXIÓN =============
+
+@login_required
+@permission_or_redirect('shop.add_ventas', 'forneria:ventas_list', 'No puedes registrar ventas.')
+def caja_pos(request):
+    """Página de la caja: el catálogo y la cola de ventas viven en el navegador."""
+    return render(request, 'shop/caja.html')
+
+
+def caja_service_worker(request):
+    """Service worker de la caja; se sirve bajo /caja/ para que ese sea su alcance."""
+    response = render(request, 'shop/caja_sw.js', content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@async_api_permission_required('shop.add_ventas')
+async def api_caja_catalogo(request):
+    return JsonResponse(await catalogo_caja())
+
+
+@api_permission_required('shop.add_ventas')
+def api_caja_sincronizar(request):
+    """Recibe {"ventas": [...]} y responde un resultado por venta (ver shop/caja.py)."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+    try:
+        lote = json.loads(request.body or b'{}').get('ventas')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido.'}, status=400)
+    if not isinstance(lote, list):
+        return JsonResponse({'error': 'Se esperaba una lista "ventas".'}, status=400)
+    if len(lote) > MAX_VENTAS_POR_LOTE:
+        return JsonResponse({'error': f'Máximo {MAX_VENTAS_POR_LOTE} ventas por lote.'}, status=413)
+
+    resultados, faltantes = sincronizar_ventas(lote)
+    return JsonResponse({
+        'resultados': resultados,
+        'lotes_insuficientes': sorted(faltantes),
+    })
+
+# ============= API DE LECTURA (ASÍNCRONA) =============
+# Endpoints JSON de solo lectura con ORM asíncrono: bajo ASGI no ocupan un hilo
+# mientras esperan a la base de datos.
+
+LIMITE_AUTOCOMPLETAR = 10
+CACHE_TIMEOUT_CONTADORES = 5
+EVENTOS_PING = 15
+EVENTOS_ESPERA_POLL = 25
+EVENTOS_INTERVALO_CONTADORES = 30
+EVENTOS_DURACION_STREAM = 5 * 60
+
+_contadores = CacheDosNiveles('dashboard', CACHE_TIMEOUT_CONTADORES)
+
+
+@async_api_permission_required('shop.view_productos')
+async def api_productos(request):
+    """Catálogo de productos (?categoria=<id>, ?tipo=<propia|...>)."""
+    productos = Productos.objects.order_by('nombre').values(
+        'id', 'nombre', 'precio', 'tipo', 'Categorias_id', 'presentacion', 'formato', 'stock_actual'
+    )
+    categoria = request.GET.get('categoria', '')
+    if categoria:
+        if not categoria.isdigit():
+            return JsonResponse({'error': 'Parámetro categoria inválido.'}, status=400)
+        productos = productos.filter(Categorias_id=int(categoria))
+    tipo = request.GET.get('tipo')
+    if tipo:
+        productos = productos.filter(tipo=tipo)
+
+    return JsonResponse({
+        'productos': [
+            {
+                'id': p['id'],
+                'nombre': p['nombre'],
+                'precio': float(p['precio']),
+                'tipo': p['tipo'],
+                'categoria_id': p['Categorias_id'],
+                'presentacion': p['presentacion'] or '',
+                'formato': p['formato'] or '',
+                'stock': p['stock_actual'] or 0,
+            }
+            async for p in productos.aiterator()
+        ],
+    })
+
+
+@async_api_permission_required('shop.view_productos')
+async def api_productos_autocompletar(request):
+    """Sugerencias de productos por nombre (?q=, mínimo 2 caracteres)."""
+    termino = request.GET.get('q', '').strip()
+    if len(termino) < 2:
+        return JsonResponse({'resultados': []})
+    productos = (
+        Productos.objects.filter(nombre__icontains=termino)
+        .order_by('nombre')
+        .values('id', 'nombre', 'precio')[:LIMITE_AUTOCOMPLETAR]
+    )
+    return JsonResponse({
+        'resultados': [
+            {'id': p['id'], 'nombre': p['nombre'], 'precio': float(p['precio'])}
+            async for p in productos.aiterator()
+        ],
+    })
+
+
+async def _calcular_contadores():
+    hoy = timezone.now().date()
+    return {
+        'total_productos': await Productos.objects.acount(),
+        'total_clientes': await Clientes.objects.acount(),
+        'ventas_hoy': await Ventas.objects.filter(fecha__date=hoy).acount(),
+        'alertas_pendientes': await Alertas.objects.filter(estado='pendiente').acount(),
+        'lotes_por_vencer': await Lotes.objects.por_vencer(horas=48).acount(),
+    }
+
+
+async def _contadores_dashboard():
+    # Cache corto: muchas reconexiones simultáneas comparten una sola foto de contadores
+    return await _contadores.aobtener('contadores', _calcular_contadores)
+
+
+@async_api_permission_required('shop.view_ventas')
+async def api_dashboard_contadores(request):
+    """Contadores del dashboard para refrescarlos sin recargar la página."""
+    return JsonResponse(await _contadores_dashboard())
+
+
+def _espera_poll(valor):
+    """Segundos de long-poll pedidos con ?espera=, acotados a EVENTOS_ESPERA_POLL."""
+    try:
+        espera = float(valor)
+    except (TypeError, ValueError):
+        return EVENTOS_ESPERA_POLL
+    if not espera >= 0:
+        return EVENTOS_ESPERA_POLL
+    return min(espera, EVENTOS_ESPERA_POLL)
+
+
+def _formato_sse(evento_id, tipo, datos):
+    return f"id: {evento_id}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+@async_api_permission_required('shop.view_ventas')
+async def api_dashboard_eventos(request):
+    """
+    Eventos en vivo del dashboard (ver shop/eventos.py).
+
+    Por defecto responde un stream SSE; con ?modo=poll hace long-poll (hasta
+    ?espera= segundos, como máximo EVENTOS_ESPERA_POLL) y responde JSON
+    ({"eventos": [...], "ultimo": id}). Si el id recibido (Last-Event-ID o
+    ?desde=) no es de este worker, se envía primero una foto completa de
+    contadores.
+
+    Solo bajo ASGI se mantiene la conexión abierta. Bajo WSGI el stream se
+    consumiría entero antes de enviar el primer byte, ocupando el worker: el
+    SSE responde 204 (EventSource deja de reconectar) y el poll responde de
+    inmediato con lo pendiente.
+    """
+    asgi = isinstance(request, ASGIRequest)
+    bus = obtener_bus()
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('desde', '')
+    posicion = bus.posicion(ultimo)
+
+    if request.GET.get('modo') == 'poll':
+        if posicion is None:
+            return JsonResponse({
+                'eventos': [{'tipo': 'snapshot', 'datos': await _contadores_dashboard()}],
+                'ultimo': bus.ultimo_id(),
+            })
+        espera = _espera_poll(request.GET.get('espera')) if asgi else 0
+        eventos = await bus.esperar(posicion, espera)
+        return JsonResponse({
+            'eventos': [evento for _, evento in eventos],
+            'ultimo': eventos[-1][0] if eventos else ultimo,
+        })
+
+    if not asgi:
+        return HttpResponse(status=204)
+
+    async def stream():
+        nonlocal posicion
+        if posicion is None:
+            evento_id = bus.ultimo_id()
+            posicion = bus.posicion(evento_id)
+            yield _formato_sse(evento_id, 'snapshot', await _contadores_dashboard())
+        # Se cierra periódicamente para liberar la conexión; EventSource reconecta solo
+        fin = time_module.monotonic() + EVENTOS_DURACION_STREAM
+        while time_module.monotonic() < fin:
+            eventos = await bus.esperar(posicion, EVENTOS_PING)
+            if not eventos:
+                yield ': ping\n\n'
+                continue
+            for evento_id, evento in eventos:
+                yield _formato_sse(evento_id, evento['tipo'], evento['datos'])
+            posicion = int(eventos[-1][0].rsplit(':', 1)[1])
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# ============= INVENTARIO =============
+
+@login_required
+@permission_or_redirect('shop.view_productos', 'forneria:dashboard_vendedor', 'No puedes consultar el inventario.')
+def api_stock_historico(request):
+    """Stock por producto en un instante (?momento=YYYY-MM-DDTHH:MM, opcional ?producto=<id>)"""
+    momento = timezone.now()
+    momento_param = request.GET.get('momento')
+    if momento_param:
+        try:
+            momento = datetime.fromisoformat(momento_param)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetro momento inválido, usa formato ISO 8601.'}, status=400)
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento, timezone.get_current_timezone())
+
+    productos_ids = None
+    producto_param = request.GET.get('producto')
+    if producto_param:
+        if not producto_param.isdigit():
+            return JsonResponse({'error': 'Parámetro producto inválido.'}, status=400)
+        productos_ids = [int(producto_param)]
+
+    stocks = stock_en(momento, productos_ids)
+    return JsonResponse({
+        'momento': momento.isoformat(),
+        'stock': [{'producto_id': pid, 'stock': stock} for pid, stock in sorted(stocks.items())],
+    })
+
+
+def metricas_view(request):
+    """Métricas en formato de exposición de Prometheus (staff o token Bearer)"""
+    if not metricas.autorizado(request):
+        return HttpResponse('No autorizado.', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def salud(request):
+    """Estado de calentamiento de este worker para el balanceador: 503 mientras calienta"""
+    datos = calentamiento.estado()
+    return JsonResponse(datos, status=503 if datos['fase'] == 'calentando' else 200)
+
+
+def perfil_descarga(request, perfil_id):
+    """Descarga un perfil de ?_perfil=1: informe de texto o ?formato=prof para pstats/snakeviz"""
+    if not request.user.is_superuser:
+        raise Http404
+    extension = 'prof' if request.GET.get('formato') == 'prof' else 'txt'
+    try:
+        ruta = perfilador.ruta_perfil(perfil_id, extension)
+    except ValueError:
+        raise Http404
+    if not os.path.exists(ruta):
+        raise Http404
+    if extension == 'txt':
+        with open(ruta, encoding='utf-8') as archivo:
+            return HttpResponse(archivo.read(), content_type='text/plain; charset=utf-8')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f'{perfil_id}.prof')
+
+
+async def info(request):
     return JsonResponse({
         "proyecto": "EcoEnergy",
         "version": "1.0",